@@ -6,7 +6,7 @@ import {
   DialogTrigger,
 } from "@/components/ui/dialog";
 import { useIsMobile } from "@/hooks/useClient";
-import { srcsetOf, type Image } from "@/utils/utils";
+import { dimensionsOf, srcsetOf, type Image } from "@/utils/utils";
 import {
   CircleX,
   Plus,
@@ -35,10 +35,15 @@ export default function FwdImage({
 
   const finalSrc = image?.thumbnail || props.src;
   const finalSrcSet = image ? srcsetOf(image) : props.srcSet;
+  const dimensions = dimensionsOf(image);
+  const style = { ...dimensions.style, ...props.style };
 
   return disableInteractive ? (
     <img
+      width={dimensions.width}
+      height={dimensions.height}
       {...props}
+      style={style}
       src={finalSrc}
       srcSet={finalSrcSet}
       sizes={props.sizes}
@@ -51,14 +56,30 @@ export default function FwdImage({
   ) : (
     <Dialog>
       <DialogTrigger className="relative">
-        {!isImageLoaded && (
-          <Skeleton
-            // Merge passed className with Skeleton classes
-            className={`aspect-square w-full rounded-xl ${className || ""} ${skeletonClassName || ""}`}
-          />
-        )}
+        {!isImageLoaded &&
+          (image?.placeholder ? (
+            // Blurred preview at the real aspect ratio, so nothing shifts when the image arrives
+            <img
+              alt=""
+              aria-hidden
+              src={image.placeholder}
+              width={dimensions.width}
+              height={dimensions.height}
+              style={style}
+              className={`w-full rounded-xl blur-md ${className || ""} ${skeletonClassName || ""}`}
+            />
+          ) : (
+            <Skeleton
+              // Merge passed className with Skeleton classes
+              style={dimensions.style}
+              className={`${dimensions.style ? "" : "aspect-square"} w-full rounded-xl ${className || ""} ${skeletonClassName || ""}`}
+            />
+          ))}
         <img
+          width={dimensions.width}
+          height={dimensions.height}
           {...props} // 4. Spread standard props (alt, id, etc.)
+          style={style}
           src={finalSrc}
           srcSet={finalSrcSet}
           sizes={props.sizes}
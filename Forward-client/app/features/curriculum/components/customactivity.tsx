@@ -4,10 +4,10 @@ import type {
 } from "@/features/curriculum/types";
 import { useResponse } from "@/features/curriculum/hooks";
 import { useEffect, useMemo, useState } from "react";
-function escapeHTML(str: string) {
-  const div = document.createElement("div");
-  div.textContent = str;
-  return div.innerHTML;
+
+function appendBeforeBodyEnd(html: string, snippet: string) {
+  const end = html.toLowerCase().lastIndexOf("</body>");
+  return end === -1 ? html + snippet : html.slice(0, end) + snippet + html.slice(end);
 }
 
 const iframeResizeScript = `
@@ -42,36 +42,17 @@ export default function CustomActivity({
     },
   });
 
-  const [patchedSrcDoc, setPatchedSrcDoc] = useState<string | undefined>(
-    undefined,
-  );
-
   const [iframeHeight, setIframeHeight] = useState<number | null>(null);
 
-  const imageMap = useMemo(
-    () => new Map(Object.entries(custom_activity.images)),
-    [custom_activity.images],
+  // Image sources are resolved by the server when the document is uploaded
+  const patchedSrcDoc = useMemo(
+    () =>
+      custom_activity.compiled_document
+        ? appendBeforeBodyEnd(custom_activity.compiled_document, iframeResizeScript)
+        : undefined,
+    [custom_activity.compiled_document],
   );
 
-  useEffect(() => {
-    fetch(custom_activity.document)
-      .then((response) => response.text())
-      .then((html) => {
-        const parser = new DOMParser();
-        const doc = parser.parseFromString(html, "text/html");
-        const images = doc.querySelectorAll("img");
-        images.forEach((i) => {
-          const src = i.getAttribute("src") || i.src;
-          if (imageMap.has(src)) i.src = imageMap.get(src) as string;
-        });
-        doc.body.insertAdjacentHTML("beforeend", iframeResizeScript);
-        setPatchedSrcDoc(doc.documentElement.innerHTML);
-      })
-      .catch((error) => {
-        console.error("Error fetching or processing HTML:", error);
-      });
-  }, [custom_activity.document, custom_activity.images]);
-
   useEffect(() => {
     const handleMessage = (event: MessageEvent) => {
       if (event.data.type === "iframeResize" && event.data.height) {
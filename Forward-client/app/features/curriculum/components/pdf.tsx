@@ -56,7 +56,12 @@ export default function PDF({pdf}: PDFProps){
                 <div className="flex items-center justify-center h-64 bg-muted rounded-lg">
                     <p className='text-muted-foreground'>Loading PDF...</p>
                 </div>}>
-                <LazyPDFViewer pdfUrl={pdf.pdf_file} />
+                <LazyPDFViewer
+                    pdfUrl={pdf.pdf_file}
+                    pageCount={pdf.page_count}
+                    linearized={pdf.linearized}
+                    thumbnail={pdf.thumbnail?.original}
+                />
             </Suspense>
         </div>
     );
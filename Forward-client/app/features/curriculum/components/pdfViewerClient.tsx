@@ -1,4 +1,4 @@
-import { useState, useMemo } from 'react';
+import { useState, useMemo, useEffect, useRef, type ReactNode } from 'react';
 import { Document, Page, pdfjs } from 'react-pdf';
 import 'react-pdf/dist/Page/AnnotationLayer.css';
 import 'react-pdf/dist/Page/TextLayer.css';
@@ -7,6 +7,40 @@ import { ZoomIn, ZoomOut, RotateCw } from 'lucide-react';
 
 interface PDFViewerClientProps {
   pdfUrl: string;
+  pageCount?: number | null;
+  linearized?: boolean;
+  thumbnail?: string;
+}
+
+// Only fetch what the visible pages need, the rest of the file is requested in ranges as the
+// student scrolls. Stored PDFs are linearized on upload so page one is near the start of the file.
+const RANGE_OPTIONS = {
+  disableAutoFetch: true,
+  disableStream: true,
+  rangeChunkSize: 65536,
+};
+
+/**
+ * Renders its page only once it scrolls near the viewport, so pages further down do not
+ * pull their part of the file before they are needed.
+ */
+function LazyPage({ children }: { children: ReactNode }) {
+  const ref = useRef<HTMLDivElement>(null);
+  const [visible, setVisible] = useState(false);
+
+  useEffect(() => {
+    if (visible || !ref.current) return;
+    const observer = new IntersectionObserver((entries) => {
+      if (entries.some((entry) => entry.isIntersecting)) {
+        setVisible(true);
+        observer.disconnect();
+      }
+    }, { rootMargin: "600px 0px" });
+    observer.observe(ref.current);
+    return () => observer.disconnect();
+  }, [visible]);
+
+  return <div ref={ref}>{visible ? children : <div className="h-[80vh] w-[60vw] bg-muted" />}</div>;
 }
 
 // This worker is required per the documentation. Not really sure what it does but its dependency 
@@ -16,12 +50,13 @@ pdfjs.GlobalWorkerOptions.workerSrc = new URL(
   import.meta.url,
 ).toString();
 
-export default function PDFViewerClient({ pdfUrl }: PDFViewerClientProps) {
-  const [numPages, setNumPages] = useState<number>();
+export default function PDFViewerClient({ pdfUrl, pageCount, linearized, thumbnail }: PDFViewerClientProps) {
+  const [numPages, setNumPages] = useState<number | undefined>(pageCount ?? undefined);
   const[pageTexts, setPageTexts] = useState<string[]>([]);
   const[scale, setScale] = useState<number>(1.2); // This sets the zoom at a default of 120% percent
 
   const file = useMemo(() => ({ url: pdfUrl }), [pdfUrl]);
+  const options = useMemo(() => (linearized ? RANGE_OPTIONS : undefined), [linearized]);
 
   function onDocumentLoadSuccess({ numPages }: { numPages: number }): void {
     setNumPages(numPages);
@@ -91,8 +126,10 @@ export default function PDFViewerClient({ pdfUrl }: PDFViewerClientProps) {
       <div className="flex-1 overflow-auto bg-background p-4">
         <Document 
           file={file} 
+          options={options}
           onLoadSuccess={onDocumentLoadSuccess}
           className="flex flex-col items-center gap-4"
+          loading={thumbnail ? <img src={thumbnail} alt="First page preview" className="shadow-md max-w-full" /> : undefined}
         >
           {numPages && Array.from(new Array(numPages), (el, index) => (
             <div key={`page_${index + 1}`} className="relative shadow-md">
@@ -108,7 +145,13 @@ export default function PDFViewerClient({ pdfUrl }: PDFViewerClientProps) {
                   </MarkdownTTS>
                 </div>
               )}
-              <Page pageNumber={index + 1}  scale = {scale} onLoadSuccess={(page: any) => onPageLoadSuccess(index + 1, page)} />
+              {linearized ? (
+                <LazyPage>
+                  <Page pageNumber={index + 1}  scale = {scale} onLoadSuccess={(page: any) => onPageLoadSuccess(index + 1, page)} />
+                </LazyPage>
+              ) : (
+                <Page pageNumber={index + 1}  scale = {scale} onLoadSuccess={(page: any) => onPageLoadSuccess(index + 1, page)} />
+              )}
             </div>
           ))}
         </Document>
@@ -71,6 +71,8 @@ export default function Video({ video }: { video: VideoType }) {
           ref={videoRef}
           className="w-auto rounded-lg shadow-lg max-h-160"
           src={video.video}
+          poster={video.poster?.original}
+          preload="metadata"
           controls
           onTimeUpdate={handleTimeUpdate}
           onLoadedMetadata={handleLoadedMetadata}
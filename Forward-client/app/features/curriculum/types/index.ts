@@ -104,10 +104,15 @@ export interface TextContent extends BaseActivity {
 
 export interface PDF extends BaseActivity{
   pdf_file: string;
+  page_count: number | null;
+  linearized: boolean; // stored file supports rendering page one from the first range requests
+  thumbnail: Image | null;
 }
 
 export interface Video extends BaseActivity {
   video: string;
+  duration: number | null; // seconds, read from the file on upload
+  poster: Image | null;
   scrubbable: boolean;
   transcript?: string;
 }
@@ -226,6 +231,8 @@ export interface Slideshow extends BaseActivity {
 
 export interface CustomActivity extends BaseActivity {
   document: string;
+  /** Minified document with image sources already pointing at the uploaded assets */
+  compiled_document: string;
   images: {[key: string]: string;}
 }
 
@@ -10,8 +10,23 @@ export type Image = {
   thumbnail: string;
   optimized: { [key: string]: number };
   original: string;
+  /** Intrinsic size, used to reserve layout space before the image loads */
+  width?: number | null;
+  height?: number | null;
+  /** Tiny blurred preview as a data URI */
+  placeholder?: string | null;
 };
 
+/** Width/height attributes and aspect ratio so the browser reserves space for the image */
+export function dimensionsOf(image: Image | undefined) {
+  if (!image?.width || !image?.height) return {};
+  return {
+    width: image.width,
+    height: image.height,
+    style: { aspectRatio: `${image.width} / ${image.height}` },
+  };
+}
+
 export function srcsetOf(image: Image) {
   let out: string[] = [];
   for (const [url, width] of Object.entries(image.optimized)) {
@@ -0,0 +1,69 @@
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+OVERLOADED_KEY = "admission:overloaded"
+
+
+class AdmissionControlMiddleware:
+    """
+    Sheds low priority requests (bug reports, exports, bundle downloads) with a 503 and
+    Retry-After while the workers are saturated, so logins and response saves keep the
+    workers to themselves until the burst has passed.
+
+    Saturation is measured as the time a request waited between the proxy and a worker,
+    from the X-Request-Start header Caddy sets. A request of any priority that waited longer
+    than ADMISSION_QUEUE_THRESHOLD seconds marks the service overloaded in the shared cache
+    for ADMISSION_COOLDOWN seconds. Without the header (development) nothing is shed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.low_priority = [re.compile(pattern) for pattern in settings.ADMISSION_LOW_PRIORITY_PATHS]
+        self.low_priority_actions = [re.compile(pattern) for pattern in settings.ADMISSION_LOW_PRIORITY_ACTIONS]
+
+    def __call__(self, request):
+        threshold = settings.ADMISSION_QUEUE_THRESHOLD
+        queued = self.queue_time(request)
+        if threshold and queued is not None:
+            low_priority = self.is_low_priority(request)
+            if queued > threshold:
+                cache.set(OVERLOADED_KEY, True, settings.ADMISSION_COOLDOWN)
+                if low_priority:
+                    return self.reject()
+            elif low_priority and cache.get(OVERLOADED_KEY):
+                return self.reject()
+
+        return self.get_response(request)
+
+    def is_low_priority(self, request):
+        if any(pattern.search(request.path) for pattern in self.low_priority):
+            return True
+        # Admin actions are posted to the changelist URL, e.g. the response exports
+        if (request.method == "POST" and request.path.startswith("/admin/")
+                and request.content_type == "application/x-www-form-urlencoded"):
+            action = request.POST.get("action", "")
+            return any(pattern.search(action) for pattern in self.low_priority_actions)
+        return False
+
+    @staticmethod
+    def queue_time(request):
+        """Seconds since the proxy received the request, from `X-Request-Start: t=<unix ms>`."""
+        header = request.META.get("HTTP_X_REQUEST_START", "")
+        try:
+            started = float(header.removeprefix("t=")) / 1000
+        except ValueError:
+            return None
+        return max(0.0, time.time() - started)
+
+    @staticmethod
+    def reject():
+        response = JsonResponse(
+            {"detail": "The server is busy, please try again in a moment"},
+            status=503,
+        )
+        response["Retry-After"] = str(settings.ADMISSION_COOLDOWN)
+        return response
@@ -0,0 +1,83 @@
+from api.tests import setup_django
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from rest_framework.test import APIRequestFactory
+from api.middleware import AdmissionControlMiddleware
+from api.views import SessionView, BugReportView
+from core.models import User
+
+
+def rates(**overrides):
+    return {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': overrides}
+
+
+class ThrottlingTests(TestCase):
+    """Test cases for the per-endpoint rate limits."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.factory = APIRequestFactory()
+        User.objects.create_user(username='testuser', password='TestPassword123!', display_name='Test User')
+
+    def _login(self, username, address='10.0.0.1'):
+        request = self.factory.post('/api/sessions', {'username': username, 'password': 'wrong'},
+                                    format='json', REMOTE_ADDR=address)
+        return SessionView.as_view()(request)
+
+    @override_settings(REST_FRAMEWORK=rates(login='2/min'))
+    def test_login_limited_per_username(self):
+        """Test that failed logins are limited per username, not for everyone behind the address."""
+        self.assertNotEqual(self._login('testuser').status_code, 429)
+        self.assertNotEqual(self._login('TestUser').status_code, 429)
+
+        response = self._login('testuser')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertNotEqual(self._login('otheruser').status_code, 429)
+
+    @override_settings(REST_FRAMEWORK=rates(bugreport_ip='1/hour'))
+    def test_limited_per_address(self):
+        """Test that the `_ip` rate applies per client address."""
+        def report(address):
+            request = self.factory.post('/api/bugreport', {}, format='json', REMOTE_ADDR=address)
+            return BugReportView.as_view()(request)
+
+        self.assertEqual(report('10.0.0.1').status_code, 400)
+        self.assertEqual(report('10.0.0.1').status_code, 429)
+        self.assertEqual(report('10.0.0.2').status_code, 400)
+
+
+@override_settings(ADMISSION_QUEUE_THRESHOLD=1.0, ADMISSION_COOLDOWN=15)
+class AdmissionControlMiddlewareTests(TestCase):
+    """Test cases for shedding low priority requests under load."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.factory = RequestFactory()
+        self.middleware = AdmissionControlMiddleware(lambda request: HttpResponse('ok'))
+
+    def _get(self, path, queued):
+        start = f't={int((time.time() - queued) * 1000)}'
+        return self.middleware(self.factory.get(path, HTTP_X_REQUEST_START=start))
+
+    def test_sheds_low_priority_while_overloaded(self):
+        """Test that a long queue time turns away low priority requests but not others."""
+        self.assertEqual(self._get('/api/bugreport', 0).status_code, 200)
+
+        # A response save that waited too long marks the service overloaded
+        self.assertEqual(self._get('/api/responses/quiz', 5).status_code, 200)
+
+        response = self._get('/api/bugreport', 0)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '15')
+        self.assertEqual(self._get('/api/responses/quiz', 0).status_code, 200)
+
+    def test_without_header(self):
+        """Test that requests that did not come through the proxy are never shed."""
+        cache.set('admission:overloaded', True)
+        self.assertEqual(self.middleware(self.factory.get('/api/bugreport')).status_code, 200)
@@ -1,10 +1,11 @@
 from api.tests import setup_django
 from api.utils import messages
-from django.test import TestCase
+from api.views import SearchView
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from rest_framework.test import APIClient
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
 import json
 from core.models import User, Lesson, TextContent, Quiz, Question, Writing, UserQuizResponse, UserQuestionResponse
@@ -43,6 +44,18 @@ class UserRegistrationViewTests(TestCase):
         user_exists = User.objects.filter(username='testuser').exists()
         self.assertTrue(user_exists)
 
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def test_registration_logs_in(self):
+        """Test that a new user is logged in through the cached backend."""
+        response = self.client.post(
+            self.register_url,
+            data=json.dumps(self.valid_payload),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['data']['user']['username'], 'testuser')
+        self.assertEqual(self.client.session['_auth_user_backend'], 'core.backends.CachedModelBackend')
+
     def test_invalid_registration_password_mismatch(self):
         """Test registration with password mismatch."""
         invalid_payload = self.valid_payload.copy()
@@ -394,6 +407,36 @@ class LessonViewTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
 
+class SearchViewTests(TestCase):
+    """Test cases for SearchView."""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.lesson = Lesson.objects.create(title='Money Basics', order=1, active=True)
+        TextContent.objects.create(lesson=self.lesson, title='Making a budget', content='Track spending', order=1)
+        hidden = Lesson.objects.create(title='Draft Lesson', order=2)
+        TextContent.objects.create(lesson=hidden, title='Budget draft', content='Not ready', order=1)
+        self.search_url = reverse('search')
+
+    def _search(self, **params):
+        return SearchView.as_view()(self.factory.get(self.search_url, params))
+
+    def test_search(self):
+        """Test that guests can search the activities of active lessons."""
+        response = self._search(q='budget')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['data']['results']
+        self.assertEqual([result['title'] for result in results], ['Making a budget'])
+        self.assertEqual(results[0]['lesson_id'], self.lesson.id)
+        self.assertEqual(results[0]['type'], 'textcontent')
+
+    def test_search_without_query(self):
+        """Test that an empty query is rejected."""
+        response = self._search(q=' ')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class LessonContentViewTests(TestCase):
     """Test cases for LessonContentView."""
 
@@ -0,0 +1,55 @@
+from rest_framework.settings import api_settings
+from rest_framework.throttling import ScopedRateThrottle
+
+
+class ScopedUserThrottle(ScopedRateThrottle):
+    """
+    Limits each authenticated user on views with a `throttle_scope`, at the rate configured
+    under that scope in DEFAULT_THROTTLE_RATES. Scopes without a rate are not limited, and
+    anonymous requests are left to ScopedIPThrottle.
+
+    History is kept in the default cache, so limits are shared by all workers when it is Redis.
+    """
+
+    @property
+    def THROTTLE_RATES(self):
+        # Read on every request instead of once at import so settings overrides apply
+        return api_settings.DEFAULT_THROTTLE_RATES
+
+    def get_rate(self):
+        return self.THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": request.user.pk}
+
+
+class UsernameThrottle(ScopedUserThrottle):
+    """
+    Limits attempts per submitted username, for the login endpoint where nobody is
+    authenticated yet and a whole facility may share one address.
+    """
+
+    def get_cache_key(self, request, view):
+        username = request.data.get("username") if hasattr(request.data, "get") else None
+        if not isinstance(username, str) or not username:
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": username.lower()}
+
+
+class ScopedIPThrottle(ScopedUserThrottle):
+    """Limits each client address, at the rate configured under `<throttle_scope>_ip`."""
+
+    def allow_request(self, request, view):
+        scope = getattr(view, self.scope_attr, None)
+        if not scope:
+            return True
+        # ScopedRateThrottle would set the scope straight from the view
+        self.scope = f"{scope}_ip"
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super(ScopedRateThrottle, self).allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
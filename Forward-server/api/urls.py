@@ -1,8 +1,8 @@
 from django.urls import path
 from .views import (
     QuizResponseStatusView, UserRegistrationView, SessionView, CurrentUserView, QuizView,
-    LessonView, LessonContentView, TextContentView, WritingView,
-    GetLessonIds, CurriculumView, ResponseView, OnboardView, BugReportView, ResetStudentProgressView
+    LessonView, LessonContentView, LessonMediaView, LessonBundleView, TextContentView, WritingView,
+    GetLessonIds, CurriculumView, ResponseView, OnboardView, BugReportView, ResetStudentProgressView, SearchView
     # , QuestionResponseView
 )
 
@@ -17,6 +17,9 @@ urlpatterns = [
     path('lessons', CurriculumView.as_view(), name='curriculum'),
     path('lesson/<uuid:id>', LessonView.as_view(), name='lessons'),
     path('lesson/<uuid:id>/content', LessonContentView.as_view(), name='lesson-content'),
+    path('lesson/<uuid:id>/media', LessonMediaView.as_view(), name='lesson-media'),
+    path('lesson/<uuid:id>/bundle', LessonBundleView.as_view(), name='lesson-bundle'),
+    path('search', SearchView.as_view(), name='search'),
 
     path('quizzes/<str:id>', QuizView.as_view(), name='quizes'),
     path('quizzes/<str:id>/status', QuizResponseStatusView.as_view(), name='quiz-status'),
@@ -7,15 +7,17 @@ from rest_framework.response import Response
 from rest_framework import status
 from .serializers import UserLoginSerializer, UserRegistrationSerializer, UserUpdateSerializer, ResponseSerializer
 # QuizSubmissionSerializer, UserQuizResponseDetailSerializer,
-from core.services import UserService, LessonService, QuizResponseService, ResponseService
+from core.services import UserService, LessonService, LessonMediaService, LessonBundleService, QuizResponseService, ResponseService, SearchService
 # , QuestionResponseService
 from .utils import json_go_brrr, messages
+from .throttling import ScopedUserThrottle, ScopedIPThrottle, UsernameThrottle
 from core.models import ActivityManager, Quiz, Lesson, TextContent, UserQuizResponse, Writing, Question, User, BugReport
 from rest_framework import serializers, request
 import logging
 from django.contrib.auth.decorators import login_required
 from core.utils import s3_file_upload, s3_file_delete
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse
+from django.core.files.storage import default_storage
 import uuid
 
 
@@ -35,11 +37,8 @@ def file_handler_view(request):
         if not file:
             return JsonResponse({"error": "file missing"}, status=400)
         
-        model = JSONImageModel.objects.create(
-            image=file
-        )
-        
-        model.save()
+        # Byte-identical uploads reuse the existing image and its generated variants
+        model = JSONImageModel.from_file(file)
         
         # model_name = request.POST.get("model_name", "")
 
@@ -71,6 +70,8 @@ class BugReportView(APIView):
     POST: Submit a bug report
     """
     permission_classes = [AllowAny]
+    throttle_classes = [ScopedUserThrottle, ScopedIPThrottle]
+    throttle_scope = "bugreport"
 
     def post(self, request, *args, **kwargs):
         """Submit a bug report"""
@@ -154,6 +155,7 @@ class SessionView(APIView):
     POST: Create a new session (login)
     DELETE: Terminate the session (logout)
     """
+    throttle_scope = "login"
 
     def get_permissions(self):
         """
@@ -163,6 +165,14 @@ class SessionView(APIView):
             return [AllowAny()]
         return [IsAuthenticated()]
 
+    def get_throttles(self):
+        """
+        Only login attempts are limited, per username and per address.
+        """
+        if self.request.method == 'POST':
+            return [UsernameThrottle(), ScopedIPThrottle()]
+        return []
+
     def post(self, request, *args, **kwargs):
         """
         Handle user login and create a new session.
@@ -254,10 +264,10 @@ class ResetStudentProgressView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        manager = ActivityManager()
-        for activity_name, (ActivityClass, ResponseClass, _, __, ___) in manager.registered_activities.items(): # syntax for unpacking tuple / activity manager
-            if ResponseClass:  # some activities have no response (like Concept)
-                ResponseClass.objects.filter(user=user).delete()
+        # Only the response tables the user has rows in are deleted from
+        for activity_name in LessonService.get_response_types(user=user):
+            ResponseClass = ActivityManager.registered_activities[activity_name][1]
+            ResponseClass.objects.filter(user=user).delete()
 
 
         return json_go_brrr(
@@ -302,6 +312,8 @@ class GetLessonIds(APIView):
 class CurriculumView(APIView):
     # permission_classes = [IsAuthenticated]
     permission_classes = [AllowAny] # need to double check this
+    throttle_classes = [ScopedUserThrottle, ScopedIPThrottle]
+    throttle_scope = "lessons"
 
     def get(self, request, *args, **kwargs):
         '''
@@ -329,6 +341,38 @@ class CurriculumView(APIView):
             status=status.HTTP_200_OK)
 
 
+class SearchView(APIView):
+    # Guests can browse lessons too
+    permission_classes = [AllowAny]
+    throttle_classes = [ScopedUserThrottle, ScopedIPThrottle]
+    throttle_scope = "search"
+
+    def get(self, request, *args, **kwargs):
+        '''
+        full-text search over the activities of active lessons, best matches first
+        '''
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return json_go_brrr(
+                message="A search query (q) is required",
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        lesson_id = request.query_params.get("lesson")
+        try:
+            lesson_id = uuid.UUID(lesson_id) if lesson_id else None
+        except ValueError:
+            return json_go_brrr(
+                message="Invalid lesson id",
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return json_go_brrr(
+            message="Successfully searched lessons",
+            data={"results": SearchService.search(query, lesson_id=lesson_id)},
+            status=status.HTTP_200_OK
+        )
+
+
 class LessonView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -400,6 +444,80 @@ class LessonContentView(APIView):
         return Response({"detail": 'successfully saved data'}, status=status.HTTP_200_OK)
 
 
+class LessonMediaView(APIView):
+    """
+    Lists the media a lesson uses so the client (and its service worker) can prefetch and
+    cache it before the student reaches each activity.
+    """
+    # Any Allowed for guest user access, same as the lesson content
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            manifest, etag = LessonMediaService.get_manifest(kwargs.get('id'))
+        except Lesson.DoesNotExist:
+            return json_go_brrr(
+                message=messages['err404'],
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        etag = f'"{etag}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = json_go_brrr(
+                message="Successfully retrieved lesson media",
+                data=manifest,
+                status=status.HTTP_200_OK
+            )
+        response['ETag'] = etag
+        # Short lived so signed URLs in the manifest are still valid when used
+        response['Cache-Control'] = 'public, max-age=300'
+        return response
+
+
+class LessonBundleView(APIView):
+    """
+    Downloads the whole lesson, content and media, as one zip for offline use.
+    ?variant= picks the image size included (mobile, tablet, desktop or original).
+    Only bundles already built for the current content are served, otherwise one is built in
+    the background and the answer is 202.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        variant = request.query_params.get('variant', 'original')
+        try:
+            key = LessonBundleService.find_bundle(kwargs.get('id'), variant=variant)
+        except Lesson.DoesNotExist:
+            return json_go_brrr(
+                message=messages['err404'],
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except ValueError as e:
+            return json_go_brrr(
+                message=str(e),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if key is None:
+            # Built off the request, the client asks again once it is stored
+            LessonBundleService.schedule_build(kwargs.get('id'), variant=variant)
+            response = json_go_brrr(
+                message='The bundle of this lesson is being built, try again shortly',
+                status=status.HTTP_202_ACCEPTED
+            )
+            response['Retry-After'] = '30'
+            return response
+
+        return FileResponse(
+            default_storage.open(key, 'rb'),
+            as_attachment=True,
+            filename=f"lesson-{kwargs.get('id')}-{variant}.zip",
+            content_type='application/zip'
+        )
+
+
 class TextContentView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -436,6 +554,8 @@ class WritingView(APIView):
 
 class ResponseView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ScopedUserThrottle, ScopedIPThrottle]
+    throttle_scope = "responses"
 
     def post(self, request, *args, **kwargs):
         activity_type: str = kwargs.get("activitytype").lower()
@@ -1,6 +1,7 @@
 from core.models import (Lesson, ActivityManager, BaseActivity, Twine, TextContent, Quiz, Question, Writing,
                          Embed, DndMatch, Concept, ConceptMap, Video, LikertScale, FillInTheBlank, Identification, IdentificationItem,
-                         Slideshow, Slide, CustomActivity, CustomActivityImageAsset, PDF)
+                         Slideshow, Slide, CustomActivity, CustomActivityImageAsset, PDF, MediaBlob)
+from core.services import LessonService, LessonCopyService
 from django import forms
 from .admin import custom_admin_site
 from django.utils.html import format_html, format_html_join
@@ -58,13 +59,11 @@ class JsonAdminMixin:
 def save_file(uploaded_file, key_prefix: str) -> str:
     """
     Save a file to default storage under public/{key_prefix}{filename}.
-    Replaces any existing file with the same key.
+    Replaces any existing file with the same key, unless it already holds the same bytes.
     Returns the saved storage key.
     """
     file_key = f"public/{key_prefix}{Path(uploaded_file.name).name}"
-    if default_storage.exists(file_key):
-        default_storage.delete(file_key)
-    return default_storage.save(file_key, uploaded_file)
+    return MediaBlob.store(file_key, uploaded_file, pinned=True)
 
 # ---------------------------------------------------------------------
 # Curriculum
@@ -77,10 +76,21 @@ class LessonAdmin(admin.ModelAdmin):
     search_fields = ("title", "description")
     ordering = ("order",)
     list_editable = ("order",)
+    actions = ["duplicate_lessons"]
     
     fields = ("title","active", "order", "objectives", "tags", "image", "image_preview", "sorted_activities")
     readonly_fields = ("image_preview", "sorted_activities")
 
+    def duplicate_lessons(self, request, queryset):
+        copies = [LessonCopyService.duplicate(lesson) for lesson in queryset]
+        self.message_user(
+            request,
+            f"Created {len(copies)} inactive {'copy' if len(copies) == 1 else 'copies'}: "
+            + ", ".join(copy.title for copy in copies),
+        )
+    duplicate_lessons.short_description = "Duplicate selected lessons"
+    duplicate_lessons.allowed_permissions = ("add",)
+
     def sorted_activities(self, obj: Lesson):
         """
         Gathers all related activity instances from various registered models,
@@ -90,17 +100,7 @@ class LessonAdmin(admin.ModelAdmin):
         if not obj.id:
             return format_html("<strong>Save the lesson to view and add activities.</strong>")
 
-        all_activities = []
-        
-        for value in ActivityManager.registered_activities.values():
-            ActivityModel, child_class = value[0], value[3]
-            if not child_class:
-                activities = list(ActivityModel.objects.filter(
-                    lesson=obj))
-                for activity in activities:
-                    all_activities.append(activity)
-
-        all_activities.sort(key=lambda x: x.order)
+        all_activities = LessonService.get_activity_index(lesson=obj)
 
         if not all_activities:
             return "No activities found for this lesson."
@@ -108,10 +108,10 @@ class LessonAdmin(admin.ModelAdmin):
         # Build the HTML list
         html_list_items = []
         for activity in all_activities:
-            meta = activity._meta
+            meta = ActivityManager.registered_activities[activity["type"]][0]._meta
             
             # Generate the URL to the admin change view for the specific activity object
-            url = reverse(f'admin:{meta.app_label}_{meta.model_name}_change', args=(activity.pk,))
+            url = reverse(f'admin:{meta.app_label}_{meta.model_name}_change', args=(activity["id"],))
             
             # Create a list item with the model name, a link to the object, and its order
             list_item = format_html(
@@ -122,8 +122,8 @@ class LessonAdmin(admin.ModelAdmin):
                 '</tr>',
                 model_name=capfirst(meta.verbose_name),
                 url=url,
-                obj_str=str(activity),
-                order=activity.order
+                obj_str=activity["title"],
+                order=activity["order"]
             )
             html_list_items.append(list_item)
         
@@ -240,55 +240,22 @@ class CustomActivityAdmin(BaseActivityAdmin):
     referenced_images.short_description = "Detected Images"
     
     def preview(self, obj: CustomActivity):
-        data = obj.to_dict()
-        images_json = json.dumps(data["images"])
-
-        # Read the HTML content from the uploaded file
-        doc_content = ""
-        if obj.document:
-            try:
-                obj.document.seek(0)  # Ensure we read from the start
-                doc_content = obj.document.read().decode('utf-8')
-            except (FileNotFoundError, ValueError):
-                doc_content = "<p>Error: Could not read the document file.</p>"
-        
+        # Image sources are already resolved in the document compiled on save
+        doc_content = obj.to_dict()["compiled_document"] if obj.document else ""
+
         # Use srcdoc to embed the HTML directly, ensuring same-origin
         return format_html(
             """
             <style>
             .readonly:has(iframe) {{flex-grow: 1;}}
             </style>
-            <script>
-                function replace_src(event) {{
-                    try {{
-                        const iframe = event.currentTarget;
-                        const images = JSON.parse(iframe.dataset.images);
-                        const imap = new Map(Object.entries(images));
-                        const doc = iframe.contentWindow?.document;
-                        if (!doc) return;
-
-                        const tags = doc.querySelectorAll("img");
-                        tags.forEach((t) => {{
-                            const src = t.getAttribute("src") || t.src;
-                            if (imap.has(src)) {{
-                                t.src = imap.get(src);
-                            }}
-                        }});
-                    }} catch (err) {{
-                        console.error("replace_src error:", err);
-                    }}
-                }}
-            </script>
             <iframe
                 srcdoc="{doc_content}"
-                onload="replace_src(event)"
                 sandbox="allow-scripts allow-same-origin"
-                data-images='{images_json}'
                 style="width:100%;height:auto;min-height: 1000px;border:1px solid #ccc;">
             </iframe>
             """,
             doc_content=doc_content,
-            images_json=mark_safe(images_json),
         )
 
 class IdentificationItemInline(admin.StackedInline):
@@ -406,15 +373,16 @@ class TextContentAdmin(BaseActivityAdmin):
 @admin.register(Video, site=custom_admin_site)
 class VideoAdmin(BaseActivityAdmin):
     grouping = "Activities"
-    readonly_fields = ("video_preview",)
+    readonly_fields = ("video_preview", "duration")
 
     def video_preview(self, obj):
         return format_html(
-            '<video width="{}" height="{}" controls>'
+            '<video width="{}" height="{}" poster="{}" controls>'
             '<source src="{}" type="video/mp4">'
             "Your browser does not support the video tag.</video>",
             800,
             500,
+            obj.poster.url if obj.poster else "",
             obj.video.url,
         )
         
@@ -482,6 +450,14 @@ class FillInTheBlankAdmin(BaseActivityAdmin):
 @admin.register(PDF, site=custom_admin_site)
 class PDFAdmin(BaseActivityAdmin):
     grouping = "Activities"
+    readonly_fields = ("thumbnail_preview", "page_count", "linearized")
+
+    def thumbnail_preview(self, obj):
+        if not obj.thumbnail:
+            return "-"
+        return format_html('<img src="{}" style="max-width:200px; border:1px solid #ccc;" />', obj.thumbnail.url)
+
+    thumbnail_preview.short_description = "First Page"
 
 @admin.register(LikertScale, site=custom_admin_site)
 class LikertScaleAdmin(BaseActivityAdmin):
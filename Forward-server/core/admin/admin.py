@@ -1,6 +1,14 @@
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.db import connections
+from django.utils.functional import cached_property
 from collections import defaultdict
-from django.utils.text import slugify
+import json
+from django.utils.text import capfirst, slugify
 from django.utils.html import format_html
 
 class CustomAdminSite(admin.AdminSite):
@@ -40,4 +48,113 @@ class CustomAdminSite(admin.AdminSite):
             app["models"].sort(key=lambda x: x["name"])
         return app_list
 
-custom_admin_site = CustomAdminSite(name="custom_admin")
\ No newline at end of file
+    def get_urls(self):
+        return [
+            path("search/", self.admin_view(self.search_view), name="search"),
+        ] + super().get_urls()
+
+    def search_view(self, request):
+        """Ranked full-text search over the activities of every lesson, active or not."""
+        from core.models import ActivityManager
+        from core.services import SearchService
+
+        query = request.GET.get("q", "").strip()
+        results = SearchService.search(query, active_only=False, limit=50) if query else []
+        for result in results:
+            meta = ActivityManager.registered_activities[result["type"]][0]._meta
+            result["type_name"] = capfirst(meta.verbose_name)
+            result["url"] = reverse(f"{self.name}:{meta.app_label}_{meta.model_name}_change", args=(result["id"],))
+            result["lesson_url"] = reverse(f"{self.name}:core_lesson_change", args=(result["lesson_id"],))
+
+        context = {
+            **self.each_context(request),
+            "title": f'Search results for "{query}"' if query else "Search lessons",
+            "query": query,
+            "results": results,
+        }
+        return TemplateResponse(request, "admin/search.html", context)
+
+custom_admin_site = CustomAdminSite(name="custom_admin")
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for tables too big to COUNT(*) on every changelist page. On Postgres it takes the
+    planner's row estimate (pg_class.reltuples for the whole table, EXPLAIN for filtered
+    changelists) and only counts exactly when that estimate is below ESTIMATE_THRESHOLD, so
+    page numbers of big tables are approximate.
+    """
+    ESTIMATE_THRESHOLD = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, "query", None)
+        if query is not None and connections[queryset.db].vendor == "postgresql":
+            estimate = self._estimate(queryset)
+            if estimate is not None and estimate >= self.ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def _estimate(queryset):
+        if not queryset.query.where and not queryset.query.distinct:
+            with connections[queryset.db].cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            # -1 until the table was first analyzed
+            return row[0] if row and row[0] >= 0 else None
+        plan = queryset.explain(format="json")
+        try:
+            return int(json.loads(plan)[0]["Plan"]["Plan Rows"])
+        except (ValueError, KeyError, IndexError, TypeError):
+            return None
+
+
+class AutocompleteListFilter(admin.RelatedFieldListFilter):
+    """
+    Related object filter picked with the admin's select2 autocomplete instead of listing every
+    related object in the sidebar. Options come from the admin autocomplete view, so they are
+    searched with the related model admin's search_fields and limited by its get_queryset
+    (e.g. to an instructor's facility). Admins using it need `media` to include filter_media().
+    """
+    template = "admin/autocomplete_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.admin_site = model_admin.admin_site
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def field_choices(self, field, request, model_admin):
+        # Only the selected object, for its label
+        if not self.lookup_val:
+            return []
+        related = field.remote_field.model._default_manager.filter(pk__in=self.lookup_val)
+        return [(obj.pk, str(obj)) for obj in related]
+
+    def has_output(self):
+        return True
+
+    def autocomplete_attrs(self):
+        return {
+            "url": reverse(f"{self.admin_site.name}:autocomplete"),
+            "app_label": self.field.model._meta.app_label,
+            "model_name": self.field.model._meta.model_name,
+            "field_name": self.field.name,
+        }
+
+    @staticmethod
+    def filter_media():
+        extra = "" if settings.DEBUG else ".min"
+        return forms.Media(
+            js=(
+                f"admin/js/vendor/jquery/jquery{extra}.js",
+                f"admin/js/vendor/select2/select2.full{extra}.js",
+                "admin/js/jquery.init.js",
+                "admin/js/autocomplete.js",
+                "custom/autocomplete_filter.js",
+            ),
+            css={"screen": (f"admin/css/vendor/select2/select2{extra}.css", "admin/css/autocomplete.css")},
+        )
@@ -9,18 +9,38 @@ from django.db import models
 from django.utils.safestring import mark_safe
 from martor.widgets import AdminMartorWidget
 from martor.utils import markdownify
-from django.db.models import Q
+from django.db.models import Q, Count
 from django.contrib.auth.forms import AdminPasswordChangeForm
+from django.contrib.admin.views.main import ChangeList
+
+def is_instructor(request):
+    """
+    Whether the requesting user is in the Instructors group. The admin asks from several
+    permission hooks per page, and per inline row, so the answer is kept on the request.
+    """
+    if not hasattr(request, "_is_instructor"):
+        request._is_instructor = request.user.groups.filter(name="Instructors").exists()
+    return request._is_instructor
 
 class AdminPasswordChangeFormNoPBA(AdminPasswordChangeForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields.pop("usable_password", None)
 
+class UserProgressChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # One bulk computation for the page instead of one per row
+        completions = LessonService.get_overall_completions([user.pk for user in self.result_list])
+        for user in self.result_list:
+            user.overall_completion = completions.get(user.pk, 0)
+
+
 @admin.register(User, site=custom_admin_site)
 class CustomUserAdmin(UserAdmin):
     grouping = "Core"
-    list_display = ("display_name", "username", "facility_name", "is_staff", "is_superuser")
+    list_display = ("display_name", "username", "facility_name", "completion", "is_staff", "is_superuser")
+    list_select_related = ("facility",)
     list_filter = ("is_staff", "is_superuser", "groups")
     search_fields = ("username", "display_name", "email")
     change_password_form = AdminPasswordChangeFormNoPBA
@@ -57,7 +77,8 @@ class CustomUserAdmin(UserAdmin):
 
     
     def progress_widget(self, obj):
-        lessons = Lesson.objects.filter(active=True)
+        lessons = list(Lesson.objects.filter(active=True))
+        completions = LessonService.get_completions([obj.pk], [l.pk for l in lessons])
         html_list_items = []
         for l in lessons:
             list_item = format_html(
@@ -66,7 +87,7 @@ class CustomUserAdmin(UserAdmin):
                     '<td>{completion}</td>'
                 '</tr>',
                 lesson_name=l.title,
-                completion=f"{float(LessonService.get_lesson_completion(obj, l)) * 100:.1f}%",
+                completion=f"{float(completions.get((obj.pk, l.pk), 0)) * 100:.1f}%",
             )
             html_list_items.append(list_item)
             
@@ -88,6 +109,13 @@ class CustomUserAdmin(UserAdmin):
             '<tbody>{}</tbody>''</table>', format_html("".join(html_list_items)))
     
     progress_widget.short_description = "Lesson Progress"
+
+    def get_changelist(self, request, **kwargs):
+        return UserProgressChangeList
+
+    def completion(self, obj):
+        return f"{getattr(obj, 'overall_completion', 0) * 100:.1f}%"
+    completion.short_description = "Completion"
         
 
     def facility_name(self, obj):
@@ -96,7 +124,7 @@ class CustomUserAdmin(UserAdmin):
     facility_name.admin_order_field = "facility__name"
 
     def _is_instructor(self, request):
-        return request.user.groups.filter(name="Instructors").exists()
+        return is_instructor(request)
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -186,7 +214,7 @@ class UserInline(admin.TabularInline):
         return qs.none()
 
     def _is_instructor(self, request):
-        return request.user.groups.filter(name="Instructors").exists()
+        return is_instructor(request)
 
     def has_view_permission(self, request, obj=None):
         if request.user.is_superuser:
@@ -221,22 +249,21 @@ class FacilityAdmin(admin.ModelAdmin):
     inlines = [UserInline]
 
     def get_queryset(self, request):
-        qs = super().get_queryset(request).prefetch_related("user_set")
+        qs = super().get_queryset(request).annotate(user_count=Count("user"))
         if request.user.is_superuser:
             return qs
-        if request.user.groups.filter(name="Instructors").exists():
+        if is_instructor(request):
             return qs.filter(pk=request.user.facility_id)
         return qs.none()
 
     def user_count(self, obj):
-        return obj.user_set.count()
+        return obj.user_count
 
     user_count.short_description = "Associated Users"
+    user_count.admin_order_field = "user_count"
 
     def has_module_permission(self, request):
-        return request.user.is_superuser or request.user.groups.filter(
-            name="Instructors"
-        ).exists()
+        return request.user.is_superuser or is_instructor(request)
 
     def has_view_permission(self, request, obj=None):
         return self.has_module_permission(request)
@@ -244,7 +271,7 @@ class FacilityAdmin(admin.ModelAdmin):
     def has_change_permission(self, request, obj=None):
         if request.user.is_superuser:
             return True
-        if obj and request.user.groups.filter(name="Instructors").exists():
+        if obj and is_instructor(request):
             return obj.pk == request.user.facility_id
         return False
 
@@ -316,9 +343,7 @@ class AnnouncementAdmin(admin.ModelAdmin):
         return request.user.is_superuser
 
     def has_module_permission(self, request):
-        return request.user.is_superuser or request.user.groups.filter(
-            name="Instructors"
-        ).exists()
+        return request.user.is_superuser or is_instructor(request)
 
     def has_view_permission(self, request, obj=None):
         return self.has_module_permission(request)
\ No newline at end of file
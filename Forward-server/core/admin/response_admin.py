@@ -1,12 +1,66 @@
 from core.models import (FillInTheBlankResponse, UserQuizResponse, UserQuestionResponse, WritingResponse, ActivityManager)
-from .admin import custom_admin_site
+from core.services import ResponseExportService
+from .admin import custom_admin_site, EstimatedCountPaginator, AutocompleteListFilter
 from django.contrib import admin
 from django.utils.html import format_html
 from django.db import models
+from django.http import StreamingHttpResponse
 from django_json_widget.widgets import JSONEditorWidget
 
 
+class LessonTitleListFilter(admin.RelatedFieldListFilter):
+    """Lesson filter labelled by title alone, since str(lesson) counts the lesson's activities."""
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin) or ("order",)
+        return list(field.related_model.objects.order_by(*ordering).values_list("pk", "title"))
+
+
 class ReadOnlyAdmin(admin.ModelAdmin):
+    # Response tables grow with every student, so avoid exact counts and per-row queries
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_select_related = ("user", "associated_activity", "lesson")
+    actions = ["export_csv", "export_jsonl"]
+
+    @property
+    def media(self):
+        return super().media + AutocompleteListFilter.filter_media()
+
+    def lesson_title(self, obj):
+        return obj.lesson.title
+    lesson_title.short_description = "Lesson"
+    lesson_title.admin_order_field = "lesson__title"
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        if not request.user.is_superuser:
+            # Exports span every facility
+            actions.pop("export_csv", None)
+            actions.pop("export_jsonl", None)
+        return actions
+
+    def _export(self, queryset, format):
+        response_type = next(
+            (name for name, Model in ResponseExportService.response_models().items() if Model is self.model),
+            self.model._meta.model_name,
+        )
+        rows = ResponseExportService.iter_rows(response_type, queryset)
+        response = StreamingHttpResponse(
+            ResponseExportService.iter_lines(rows, format),
+            content_type="text/csv" if format == "csv" else "application/x-ndjson",
+        )
+        response["Content-Disposition"] = f'attachment; filename="{response_type}-responses.{format}"'
+        return response
+
+    def export_csv(self, request, queryset):
+        return self._export(queryset, "csv")
+    export_csv.short_description = "Export selected responses as CSV"
+
+    def export_jsonl(self, request, queryset):
+        return self._export(queryset, "jsonl")
+    export_jsonl.short_description = "Export selected responses as JSON Lines"
+
     def has_add_permission(self, request):
         return False
 
@@ -27,12 +81,12 @@ class FillInTheBlankResponseAdmin(ReadOnlyAdmin):
     list_display = (
         "user",
         "associated_activity",
-        "lesson",
+        "lesson_title",
         "partial_response",
         "updated_at",
         "submission",
     )
-    list_filter = ("lesson", "user")
+    list_filter = (("lesson", LessonTitleListFilter), ("user", AutocompleteListFilter))
 
 
 @admin.register(UserQuizResponse, site=custom_admin_site)
@@ -41,25 +95,26 @@ class UserQuizResponseAdmin(ReadOnlyAdmin):
     list_display = (
         "user",
         "associated_activity",
-        "lesson",
+        "lesson_title",
         "score",
         "partial_response",
         "updated_at",
     )
-    list_filter = ("lesson", "associated_activity", "user")
+    list_filter = (("lesson", LessonTitleListFilter), "associated_activity", ("user", AutocompleteListFilter))
 
 
 @admin.register(UserQuestionResponse, site=custom_admin_site)
 class UserQuestionResponseAdmin(ReadOnlyAdmin):
     grouping = "Responses"
     list_display = ("user", "question", "quiz_response", "is_correct", "updated_at")
-    list_filter = ("question__quiz", "user")
+    list_filter = ("question__quiz", ("user", AutocompleteListFilter))
+    list_select_related = ("user", "question", "quiz_response__user", "quiz_response__associated_activity")
 
 @admin.register(WritingResponse, site=custom_admin_site)
 class WritingResponseAdmin(ReadOnlyAdmin):
     grouping = "Responses"
-    list_display = ("user", "associated_activity", "lesson", "updated_at")
-    list_filter = ("lesson", "user")
+    list_display = ("user", "associated_activity", "lesson_title", "updated_at")
+    list_filter = (("lesson", LessonTitleListFilter), ("user", AutocompleteListFilter))
     
     readonly_fields = ("display_prompt_and_responses",)
     fields = ("user", "associated_activity", "lesson", "display_prompt_and_responses", "updated_at")
@@ -109,9 +164,9 @@ for _, (ActivityClass, ResponseClass, _, _child, _) in ActivityManager().registe
         {
             "grouping": "Responses",
             "list_display": tuple(
-                ["user", "associated_activity", "lesson", "partial_response", "updated_at", *extras]
+                ["user", "associated_activity", "lesson_title", "partial_response", "updated_at", *extras]
             ),
-            "list_filter": ("lesson", "user"),
+            "list_filter": (("lesson", LessonTitleListFilter), ("user", AutocompleteListFilter)),
             "formfield_overrides": {models.JSONField: {"widget": JSONEditorWidget}}
         },
     )
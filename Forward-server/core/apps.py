@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from .signals import (connect_content_signals, connect_media_signals, connect_search_signals,
+                              connect_user_cache_signals)
+        connect_media_signals()
+        connect_search_signals()
+        connect_content_signals()
+        connect_user_cache_signals()
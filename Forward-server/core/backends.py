@@ -0,0 +1,60 @@
+"""
+Authentication backend that keeps users in the cache.
+
+Every authenticated request resolves request.user from the session. ModelBackend does that
+with a query per request (plus another one the first time user.facility is touched), this
+backend loads the user together with its facility once and serves it from the cache until
+the user, its facility, or its session changes (see core.signals).
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+UserModel = get_user_model()
+
+
+def user_cache_key(user_id) -> str:
+    return f"auth-user:{user_id}"
+
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that loads users with select_related("facility") and caches them for
+    USER_CACHE_TIMEOUT seconds. A timeout of 0 turns the cache off, it must only be enabled
+    with a cache shared by all workers so invalidation reaches every process.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.select_related("facility").get(
+                **{UserModel.USERNAME_FIELD: username})
+        except UserModel.DoesNotExist:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        timeout = settings.USER_CACHE_TIMEOUT
+        key = user_cache_key(user_id)
+        user = cache.get(key) if timeout else None
+        if user is None:
+            try:
+                user = UserModel._default_manager.select_related("facility").get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            if timeout:
+                cache.set(key, user, timeout)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,390 @@
+"""
+Model fields that process uploads before they reach storage.
+
+Like imagefield's ImageField, these deconstruct to the plain Django field so migrations
+don't depend on this module, and the work happens in the FieldFile's save().
+
+All of them are content addressed: an upload whose bytes are already stored reuses that
+storage object (see MediaBlob) instead of being uploaded and processed again.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import models
+from django.db.models.fields.files import FieldFile
+from imagefield import fields as imagefield
+
+from . import media
+
+
+def content_digest(content) -> tuple[str, int]:
+    """Returns the SHA-256 hex digest and size of a file, leaving it rewound."""
+    if not hasattr(content, "chunks"):
+        content = File(content)
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in content.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    content.seek(0)
+    return digest.hexdigest(), size
+
+
+class DeduplicatedFileMixin:
+    """
+        FieldFile mixin that looks uploads up by content before storing them. Identical bytes
+        reuse the existing key, and a different file that would land on a key already holding
+        other content gets the digest appended to its name instead of overwriting it.
+
+        The FieldFile it is mixed into provides blob_metadata(), the values to remember on the
+        MediaBlob, and apply_blob_metadata(), which restores them onto instances reusing it.
+    """
+
+    def save(self, name, content, save=True):
+        MediaBlob = apps.get_model("core", "MediaBlob")
+        digest, size = content_digest(content)
+
+        blob = MediaBlob.objects.filter(sha256=digest, pinned=False).first()
+        if blob:
+            self.name = blob.key
+            setattr(self.instance, self.field.attname, self.name)
+            self._committed = True
+            self.apply_blob_metadata(blob.metadata)
+            if save:
+                self.instance.save()
+            return
+
+        candidate = self.field.generate_filename(self.instance, name)
+        stem, extension = os.path.splitext(candidate)
+        # Checked by stem since some fields (imagefield) change the extension while saving
+        if MediaBlob.objects.filter(key__startswith=f"{stem}.").exclude(sha256=digest).exists():
+            name = f"{os.path.splitext(os.path.basename(name))[0]}-{digest[:12]}{extension}"
+
+        super().save(name, content, save=False)
+        MediaBlob.objects.update_or_create(
+            key=self.name,
+            defaults={
+                "sha256": digest,
+                "size": size,
+                "content_type": getattr(content, "content_type", None) or "",
+                "metadata": self.blob_metadata(),
+                "pinned": False,
+            },
+        )
+        if save:
+            self.instance.save()
+
+    save.alters_data = True
+
+    def delete(self, save=True):
+        """Deletes the stored file, unless another row still references the same blob."""
+        MediaBlob = apps.get_model("core", "MediaBlob")
+        MediaReference = apps.get_model("core", "MediaReference")
+        if not self.name:
+            return super().delete(save)
+
+        name = self.name
+        own = MediaReference.objects.none()
+        others = MediaReference.objects.filter(blob__key=name)
+        if self.instance.pk is not None:
+            own = MediaReference.objects.filter(
+                content_type=ContentType.objects.get_for_model(self.instance),
+                object_id=str(self.instance.pk),
+                field=self.field.name,
+            )
+            others = others.exclude(pk__in=own.values("pk"))
+
+        if others.exists():
+            own.delete()
+            self.name = None
+            setattr(self.instance, self.field.attname, self.name)
+            if save:
+                self.instance.save()
+            return
+
+        own.delete()
+        super().delete(save)
+        MediaBlob.objects.filter(key=name, references__isnull=True).delete()
+
+    delete.alters_data = True
+
+
+class ImageFieldFile(DeduplicatedFileMixin, imagefield.ImageFieldFile):
+    def save(self, name, content, save=True):
+        placeholder_field = self.field.placeholder_field
+        if placeholder_field:
+            try:
+                placeholder = media.image_placeholder(content)
+            except Exception:
+                # Unreadable images are reported by imagefield's own validation
+                placeholder = ""
+            content.seek(0)
+            setattr(self.instance, placeholder_field, placeholder)
+        super().save(name, content, save)
+
+    save.alters_data = True
+
+    def blob_metadata(self):
+        if self.field.placeholder_field:
+            return {"placeholder": getattr(self.instance, self.field.placeholder_field)}
+        return {}
+
+    def apply_blob_metadata(self, metadata):
+        if self.field.placeholder_field and metadata.get("placeholder"):
+            setattr(self.instance, self.field.placeholder_field, metadata["placeholder"])
+
+
+class ImageField(imagefield.ImageField):
+    """
+        imagefield's ImageField, content addressed so identical images share their variants.
+        With auto_add_fields=True it also adds a `<name>_placeholder` field holding a tiny
+        preview of the image, next to imagefield's `<name>_width` and `<name>_height`.
+    """
+    attr_class = ImageFieldFile
+
+    def __init__(self, *args, placeholder_field=None, **kwargs):
+        self.placeholder_field = placeholder_field
+        super().__init__(*args, **kwargs)
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        if self._auto_add_fields and self.placeholder_field is None:
+            self.placeholder_field = "%s_placeholder" % name
+            models.TextField(blank=True, default="", editable=False).contribute_to_class(cls, self.placeholder_field)
+        super().contribute_to_class(cls, name, **kwargs)
+
+
+class ProcessedFieldFile(FieldFile):
+    """
+        Spools the upload to a temporary file, lets the subclass rewrite it and collect
+        metadata onto the model instance, then stores the result.
+    """
+    extensions: tuple[str, ...] = ()
+    # Sibling model fields filled by update_metadata, by the name of the option holding them
+    metadata_options: tuple[str, ...] = ()
+
+    def normalize(self, source: str, target: str) -> bool:
+        """Writes a processed copy of source to target. Returns False to store source as-is."""
+        return False
+
+    def update_metadata(self, name: str, path: str):
+        """Sets metadata fields on self.instance from the (processed) file at path."""
+
+    def needs_processing(self) -> bool:
+        """True if metadata is missing for an already stored file."""
+        return False
+
+    def blob_metadata(self):
+        metadata = {}
+        for option in self.metadata_options:
+            attname = getattr(self.field, option)
+            if attname:
+                value = getattr(self.instance, attname)
+                metadata[option] = value.name if isinstance(value, FieldFile) else value
+        return metadata
+
+    def apply_blob_metadata(self, metadata):
+        for option, value in metadata.items():
+            attname = getattr(self.field, option, None)
+            if attname:
+                setattr(self.instance, attname, value)
+
+    def save(self, name, content, save=True):
+        # Runs inside DeduplicatedFileMixin.save, only for content that isn't stored yet
+        if not name.lower().endswith(self.extensions):
+            return super().save(name, content, save)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "source")
+            with open(source, "wb") as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            processed = os.path.join(tmp, "processed")
+            path = processed if self.normalize(source, processed) else source
+
+            self.update_metadata(name, path)
+            with open(path, "rb") as f:
+                super().save(name, File(f, name=name), save)
+
+    save.alters_data = True
+
+    def process(self, force=False) -> bool:
+        """
+            Processes an already stored file in place and fills in missing metadata.
+            Used by the process_media command to backfill existing uploads.
+            Returns True if anything was changed.
+        """
+        if not self.name or not self.name.lower().endswith(self.extensions):
+            return False
+        missing = self.needs_processing()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "source")
+            with self.storage.open(self.name, "rb") as stored, open(source, "wb") as f:
+                media.copy_stream(stored, f)
+            processed = os.path.join(tmp, "processed")
+            changed = self.normalize(source, processed)
+            if not (changed or missing or force):
+                return False
+
+            path = processed if changed else source
+            self.update_metadata(self.name, path)
+            if changed:
+                old_name = self.name
+                with open(path, "rb") as f:
+                    super().save(os.path.basename(old_name), File(f, name=old_name), save=False)
+                if self.name != old_name:
+                    apps.get_model("core", "MediaBlob").objects.filter(key=old_name).update(key=self.name)
+                    self.storage.delete(old_name)
+
+        self.instance.save()
+        return True
+
+    process.alters_data = True
+
+    def _save_preview(self, field_name, name, data):
+        basename = os.path.splitext(os.path.basename(name))[0]
+        getattr(self.instance, field_name).save(f"{basename}.jpg", ContentFile(data), save=False)
+
+
+class VideoFieldFile(DeduplicatedFileMixin, ProcessedFieldFile):
+    extensions = media.MP4_EXTENSIONS
+    metadata_options = ("duration_field", "poster_field")
+
+    def normalize(self, source, target):
+        return media.normalize_mp4(source, target)
+
+    def needs_processing(self):
+        field = self.field
+        return bool(
+            (field.duration_field and getattr(self.instance, field.duration_field) is None)
+            or (field.poster_field and not getattr(self.instance, field.poster_field) and media.tool("ffmpeg"))
+        )
+
+    def update_metadata(self, name, path):
+        field = self.field
+        duration = None
+        if field.duration_field or field.poster_field:
+            with open(path, "rb") as f:
+                try:
+                    duration = media.mp4_duration(f)
+                except Exception:
+                    duration = None
+        if field.duration_field:
+            setattr(self.instance, field.duration_field, duration)
+        if field.poster_field:
+            poster = media.video_poster(path, duration)
+            if poster:
+                self._save_preview(field.poster_field, name, poster)
+
+
+class VideoField(models.FileField):
+    """
+        FileField for MP4 videos. Uploads are rewritten to fast-start (moov atom first) so
+        playback can begin before the whole file is downloaded. Optionally records the
+        duration in seconds and a poster frame on sibling fields of the model.
+    """
+    attr_class = VideoFieldFile
+
+    def __init__(self, *args, duration_field=None, poster_field=None, **kwargs):
+        self.duration_field = duration_field
+        self.poster_field = poster_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, _path, args, kwargs = super().deconstruct()
+        return (name, "django.db.models.FileField", args, kwargs)
+
+
+class PDFFieldFile(DeduplicatedFileMixin, ProcessedFieldFile):
+    extensions = (".pdf",)
+    metadata_options = ("page_count_field", "thumbnail_field", "linearized_field")
+
+    def normalize(self, source, target):
+        return media.linearize_pdf(source, target) if self.field.linearize else False
+
+    def needs_processing(self):
+        field = self.field
+        return bool(
+            (field.page_count_field and getattr(self.instance, field.page_count_field) is None)
+            or (field.thumbnail_field and not getattr(self.instance, field.thumbnail_field) and media.tool("pdftoppm"))
+            or (field.linearized_field and field.linearize and media.tool("qpdf")
+                and not getattr(self.instance, field.linearized_field))
+        )
+
+    def update_metadata(self, name, path):
+        field = self.field
+        if field.page_count_field:
+            setattr(self.instance, field.page_count_field, media.pdf_page_count(path))
+        if field.linearized_field:
+            setattr(self.instance, field.linearized_field, media.pdf_is_linearized(path))
+        if field.thumbnail_field:
+            thumbnail = media.pdf_thumbnail(path)
+            if thumbnail:
+                self._save_preview(field.thumbnail_field, name, thumbnail)
+
+
+class PDFField(models.FileField):
+    """
+        FileField for PDFs. Uploads are linearized with qpdf (when installed) so viewers can
+        show page one before the rest of the file has downloaded, and the page count, a
+        first page thumbnail and whether the stored file is linearized are recorded on
+        sibling fields of the model.
+    """
+    attr_class = PDFFieldFile
+
+    def __init__(self, *args, page_count_field=None, thumbnail_field=None, linearized_field=None,
+                 linearize=True, **kwargs):
+        self.page_count_field = page_count_field
+        self.thumbnail_field = thumbnail_field
+        self.linearized_field = linearized_field
+        self.linearize = linearize
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, _path, args, kwargs = super().deconstruct()
+        return (name, "django.db.models.FileField", args, kwargs)
+
+
+class HTMLDocumentFieldFile(ProcessedFieldFile):
+    extensions = (".html", ".htm")
+    metadata_options = ("images_field", "compiled_field", "digest_field")
+
+    def needs_processing(self):
+        field = self.field
+        return bool(field.digest_field and not getattr(self.instance, field.digest_field))
+
+    def update_metadata(self, name, path):
+        field = self.field
+        with open(path, "rb") as f:
+            images, compiled, digest = media.compile_html_document(f.read())
+        if field.images_field:
+            setattr(self.instance, field.images_field, images)
+        if field.compiled_field:
+            setattr(self.instance, field.compiled_field, compiled)
+        if field.digest_field:
+            setattr(self.instance, field.digest_field, digest)
+
+
+class HTMLDocumentField(models.FileField):
+    """
+        FileField for self-contained HTML documents. The document is parsed once on upload:
+        the images it references and a minified copy, with image sources replaced by
+        markers that media.resolve_image_markers() fills in per request, are stored on
+        sibling fields of the model so views never read the document back from storage.
+    """
+    attr_class = HTMLDocumentFieldFile
+
+    def __init__(self, *args, images_field=None, compiled_field=None, digest_field=None, **kwargs):
+        self.images_field = images_field
+        self.compiled_field = compiled_field
+        self.digest_field = digest_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, _path, args, kwargs = super().deconstruct()
+        return (name, "django.db.models.FileField", args, kwargs)
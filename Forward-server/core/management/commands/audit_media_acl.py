@@ -0,0 +1,154 @@
+import json
+
+from botocore.exceptions import ClientError
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from core.storage import ForwardS3Storage
+
+ALL_USERS = "http://acs.amazonaws.com/groups/global/AllUsers"
+# Errors returned when a bucket (or S3 compatible server, e.g. MinIO) does not use object ACLs
+ACL_UNSUPPORTED = {"AccessControlListNotSupported", "NotImplemented", "XNotImplemented"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks that media under the public prefixes can be read anonymously, which is required "
+        "before enabling MEDIA_PUBLIC_URLS. Use --fix to migrate existing objects."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prefix",
+            action="append",
+            dest="prefixes",
+            help="Key prefix to audit (repeatable). Defaults to the storage's public prefixes.",
+        )
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Apply the public ACL and Cache-Control header to objects that are missing them",
+        )
+        parser.add_argument(
+            "--policy",
+            action="store_true",
+            help="Grant anonymous read on the prefixes with a bucket policy (for buckets without ACLs)",
+        )
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        if not isinstance(storage, ForwardS3Storage):
+            raise CommandError("The default storage is not core.storage.ForwardS3Storage")
+
+        prefixes = options["prefixes"] or list(storage.public_prefixes)
+        client = storage.bucket.meta.client
+        bucket = storage.bucket_name
+
+        if options["policy"]:
+            self._apply_policy(client, bucket, prefixes)
+
+        policy_prefixes = self._policy_prefixes(client, bucket)
+
+        checked = missing_acl = missing_cache = fixed = 0
+        acl_supported = True
+        for prefix in prefixes:
+            covered_by_policy = any(prefix.startswith(p) for p in policy_prefixes)
+            for summary in storage.bucket.objects.filter(Prefix=prefix):
+                checked += 1
+                key = summary.key
+
+                public = covered_by_policy
+                if acl_supported and not public:
+                    try:
+                        grants = client.get_object_acl(Bucket=bucket, Key=key)["Grants"]
+                        public = any(
+                            g["Grantee"].get("URI") == ALL_USERS and g["Permission"] in ("READ", "FULL_CONTROL")
+                            for g in grants
+                        )
+                    except ClientError as e:
+                        if e.response["Error"]["Code"] not in ACL_UNSUPPORTED:
+                            raise
+                        acl_supported = False
+                        self.stdout.write(self.style.WARNING(
+                            "Object ACLs are not supported by this bucket, use --policy instead"
+                        ))
+
+                head = client.head_object(Bucket=bucket, Key=key)
+                has_cache = bool(head.get("CacheControl"))
+
+                if not public:
+                    missing_acl += 1
+                if not has_cache:
+                    missing_cache += 1
+                if public and has_cache:
+                    continue
+
+                self.stdout.write(
+                    f"{key}: {'' if public else 'not public '}{'' if has_cache else 'no Cache-Control'}".strip()
+                )
+                if options["fix"]:
+                    self._fix(storage, client, bucket, key, head, public or not acl_supported)
+                    fixed += 1
+
+        style = self.style.SUCCESS if not (missing_acl or missing_cache) else self.style.WARNING
+        self.stdout.write(style(
+            f"Checked {checked} objects: {missing_acl} not publicly readable, "
+            f"{missing_cache} without Cache-Control, {fixed} fixed"
+        ))
+
+    def _fix(self, storage, client, bucket, key, head, skip_acl):
+        params = storage.get_object_parameters(key)
+        if skip_acl:
+            params.pop("ACL", None)
+        # Copying an object onto itself is the only way to rewrite its headers
+        copy_args = {
+            "Bucket": bucket,
+            "Key": key,
+            "CopySource": {"Bucket": bucket, "Key": key},
+            "MetadataDirective": "REPLACE",
+            "ContentType": head.get("ContentType", storage.default_content_type),
+            "Metadata": head.get("Metadata", {}),
+            **params,
+        }
+        if head.get("ContentEncoding"):
+            copy_args["ContentEncoding"] = head["ContentEncoding"]
+        client.copy_object(**copy_args)
+
+    def _policy_prefixes(self, client, bucket) -> list[str]:
+        """Prefixes that an existing bucket policy already exposes to anonymous GetObject."""
+        try:
+            policy = json.loads(client.get_bucket_policy(Bucket=bucket)["Policy"])
+        except ClientError:
+            return []
+        prefixes = []
+        for statement in policy.get("Statement", []):
+            actions = statement.get("Action", [])
+            actions = [actions] if isinstance(actions, str) else actions
+            principal = statement.get("Principal")
+            anonymous = principal == "*" or (isinstance(principal, dict) and principal.get("AWS") in ("*", ["*"]))
+            if statement.get("Effect") != "Allow" or not anonymous or "s3:GetObject" not in actions:
+                continue
+            resources = statement.get("Resource", [])
+            resources = [resources] if isinstance(resources, str) else resources
+            for resource in resources:
+                if resource.startswith(f"arn:aws:s3:::{bucket}/"):
+                    prefixes.append(resource.split("/", 1)[1].rstrip("*"))
+        return prefixes
+
+    def _apply_policy(self, client, bucket, prefixes):
+        try:
+            policy = json.loads(client.get_bucket_policy(Bucket=bucket)["Policy"])
+        except ClientError:
+            policy = {"Version": "2012-10-17", "Statement": []}
+
+        statements = [s for s in policy["Statement"] if s.get("Sid") != "ForwardPublicMedia"]
+        statements.append({
+            "Sid": "ForwardPublicMedia",
+            "Effect": "Allow",
+            "Principal": {"AWS": ["*"]},
+            "Action": ["s3:GetObject"],
+            "Resource": [f"arn:aws:s3:::{bucket}/{prefix}*" for prefix in prefixes],
+        })
+        policy["Statement"] = statements
+        client.put_bucket_policy(Bucket=bucket, Policy=json.dumps(policy))
+        self.stdout.write(self.style.SUCCESS(f"Bucket policy now allows anonymous reads on {', '.join(prefixes)}"))
@@ -0,0 +1,86 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from core.backends import invalidate_user
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures requests per second of GET /api/users/me through the full middleware stack, "
+        "with database sessions and users versus the cached session and user loading"
+    )
+
+    MODES = {
+        "database": {
+            "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+            "USER_CACHE_TIMEOUT": 0,
+        },
+        "cached": {
+            "SESSION_ENGINE": "django.contrib.sessions.backends.cached_db",
+            "USER_CACHE_TIMEOUT": 300,
+        },
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--username",
+            required=True,
+            help="Existing user to make the requests as",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=2000,
+            help="Requests per mode",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}")
+
+        # Lets the test client's host through ALLOWED_HOSTS
+        setup_test_environment()
+        results = {}
+        for mode, overrides in self.MODES.items():
+            with override_settings(**overrides):
+                results[mode] = self._run(user, options["requests"])
+
+        self.stdout.write(f"{'mode':<10} {'req/s':>10} {'ms/req':>10} {'queries':>8}")
+        for mode, (rps, queries) in results.items():
+            self.stdout.write(f"{mode:<10} {rps:>10.1f} {1000 / rps:>10.2f} {queries:>8}")
+        speedup = results["cached"][0] / results["database"][0]
+        self.stdout.write(self.style.SUCCESS(f"cached is {speedup:.2f}x the database mode"))
+
+    def _run(self, user, requests):
+        client = Client()
+        client.force_login(user, backend="core.backends.CachedModelBackend")
+        invalidate_user(user.pk)
+        try:
+            # Warm up (and fill the caches in cached mode)
+            for _ in range(20):
+                self._get(client)
+
+            with CaptureQueriesContext(connection) as captured:
+                self._get(client)
+            queries = len(captured)
+
+            start = time.perf_counter()
+            for _ in range(requests):
+                self._get(client)
+            elapsed = time.perf_counter() - start
+        finally:
+            client.logout()
+            invalidate_user(user.pk)
+        return requests / elapsed, queries
+
+    def _get(self, client):
+        response = client.get("/api/users/me")
+        if response.status_code != 200:
+            raise CommandError(f"GET /api/users/me returned {response.status_code}")
@@ -0,0 +1,113 @@
+import posixpath
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.files import File
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies every stored file from one storage to another under the same key, e.g. from "
+        "S3/MinIO to MEDIA_ROOT before switching to MEDIA_BACKEND=local"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source",
+            default="s3",
+            help="STORAGES alias to copy from (default: s3)",
+        )
+        parser.add_argument(
+            "--target",
+            default="default",
+            help="STORAGES alias to copy to (default: default)",
+        )
+        parser.add_argument(
+            "--prefix",
+            default="",
+            help="Only copy keys starting with this prefix",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Files copied concurrently",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Copy files that already exist in the target with the same size",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list what would be copied",
+        )
+
+    def handle(self, *args, **options):
+        if options["source"] == options["target"]:
+            raise CommandError("Source and target are the same storage")
+        try:
+            source = storages[options["source"]]
+            target = storages[options["target"]]
+        except Exception as e:
+            raise CommandError(e)
+
+        copied = skipped = failed = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = {}
+            for key, size in self._iter_files(source, options["prefix"]):
+                if not options["force"] and target.exists(key) and target.size(key) == size:
+                    skipped += 1
+                    continue
+                if options["dry_run"]:
+                    self.stdout.write(f"  Would copy {key} ({size} bytes)")
+                    continue
+                futures[pool.submit(self._copy, source, target, key)] = key
+
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    future.result()
+                    copied += 1
+                    self.stdout.write(f"  Copied {key}")
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"  Failed {key}: {e}"))
+
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(f"{copied} copied, {skipped} already present, {failed} failed"))
+
+    def _iter_files(self, storage, prefix):
+        """Yields (key, size) for every file in a storage."""
+        if hasattr(storage, "bucket"):
+            # One listing request per 1000 keys instead of walking "directories"
+            location = f"{storage.location}/" if storage.location else ""
+            for summary in storage.bucket.objects.filter(Prefix=location + prefix):
+                if not summary.key.endswith("/"):
+                    yield summary.key[len(location):], summary.size
+            return
+
+        def walk(directory):
+            try:
+                dirs, files = storage.listdir(directory)
+            except FileNotFoundError:
+                return
+            for name in files:
+                key = posixpath.join(directory, name) if directory else name
+                if key.startswith(prefix):
+                    yield key, storage.size(key)
+            for name in dirs:
+                yield from walk(posixpath.join(directory, name) if directory else name)
+
+        yield from walk("")
+
+    def _copy(self, source, target, key):
+        with source.open(key, "rb") as f:
+            if target.exists(key):
+                # FileSystemStorage would otherwise save under a new name
+                target.delete(key)
+            saved = target.save(key, File(f, name=key))
+        if saved != key:
+            raise CommandError(f"saved as {saved}")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.seeding import get_lesson
+from core.services import LessonCopyService
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies a lesson with all its activities, e.g. to make facility specific variants. The copies "
+        "share the original's stored files and start inactive"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "lesson",
+            help="Id or exact title of the lesson to copy",
+        )
+        parser.add_argument(
+            "--title",
+            action="append",
+            help="Title of a copy (repeatable, one copy per title). Defaults to '<title> (copy)'",
+        )
+
+    def handle(self, *args, **options):
+        lesson = get_lesson(options["lesson"])
+        for title in options["title"] or [None]:
+            copy = LessonCopyService.duplicate(lesson, title=title)
+            self.stdout.write(self.style.SUCCESS(f"Created '{copy.title}' ({copy.pk})"))
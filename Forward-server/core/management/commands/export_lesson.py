@@ -0,0 +1,52 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import slugify
+
+from core.seeding import LessonExporter, get_lesson, lesson_data_root
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports a lesson, e.g. edited in the admin, as a lesson.json and its files in the layout "
+        "seed_lessons_data reads, to promote it to another environment"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "lesson",
+            help="Id or exact title of the lesson to export",
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Folder to write (default: seed_data/lesson_data/<slugified title>)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Files downloaded concurrently",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Overwrite the lesson.json of an existing export",
+        )
+
+    def handle(self, *args, **options):
+        lesson = get_lesson(options["lesson"])
+        folder = Path(options["output"]) if options["output"] else lesson_data_root() / slugify(lesson.title)
+        if (folder / "lesson.json").exists() and not options["force"]:
+            raise CommandError(f"{folder / 'lesson.json'} already exists, pass --force to overwrite it")
+
+        started = time.monotonic()
+        exporter = LessonExporter(lesson, folder, workers=options["workers"])
+        report = exporter.export()
+        for key in exporter.missing:
+            self.stdout.write(self.style.WARNING(f"  Missing from storage: {key}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported '{lesson.title}' to {folder}: {report['activities']} activities, {report['files']} files "
+            f"({report['bytes'] / 1024 / 1024:.1f} MB) in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,50 @@
+import shutil
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Lesson
+from core.services import LessonBundleService
+
+
+class Command(BaseCommand):
+    help = "Packages lessons, content and media, into zip bundles for offline use"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "lessons",
+            nargs="*",
+            help="Lesson ids to bundle. Defaults to every lesson.",
+        )
+        parser.add_argument(
+            "--variant",
+            default="original",
+            choices=list(LessonBundleService.variants()),
+            help="Image size to include",
+        )
+        parser.add_argument(
+            "--output",
+            help="Directory to copy the bundles to, in addition to storing them",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rebuild bundles even if the lesson did not change",
+        )
+
+    def handle(self, *args, **options):
+        lessons = Lesson.objects.order_by("order")
+        if options["lessons"]:
+            lessons = lessons.filter(id__in=options["lessons"])
+            if lessons.count() != len(set(options["lessons"])):
+                raise CommandError("Some of the given lessons do not exist")
+
+        for lesson in lessons:
+            key = LessonBundleService.get_bundle(lesson.id, variant=options["variant"], force=options["force"])
+            self.stdout.write(f"  {lesson.title}: {key} ({default_storage.size(key)} bytes)")
+            if options["output"]:
+                target = f"{options['output'].rstrip('/')}/{lesson.id}-{options['variant']}.zip"
+                with default_storage.open(key, "rb") as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+
+        self.stdout.write(self.style.SUCCESS(f"Bundled {lessons.count()} lessons"))
@@ -0,0 +1,92 @@
+from datetime import date, datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.services import ResponseExportService
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams student responses for research as CSV or JSON Lines, one row per response with "
+        "the user, lesson and activity joined in"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            choices=ResponseExportService.FORMATS,
+            default="csv",
+        )
+        parser.add_argument(
+            "--output",
+            help="File to write to (default: stdout)",
+        )
+        parser.add_argument(
+            "--type",
+            action="append",
+            choices=sorted(ResponseExportService.response_models()),
+            help="Only export this response type (repeatable). Defaults to all types.",
+        )
+        parser.add_argument(
+            "--consented-only",
+            action="store_true",
+            help="Only export responses of users who gave research consent",
+        )
+        parser.add_argument(
+            "--facility",
+            action="append",
+            help="Only export users of this facility code (repeatable)",
+        )
+        parser.add_argument(
+            "--lesson",
+            action="append",
+            help="Only export responses in this lesson id (repeatable)",
+        )
+        parser.add_argument(
+            "--since",
+            type=date.fromisoformat,
+            help="Only responses last saved on or after this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--until",
+            type=date.fromisoformat,
+            help="Only responses last saved before this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=ResponseExportService.CHUNK_SIZE,
+            help="Rows fetched from the database at a time",
+        )
+
+    def handle(self, *args, **options):
+        if options["since"] and options["until"] and options["since"] >= options["until"]:
+            raise CommandError("--since must be before --until")
+
+        rows = ResponseExportService.iter_all_rows(
+            response_types=options["type"],
+            chunk_size=options["chunk_size"],
+            consented_only=options["consented_only"],
+            facilities=options["facility"],
+            lessons=options["lesson"],
+            since=self._midnight(options["since"]),
+            until=self._midnight(options["until"]),
+        )
+        lines = ResponseExportService.iter_lines(rows, options["format"])
+        # The CSV header is not a response
+        count = -1 if options["format"] == "csv" else 0
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as f:
+                for line in lines:
+                    f.write(line)
+                    count += 1
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
+                count += 1
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} responses"))
+
+    @staticmethod
+    def _midnight(day):
+        return timezone.make_aware(datetime.combine(day, time.min)) if day else None
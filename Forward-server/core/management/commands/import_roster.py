@@ -0,0 +1,215 @@
+import csv
+import json
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from core.backends import user_cache_key
+from core.models import Facility, User
+
+# Avoids characters that are easily confused when read off a printed sheet (0/O, 1/l/I)
+PASSWORD_ALPHABET = "abcdefghjkmnpqrstuvwxyzACDEFGHJKLMNPQRSTUVWXYZ23456789"
+# Below this many passwords starting worker processes costs more than it saves
+POOL_THRESHOLD = 16
+
+
+def generate_password(length: int = 10) -> str:
+    return "".join(secrets.choice(PASSWORD_ALPHABET) for _ in range(length))
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates users from a roster (CSV with a header row, or JSON) and writes a credentials report. "
+        "Columns: username, display_name, password, facility, email, consent, group. "
+        "Users that already exist are skipped (or updated with --update), so re-runs are safe."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str, help="Roster file, .csv or .json")
+        parser.add_argument(
+            "--facility",
+            help="Facility code for rows that don't name one",
+        )
+        parser.add_argument(
+            "--generate-passwords",
+            action="store_true",
+            help="Generate passwords for rows without one (they appear in the report)",
+        )
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Update display name, facility, email and password (if given) of existing users",
+        )
+        parser.add_argument(
+            "--output",
+            help="Where to write the credentials report CSV (default: stdout)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Processes used to hash passwords. Defaults to the number of CPUs.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate the roster and print the report without saving anything",
+        )
+
+    def handle(self, *args, **options):
+        rows = self._read(Path(options["path"]))
+        facilities = {f.code.lower(): f for f in Facility.objects.all()}
+        default_facility = None
+        if options["facility"]:
+            default_facility = facilities.get(options["facility"].lower())
+            if default_facility is None:
+                raise CommandError(f"No facility with code {options['facility']}")
+
+        existing = {
+            u.username: u
+            for u in User.objects.select_related("facility").filter(username__in=[r.get("username") for r in rows])
+        }
+        # Missing groups are only created when saving, so a dry run writes nothing
+        groups = {g.name: g for g in Group.objects.filter(name__in={r["group"] for r in rows if r.get("group")})}
+        report, new_users, updated_users, memberships = [], [], [], []
+        seen = set()
+
+        for line, row in enumerate(rows, start=1):
+            username = (row.get("username") or "").strip()
+            entry = {"username": username, "display_name": row.get("display_name") or username,
+                     "facility": "", "password": "", "status": ""}
+            report.append(entry)
+            try:
+                if not username:
+                    raise ValidationError("missing username")
+                if username in seen:
+                    raise ValidationError("duplicate username in roster")
+                seen.add(username)
+
+                facility = default_facility
+                if row.get("facility"):
+                    facility = facilities.get(str(row["facility"]).lower())
+                    if facility is None:
+                        raise ValidationError(f"unknown facility {row['facility']}")
+
+                password = row.get("password") or ""
+                user = existing.get(username)
+                if user is not None and not options["update"]:
+                    entry["status"] = "exists"
+                    entry["facility"] = facility.code if facility else ""
+                    continue
+                if user is None:
+                    if not password and options["generate_passwords"]:
+                        password = generate_password()
+                    if not password:
+                        raise ValidationError("missing password (use --generate-passwords)")
+                    user = User(username=username, consent=self._bool(row.get("consent")))
+                    user.display_name = entry["display_name"]
+                    user.facility = facility
+                    batch, status = new_users, "created"
+                else:
+                    # Only what the row (or --facility) gives, a blank column keeps the current value
+                    if row.get("display_name"):
+                        user.display_name = row["display_name"]
+                    if facility is not None:
+                        user.facility = facility
+                    entry["display_name"] = user.display_name
+                    batch, status = updated_users, "updated"
+
+                user.email = row.get("email") or user.email
+                entry["facility"] = user.facility.code if user.facility else ""
+                user.full_clean(exclude=["password"], validate_unique=False, validate_constraints=False)
+                if row.get("password"):
+                    validate_password(password, user)
+                batch.append((user, password))
+                entry["status"] = status
+                entry["password"] = password
+
+                if row.get("group"):
+                    memberships.append((user, row["group"]))
+            except ValidationError as e:
+                entry["status"] = f"error (row {line}): {'; '.join(e.messages)}"
+
+        errors = [e for e in report if e["status"].startswith("error")]
+        new_groups = sorted({name for _user, name in memberships} - set(groups))
+        if not options["dry_run"]:
+            to_hash = [(user, password) for user, password in new_users + updated_users if password]
+            hashes = self._hash([password for _user, password in to_hash], options["workers"])
+            for (user, _password), hashed in zip(to_hash, hashes):
+                user.password = hashed
+            self._save(new_users, updated_users, memberships, groups, new_groups)
+
+        self._write_report(report, options["output"])
+        created = sum(1 for e in report if e["status"] == "created")
+        updated = sum(1 for e in report if e["status"] == "updated")
+        style = self.style.WARNING if errors else self.style.SUCCESS
+        prefix = "Would have " if options["dry_run"] else ""
+        self.stderr.write(style(
+            f"{prefix}{created} created, {updated} updated, "
+            f"{sum(1 for e in report if e['status'] == 'exists')} already existed, {len(errors)} errors"
+        ))
+        if new_groups:
+            self.stderr.write(f"{'Would have created' if options['dry_run'] else 'Created'} groups: {', '.join(new_groups)}")
+
+    def _read(self, path: Path) -> list[dict]:
+        try:
+            with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                if path.suffix.lower() == ".json":
+                    data = json.load(f)
+                    return data.get("users", []) if isinstance(data, dict) else data
+                return [{k.strip().lower(): (v or "").strip() for k, v in row.items() if k} for row in csv.DictReader(f)]
+        except FileNotFoundError:
+            raise CommandError(f"File not found: {path}")
+        except (json.JSONDecodeError, csv.Error) as e:
+            raise CommandError(f"Could not read {path}: {e}")
+
+    @staticmethod
+    def _bool(value) -> bool:
+        return str(value).strip().lower() in ("1", "true", "yes", "y")
+
+    def _hash(self, passwords: list[str], workers) -> list[str]:
+        """Hashes passwords, in a process pool when there are enough of them to be worth it."""
+        if workers == 1 or len(passwords) < POOL_THRESHOLD:
+            return [make_password(p) for p in passwords]
+        # Forked workers must not inherit open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(make_password, passwords, chunksize=8))
+
+    @transaction.atomic
+    def _save(self, new_users, updated_users, memberships, groups, new_groups):
+        User.objects.bulk_create([user for user, _password in new_users], batch_size=500)
+        if updated_users:
+            fields = ["display_name", "facility", "email"]
+            if any(password for _user, password in updated_users):
+                fields.append("password")
+            User.objects.bulk_update([user for user, _password in updated_users], fields, batch_size=500)
+            # bulk_update skips the signals that drop cached users
+            cache.delete_many([user_cache_key(user.pk) for user, _password in updated_users])
+        for name in new_groups:
+            groups[name] = Group.objects.get_or_create(name=name)[0]
+        Membership = User.groups.through
+        Membership.objects.bulk_create(
+            [Membership(user_id=user.pk, group_id=groups[name].pk) for user, name in memberships],
+            ignore_conflicts=True,
+        )
+
+    def _write_report(self, report, output):
+        columns = ["username", "display_name", "facility", "password", "status"]
+        if output:
+            with open(output, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(report)
+        else:
+            writer = csv.DictWriter(self.stdout, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(report)
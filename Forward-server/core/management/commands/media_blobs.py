@@ -0,0 +1,77 @@
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from core.fields import content_digest
+from core.models import JSONImageModel, MediaBlob
+from core.signals import media_fields, sync_media_references
+
+
+class Command(BaseCommand):
+    help = "Maintains the content-addressed media tables (MediaBlob / MediaReference)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--register",
+            action="store_true",
+            help="Hash files uploaded before deduplication existed and record what references them",
+        )
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Delete stored files that no row references anymore",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what --prune would delete",
+        )
+
+    def handle(self, *args, **options):
+        if not (options["register"] or options["prune"]):
+            raise CommandError("Pass --register and/or --prune")
+        if options["register"]:
+            self._register()
+        if options["prune"]:
+            self._prune(options["dry_run"])
+
+    def _register(self):
+        known = set(MediaBlob.objects.values_list("key", flat=True))
+        created = 0
+        for model in apps.get_app_config("core").get_models():
+            fields = media_fields(model)
+            if not fields:
+                continue
+            for instance in model.objects.iterator(chunk_size=200):
+                for field in fields:
+                    name = getattr(instance, field.attname).name
+                    if not name or name in known:
+                        continue
+                    try:
+                        with default_storage.open(name, "rb") as f:
+                            digest, size = content_digest(f)
+                    except FileNotFoundError:
+                        self.stdout.write(self.style.WARNING(f"  Missing {model.__name__}.{field.name}: {name}"))
+                        continue
+                    MediaBlob.objects.create(key=name, sha256=digest, size=size)
+                    known.add(name)
+                    created += 1
+                sync_media_references(model, instance)
+        self.stdout.write(self.style.SUCCESS(f"Registered {created} stored files"))
+
+    def _prune(self, dry_run):
+        orphans = MediaBlob.objects.filter(references__isnull=True, pinned=False)
+        # Any imagefield ImageField can locate the generated variants of a key
+        image_field = JSONImageModel._meta.get_field("image")
+        deleted = 0
+        for blob in orphans.iterator():
+            self.stdout.write(f"  {'Would delete' if dry_run else 'Deleting'} {blob.key}")
+            if dry_run:
+                continue
+            if blob.key.lower().endswith((".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp", ".tif", ".tiff")):
+                fieldfile = image_field.attr_class(JSONImageModel(), image_field, blob.key)
+                image_field._clear_generated_files_for(fieldfile, blob.key)
+            default_storage.delete(blob.key)
+            blob.delete()
+            deleted += 1
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} unreferenced files"))
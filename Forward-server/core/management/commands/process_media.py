@@ -0,0 +1,140 @@
+import io
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.images import get_image_dimensions
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import media
+from core.fields import HTMLDocumentField, ImageField, PDFField, VideoField
+from core.models import MediaBlob
+
+# Storage of an image worker process, created after the fork so no connections are shared
+_storage = None
+
+
+def _init_image_worker():
+    global _storage
+    _storage = storages.create_storage(settings.STORAGES["default"])
+
+
+def _image_metadata(name):
+    """Runs in a worker process. Returns (name, width, height, placeholder, error)."""
+    try:
+        with _storage.open(name, "rb") as f:
+            data = io.BytesIO(f.read())
+        width, height = get_image_dimensions(data)
+        data.seek(0)
+        return name, width, height, media.image_placeholder(data), None
+    except Exception as e:
+        return name, None, None, None, str(e)
+
+
+class Command(BaseCommand):
+    help = "Runs the upload-time media processing on files that were stored before it existed"
+
+    FIELD_TYPES = {
+        "video": VideoField,
+        "pdf": PDFField,
+        "image": ImageField,
+        "html": HTMLDocumentField,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kind",
+            choices=sorted(self.FIELD_TYPES),
+            action="append",
+            help="Only process this kind of media (repeatable). Defaults to all kinds.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Reprocess files even if they already look processed",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Processes used for images. Defaults to the number of CPUs.",
+        )
+
+    def handle(self, *args, **options):
+        kinds = options["kind"] or sorted(self.FIELD_TYPES)
+        for kind in kinds:
+            field_type = self.FIELD_TYPES[kind]
+            for model, field in self._fields(field_type):
+                if field_type is ImageField:
+                    self._process_images(model, field, options["force"], options["workers"])
+                else:
+                    self._process_field(model, field, options["force"])
+
+    def _fields(self, field_type):
+        for model in apps.get_app_config("core").get_models():
+            for field in model._meta.get_fields():
+                if isinstance(field, field_type):
+                    yield model, field
+
+    def _process_field(self, model, field, force):
+        label = f"{model.__name__}.{field.name}"
+        queryset = model.objects.exclude(**{field.name: ""}).exclude(**{f"{field.name}__isnull": True})
+        changed = failed = 0
+        for instance in queryset.iterator(chunk_size=100):
+            fieldfile = getattr(instance, field.name)
+            try:
+                if fieldfile.process(force=force):
+                    changed += 1
+                    self.stdout.write(f"  Processed {label}: {fieldfile.name}")
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"  Failed {label} ({fieldfile.name}): {e}"))
+
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(f"{label}: {changed} processed, {failed} failed"))
+
+    def _process_images(self, model, field, force, workers):
+        """
+            Fills in the dimensions and placeholder of stored images. Files are read and
+            decoded in a process pool, rows are updated in place without saving (and so
+            without regenerating variants), once per distinct file.
+        """
+        label = f"{model.__name__}.{field.name}"
+        if not (field.width_field and field.height_field and field.placeholder_field):
+            self.stdout.write(f"{label}: skipped, no dimension/placeholder fields")
+            return
+
+        queryset = model.objects.exclude(**{field.name: ""}).exclude(**{f"{field.name}__isnull": True})
+        if not force:
+            queryset = queryset.filter(**{field.placeholder_field: ""}) | queryset.filter(
+                **{f"{field.width_field}__isnull": True})
+        names = set(queryset.values_list(field.name, flat=True))
+        if not names:
+            self.stdout.write(self.style.SUCCESS(f"{label}: 0 processed, 0 failed"))
+            return
+
+        # Forked workers must not inherit open database connections
+        connections.close_all()
+        changed = failed = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_image_worker) as pool:
+            futures = [pool.submit(_image_metadata, name) for name in names]
+            for future in as_completed(futures):
+                name, width, height, placeholder, error = future.result()
+                if error:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"  Failed {label} ({name}): {error}"))
+                    continue
+                changed += model.objects.filter(**{field.name: name}).update(**{
+                    field.width_field: width,
+                    field.height_field: height,
+                    field.placeholder_field: placeholder,
+                })
+                blob = MediaBlob.objects.filter(key=name, pinned=False).first()
+                if blob:
+                    blob.metadata = {**blob.metadata, "placeholder": placeholder}
+                    blob.save(update_fields=["metadata"])
+
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(f"{label}: {changed} processed, {failed} failed"))
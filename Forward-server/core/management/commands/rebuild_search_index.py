@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import ActivitySearchDocument, Lesson
+from core.services import SearchService
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the full-text search documents of every activity. Saving an activity keeps its "
+        "document up to date, this is for existing content and after changing SEARCH_CONFIG"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lesson",
+            action="append",
+            help="Only rebuild the activities of this lesson id (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        lessons = Lesson.objects.all()
+        if options["lesson"]:
+            lessons = lessons.filter(pk__in=options["lesson"])
+
+        total = 0
+        for lesson in lessons:
+            with transaction.atomic():
+                # Also drops documents of activities deleted without signals (e.g. queryset.delete())
+                ActivitySearchDocument.objects.filter(lesson=lesson).delete()
+                count = SearchService.index_lesson(lesson)
+            self.stdout.write(f"  {lesson.title}: {count} activities")
+            total += count
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} activities"))
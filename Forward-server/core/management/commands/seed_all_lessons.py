@@ -0,0 +1,209 @@
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def setup_worker():
+    # Needed when the pool spawns its processes instead of forking them (macOS, Windows)
+    import django
+    django.setup()
+
+
+def seed_lesson(json_file: str, options: dict) -> dict:
+    """Runs seed_lessons_data for one file and returns its report, with the captured output."""
+    # Imported here so the pool's processes can unpickle this function before django.setup()
+    from .seed_lessons_data import Command as SeedCommand
+
+    command = SeedCommand()
+    out = io.StringIO()
+    started = time.monotonic()
+    failure = None
+    try:
+        call_command(command, json_file, stdout=out, stderr=out, no_color=True, **options)
+    except Exception as e:
+        failure = f"{type(e).__name__}: {e}"
+    report = getattr(command, "report", None) or {"lesson": None, "seeded": False, "activities": 0,
+                                                   "errors": 0, "files": 0, "bytes": 0}
+    return {
+        **report,
+        "source": json_file,
+        "seconds": time.monotonic() - started,
+        "failure": failure,
+        "output": out.getvalue(),
+    }
+
+
+def failed(report: dict) -> bool:
+    return bool(report["failure"] or not report["seeded"] or report["errors"])
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds every lesson under seed_data/lesson_data with seed_lessons_data, several lessons at a "
+        "time in separate processes. Each lesson is seeded in its own transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "lessons",
+            nargs="*",
+            help="Lesson folders to seed (default: every folder holding a lesson JSON file)",
+        )
+        parser.add_argument(
+            "--root",
+            default=None,
+            help="Directory holding the lesson folders (default: core/management/seed_data/lesson_data)",
+        )
+        parser.add_argument(
+            "--exclude",
+            action="append",
+            default=[],
+            help="Lesson folder to skip (repeatable)",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help="Lessons seeded concurrently (0 seeds them one after another in this process)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Files uploaded concurrently per lesson",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Delete each lesson (and its student responses) before seeding it",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only update what changed since the last seed of each file",
+        )
+        parser.add_argument(
+            "--fail-fast",
+            action="store_true",
+            help="Stop at the first lesson that fails, the lessons not started yet are skipped",
+        )
+
+    def handle(self, *args, **options):
+        if options["reset"] and options["incremental"]:
+            raise CommandError("--reset and --incremental cannot be combined")
+        # Imported here for the same reason as in seed_lesson(), core.seeding loads the models
+        from core.seeding import lesson_data_root
+
+        root = Path(options["root"]) if options["root"] else lesson_data_root()
+        files = self._discover(root, options["lessons"], options["exclude"])
+        if not files:
+            raise CommandError(f"No lesson JSON files found in {root}")
+
+        seed_options = {key: options[key] for key in ("reset", "incremental", "workers")}
+        self.stdout.write(f"Seeding {len(files)} lessons with {options['processes'] or 1} process(es)")
+        started = time.monotonic()
+        reports = []
+
+        if options["processes"] <= 0:
+            for json_file in files:
+                reports.append(seed_lesson(json_file, seed_options))
+                self._line(reports[-1], options["verbosity"])
+                if options["fail_fast"] and failed(reports[-1]):
+                    break
+        else:
+            # Forked processes must not share the parent's database connections
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=options["processes"], initializer=setup_worker)
+            try:
+                futures = {pool.submit(seed_lesson, json_file, seed_options): json_file for json_file in files}
+                for future in as_completed(futures):
+                    try:
+                        report = future.result()
+                    except Exception as e:
+                        # The process itself died (e.g. out of memory)
+                        report = {"lesson": None, "seeded": False, "activities": 0, "errors": 0, "files": 0,
+                                  "bytes": 0, "source": futures[future], "seconds": 0.0,
+                                  "failure": f"{type(e).__name__}: {e}", "output": ""}
+                    reports.append(report)
+                    self._line(report, options["verbosity"])
+                    if options["fail_fast"] and failed(report):
+                        break
+            finally:
+                # Lessons that are already running finish (and commit) either way
+                pool.shutdown(wait=True, cancel_futures=True)
+
+        self._summary(reports, len(files), time.monotonic() - started)
+
+    def _discover(self, root: Path, lessons: list, exclude: list) -> list:
+        """
+        Seed files of the lesson folders, relative to lesson_data when they are in it. The
+        folders with the most data go first so a big lesson does not start last.
+        """
+        if lessons:
+            folders = [root / name for name in lessons]
+            missing = [str(folder) for folder in folders if not folder.is_dir()]
+            if missing:
+                raise CommandError(f"Not a lesson folder: {', '.join(missing)}")
+        else:
+            folders = [path for path in root.iterdir() if path.is_dir()]
+
+        found = []
+        for folder in folders:
+            if folder.name in exclude:
+                continue
+            size = sum(path.stat().st_size for path in folder.rglob("*") if path.is_file())
+            for path in sorted(folder.glob("*.json")):
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if isinstance(data, dict) and "lesson" in data:
+                    found.append((size, path))
+
+        from core.seeding import lesson_data_root
+
+        default_root = lesson_data_root()
+        return [
+            str(path.relative_to(default_root)) if path.is_relative_to(default_root) else str(path)
+            for _, path in sorted(found, key=lambda item: (-item[0], str(item[1])))
+        ]
+
+    def _line(self, report: dict, verbosity: int):
+        status = "FAILED" if failed(report) else "ok"
+        line = (
+            f"  {status:<6} {report['source']:<60} {report['activities']:>3} activities "
+            f"{report['errors']:>3} errors {report['files']:>4} files "
+            f"{report['bytes'] / 1024 / 1024:>7.1f} MB {report['seconds']:>7.1f}s"
+        )
+        self.stdout.write(self.style.ERROR(line) if failed(report) else line)
+        if report["failure"]:
+            self.stdout.write(self.style.ERROR(f"         {report['failure']}"))
+        if verbosity > 1 or (failed(report) and report["output"]):
+            # The whole log with -v 2, otherwise the end of the log of failed lessons
+            lines = report["output"].splitlines()
+            for output_line in lines if verbosity > 1 else lines[-15:]:
+                self.stdout.write(f"         {output_line}")
+
+    def _summary(self, reports: list, total: int, elapsed: float):
+        failures = [report for report in reports if failed(report)]
+        files = sum(report["files"] for report in reports)
+        size = sum(report["bytes"] for report in reports) / 1024 / 1024
+        self.stdout.write(
+            f"Seeded {len(reports) - len(failures)} of {total} lessons in {elapsed:.1f}s "
+            f"({files} files, {size:.1f} MB uploaded)"
+        )
+        if failures:
+            skipped = total - len(reports)
+            raise CommandError(
+                f"{len(failures)} lesson(s) failed: {', '.join(report['source'] for report in failures)}"
+                + (f", {skipped} skipped" if skipped else "")
+            )
+        self.stdout.write(self.style.SUCCESS("All lessons seeded"))
@@ -1,6 +1,7 @@
 # core/management/commands/seed_lesson.py
 import json
 import re
+import time
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -8,12 +9,13 @@ import boto3  # pyright: ignore[reportMissingImports]
 from django.conf import settings
 from django.core.files import File
 from django.core.files.storage import default_storage
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import IntegrityError, transaction
 
 
 from core.models import (
     ActivityManager,
+    ActivitySearchDocument,
     BaseActivity,
     Concept,
     ConceptMap,
@@ -24,7 +26,13 @@ from core.models import (
     IdentificationItem,
     CustomActivityImageAsset,
     JSONImageModel,  # Imported the new model
+    LessonSeedManifest,
+    MediaBlob,
 )
+from core.seeding import AssetHashes, payload_hash
+from core.services import LessonService, SearchService
+from core.signals import SEARCH_CHILDREN, bulk_sync_media_references
+from core.storage import parallel_uploads
 
 
 class Command(BaseCommand):
@@ -42,9 +50,23 @@ class Command(BaseCommand):
             action="store_true",
             help="Delete existing data (matching lesson title) before seeding",
         )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only update the activities and files that changed since the last seed of this file, "
+                 "keeping activity ids (and their student responses)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Files uploaded concurrently (0 uploads each file before moving on)",
+        )
 
     # ---------- Entry ----------
     def handle(self, *args, **options):
+        # Read by seed_all_lessons for its combined report
+        self.report = {"lesson": None, "seeded": False, "activities": 0, "errors": 0, "files": 0, "bytes": 0}
         json_file_path = (
             Path(settings.BASE_DIR)
             / "core"
@@ -54,8 +76,14 @@ class Command(BaseCommand):
             / options["json_file"]
         )
         self.folder_path = json_file_path.parent
+        self.source = options["json_file"]
+        self.incremental = options["incremental"]
+        self.assets = AssetHashes(self.folder_path)
         activity_manager = ActivityManager()
 
+        if options["reset"] and self.incremental:
+            raise CommandError("--reset and --incremental cannot be combined")
+
         data = self._load_json(json_file_path)
         if data is None:
             return
@@ -67,16 +95,15 @@ class Command(BaseCommand):
             return
 
         try:
-            with transaction.atomic():
-                if options["reset"]:
-                    self._warn("Resetting data for this lesson...")
-                    self._delete_existing_data(lesson_title, activity_manager)
-
-                lesson = self._create_or_update_lesson(lesson_payload)
-                activities = data.get("activities", [])
-                self._create_activities(lesson, activities, activity_manager)
-
-                self._ok(f"Successfully seeded lesson: {lesson.title}")
+            if options["workers"] > 0:
+                with parallel_uploads(options["workers"]) as uploads:
+                    started = time.monotonic()
+                    self._seed(lesson_title, lesson_payload, data, activity_manager, options, uploads)
+                self._upload_summary(uploads, time.monotonic() - started)
+                self.report["files"] = sum(count for count, _, __ in uploads.stats.values())
+                self.report["bytes"] = sum(size for _, size, __ in uploads.stats.values())
+            else:
+                self._seed(lesson_title, lesson_payload, data, activity_manager, options)
         except IntegrityError as e:
             self._err(
                 f"Database integrity error: {str(e)}. Perhaps run with --reset?"
@@ -88,6 +115,38 @@ class Command(BaseCommand):
             traceback.print_exc()
             raise
 
+    def _seed(self, lesson_title, lesson_payload, data, activity_manager, options, uploads=None):
+        with transaction.atomic():
+            if options["reset"]:
+                self._warn("Resetting data for this lesson...")
+                self._delete_existing_data(lesson_title, activity_manager)
+
+            self.manifest = (
+                LessonSeedManifest.objects.select_related("lesson").filter(source=self.source).first()
+                if self.incremental else None
+            )
+            # Written to the manifest at the end, only for what was seeded without errors
+            self.seeded_activities = {}
+            self.seeded_assets = {}
+            self.attachments = []
+
+            lesson = self._create_or_update_lesson(lesson_payload)
+            activities = data.get("activities", [])
+            self._create_activities(lesson, activities, activity_manager)
+            self._save_manifest(lesson)
+
+            if uploads is not None:
+                # Inside the transaction, so a failed upload leaves no rows pointing at it
+                self._log(f"Waiting for {len(uploads.pending)} uploads...")
+                uploads.wait()
+            self._ok(f"Successfully seeded lesson: {lesson.title}")
+            self.report.update(lesson=lesson.title, seeded=True, activities=len(self.seeded_activities))
+
+    def _upload_summary(self, uploads, elapsed: float):
+        self._log(f"Uploads ({elapsed:.1f}s):")
+        for kind, (count, size, seconds) in sorted(uploads.stats.items()):
+            self._log(f"  {kind:<14} {count:>4} files {size / 1024 / 1024:>9.1f} MB {seconds:>8.1f}s")
+
     # ---------- JSON ----------
     def _load_json(self, path: Path) -> Optional[dict]:
         try:
@@ -110,30 +169,75 @@ class Command(BaseCommand):
             f"Deleting activities for lesson: {lesson_title} (ID: {lesson.id})"
         )
 
-        for key, (Model, _, __, is_child, ___) in manager.registered_activities.items():
-            if is_child:
-                continue
-            # Questions cascade via their parents
-            if key in ["question"]:
-                continue
-            if hasattr(Model, "lesson"):
-                deleted, _ = Model.objects.filter(lesson=lesson).delete()
-                if deleted:
-                    self._log(f"  Deleted {deleted} {Model.__name__} objects.")
+        # Only the activity types the lesson uses are deleted from, children cascade via their parents
+        ids_by_type = {}
+        for entry in LessonService.get_activity_index(lesson=lesson):
+            ids_by_type.setdefault(entry["type"], []).append(entry["id"])
+        for key, ids in ids_by_type.items():
+            Model = manager.registered_activities[key][0]
+            deleted, _ = Model.objects.filter(id__in=ids).delete()
+            if deleted:
+                self._log(f"  Deleted {deleted} {Model.__name__} objects.")
 
         lesson.delete()
         self._log(f"Deleted lesson: {lesson_title}")
 
+    # ---------- Manifest ----------
+    def _hash(self, payload) -> Tuple[str, Dict[str, str]]:
+        """Content hash of a payload and the files it references, and those files' hashes."""
+        assets = self.assets.referenced(payload)
+        return payload_hash({"payload": payload, "assets": assets}), assets
+
+    def _unchanged_asset(self, path: Path, stored: Optional[str]) -> bool:
+        """
+        Whether an incremental seed can skip uploading the seed file at path because `stored`, the
+        digest of the file the row holds now, is the same content. Compared against the stored
+        blob rather than the manifest, since the row (matched by title or position) may hold
+        another file of the seed folder.
+        """
+        if not self.manifest or not stored:
+            return False
+        return stored == self.assets.get(path.relative_to(self.folder_path).as_posix())
+
+    def _stored_digests(self, names) -> Dict[str, str]:
+        """Digests of the stored files by storage key, in one query. Only incremental seeds skip uploads."""
+        names = [name for name in names if name]
+        if not self.manifest or not names:
+            return {}
+        return dict(MediaBlob.objects.filter(key__in=names).values_list("key", "sha256"))
+
+    def _save_manifest(self, lesson: Lesson):
+        # One manifest per lesson, e.g. after its seed file was renamed
+        LessonSeedManifest.objects.filter(lesson=lesson).exclude(source=self.source).delete()
+        LessonSeedManifest.objects.update_or_create(
+            source=self.source,
+            defaults={
+                "lesson": lesson,
+                "lesson_hash": self.lesson_hash,
+                "activities": self.seeded_activities,
+                "assets": self.seeded_assets,
+            },
+        )
+
     # ---------- Lesson ----------
     def _create_or_update_lesson(self, payload: dict) -> Lesson:
+        self.lesson_hash, assets = self._hash(payload)
+        self.seeded_assets.update(assets)
         payload = payload.copy()
         image_filename = payload.pop("image", None)
 
-        lesson, created = Lesson.objects.update_or_create(
-            title=payload.get("title"),
-            active=True,
-            defaults=payload,
-        )
+        if self.manifest:
+            if self.manifest.lesson_hash == self.lesson_hash:
+                self._log(f"Unchanged lesson: {self.manifest.lesson.title}")
+                return self.manifest.lesson
+            # Matched by id, so a renamed lesson is updated instead of seeded again
+            lesson, created = Lesson.objects.update_or_create(pk=self.manifest.lesson_id, defaults=payload)
+        else:
+            lesson, created = Lesson.objects.update_or_create(
+                title=payload.get("title"),
+                active=True,
+                defaults=payload,
+            )
 
         if image_filename:
             self._save_model_file(
@@ -147,9 +251,73 @@ class Command(BaseCommand):
         return lesson
 
     # ---------- Activities ----------
+    def _plan_activities(
+        self, lesson: Lesson, activities: List[dict], manager: ActivityManager
+    ) -> Tuple[Dict[int, dict], List[dict]]:
+        """
+        Hashes the JSON activities and, in incremental mode, matches them to the lesson's existing
+        activities of the same type: first by unchanged hash, then by title, then by position.
+        Returns the JSON activities by order (with the matched index entry, if any) and the
+        existing activities that are no longer in the JSON.
+        """
+        plan = {}
+        for order, raw in enumerate(activities, start=1):
+            act_type = (raw.get("type", "") or "").lower()
+            if act_type in manager.registered_activities and not manager.registered_activities[act_type][3]:
+                activity_hash, assets = self._hash(raw)
+                plan[order] = {
+                    "order": order,
+                    "type": act_type,
+                    "title": raw.get("title", f"{act_type.capitalize()} Activity {order}"),
+                    "hash": activity_hash,
+                    "assets": assets,
+                    "existing": None,
+                }
+        if not self.incremental:
+            return plan, []
+
+        hashes = self.manifest.activities if self.manifest else {}
+        unclaimed = {entry["id"]: entry for entry in LessonService.get_activity_index(lesson=lesson)}
+        matchers = (
+            lambda entry, item: hashes.get(str(entry["id"])) == item["hash"],
+            lambda entry, item: entry["title"] == item["title"],
+            lambda entry, item: entry["order"] == item["order"],
+        )
+        for matches in matchers:
+            for item in plan.values():
+                if item["existing"]:
+                    continue
+                for entry in unclaimed.values():
+                    if entry["type"] == item["type"] and matches(entry, item):
+                        item["existing"] = unclaimed.pop(entry["id"])
+                        break
+        return plan, list(unclaimed.values())
+
+    def _keep_activity(self, item: dict, order: int, manager: ActivityManager):
+        """Leaves an unchanged activity alone, apart from moving it to its new position."""
+        entry = item["existing"]
+        if entry["order"] == order:
+            self._log(f"Unchanged {item['type']} (Order: {order}): {entry['title']}")
+            return
+        Model = manager.registered_activities[item["type"]][0]
+        Model.objects.filter(pk=entry["id"]).update(order=order)
+        ActivitySearchDocument.objects.filter(activity_type=item["type"], activity_id=entry["id"]).update(order=order)
+        self._log(f"Moved {item['type']} (Order: {entry['order']} -> {order}): {entry['title']}")
+
+    def _record_activity(self, activity_id, item: dict):
+        self.seeded_activities[str(activity_id)] = item["hash"]
+        self.seeded_assets.update(item["assets"])
+
+    def _delete_removed_activities(self, removed: List[dict], manager: ActivityManager):
+        for entry in removed:
+            Model = manager.registered_activities[entry["type"]][0]
+            Model.objects.filter(pk=entry["id"]).delete()
+            self._warn(f"Deleted {entry['type']} no longer in the seed file (Order: {entry['order']}): {entry['title']}")
+
     def _create_activities(
         self, lesson: Lesson, activities: List[dict], manager: ActivityManager
     ):
+        plan, removed = self._plan_activities(lesson, activities, manager)
         for order, raw in enumerate(activities, start=1):
             act = raw.copy()
             act_type = (act.pop("type", "") or "").lower()
@@ -167,6 +335,13 @@ class Command(BaseCommand):
                 # top-level only
                 continue
 
+            item = plan[order]
+            existing = item["existing"]
+            if existing and self.manifest and self.manifest.activities.get(str(existing["id"])) == item["hash"]:
+                self._keep_activity(item, order, manager)
+                self._record_activity(existing["id"], item)
+                continue
+
             # Extract children payloads before building defaults
             questions = act.pop("questions", None) if act_type == "quiz" else None
             concepts = act.pop("examples", None) if act_type == "conceptmap" else None
@@ -244,11 +419,21 @@ class Command(BaseCommand):
             }
 
             try:
-                activity, created = ActivityModel.objects.update_or_create(
-                    lesson=lesson,
-                    order=order,
-                    defaults=defaults,
-                )
+                if existing:
+                    # Updated in place so its responses stay attached
+                    activity, created = ActivityModel.objects.update_or_create(
+                        pk=existing["id"],
+                        defaults={**defaults, "lesson": lesson, "order": order},
+                    )
+                elif self.incremental:
+                    # Its position may still be held by an activity that moves later on
+                    activity, created = ActivityModel.objects.create(lesson=lesson, order=order, **defaults), True
+                else:
+                    activity, created = ActivityModel.objects.update_or_create(
+                        lesson=lesson,
+                        order=order,
+                        defaults=defaults,
+                    )
                 self._log(
                     f"{'Created' if created else 'Updated'} "
                     f"{act_type} (Order: {order}): {activity.title}"
@@ -270,7 +455,8 @@ class Command(BaseCommand):
                         rel_path=self.folder_path / image_name,
                         label=f"{ActivityModel.__name__} asset",
                     )
-                elif act_type in {"video", "quiz"} and video_name:
+                # Not an elif, a quiz can have both an image and a video
+                if act_type in {"video", "quiz"} and video_name:
                     self._save_model_file(
                         instance=activity,
                         field_name="video",
@@ -311,6 +497,7 @@ class Command(BaseCommand):
                     self._create_slides(activity, slides)
                 elif act_type == "customactivity" and custom_images:
                     self._create_cust_assets(activity, custom_images)
+                self._record_activity(activity.pk, item)
             except Exception as e:
                 self._err(
                     f"Failed to create/update {act_type} (Order: {order}): {e}"
@@ -319,6 +506,9 @@ class Command(BaseCommand):
 
                 traceback.print_exc()
 
+        self._attach_files()
+        self._delete_removed_activities(removed, manager)
+
     # ---------- JSON Image Model Helper ----------
     def _create_json_image_model(self, rel_path: str) -> Optional[str]:
         """
@@ -337,11 +527,9 @@ class Command(BaseCommand):
                 # causing SuspiciousFileOperation.
                 file_name = Path(rel_path).name
                 
-                json_image = JSONImageModel.objects.create(
-                    image=File(f, name=file_name)
-                )
+                json_image = JSONImageModel.from_file(File(f, name=file_name))
                 
-                self._log(f"  Created JSONImageModel: {json_image.id} for {rel_path}")
+                self._log(f"  Using JSONImageModel: {json_image.id} for {rel_path}")
                 return str(json_image.id)
         except Exception as e:
             self._err(f"  Failed to create JSONImageModel for '{rel_path}': {e}")
@@ -372,11 +560,12 @@ class Command(BaseCommand):
             for tup in images:
                 rel_image = tup[0].strip()
                 local = self.folder_path / "twine" / rel_image
+                key = f"public/twine/images/{Path(rel_image).name}"
+                if self._unchanged_asset(local, self._stored_digests([key]).get(key)):
+                    continue
                 try:
                     with open(local, "rb") as img:
-                        s3_name = Path(rel_image).name
-                        key = f"public/twine/images/{s3_name}"
-                        default_storage.save(key, img)
+                        MediaBlob.store(key, File(img), pinned=True)
                         self._log(f"  Uploaded Twine sub-asset: {rel_image}")
                 except Exception:
                     self._err(
@@ -390,14 +579,123 @@ class Command(BaseCommand):
             return False
 
     # ---------- Children ----------
+    def _sync_children(
+        self, Model, parent_field: str, parent, rows: List[Tuple[dict, dict]], label: str, match_on: Tuple[str, ...] = ()
+    ):
+        """
+        Makes a parent's children match rows, a list of (field values, files) in order where files
+        maps file fields to paths in the seed folder. Existing children are matched on the
+        match_on fields (e.g. a question's text), then by position between the matched ones, and
+        keep their ids (and the responses pointing at them): new ones are bulk created, changed
+        ones bulk updated and unmatched ones deleted. The files are attached afterwards by
+        _attach_files, once for every activity.
+        """
+        ordering = ["order", "pk"] if any(f.name == "order" for f in Model._meta.fields) else ["pk"]
+        existing = list(Model.objects.filter(**{parent_field: parent}).order_by(*ordering))
+        model_fields = {f.name: f for f in Model._meta.get_fields()}
+        rows = [
+            (
+                {
+                    k: v
+                    for k, v in values.items()
+                    if k in model_fields and (v is not None or getattr(model_fields[k], "null", False))
+                },
+                files,
+            )
+            for values, files in rows
+        ]
+
+        matches = [None] * len(rows)
+        if match_on:
+            by_key = {}
+            for index, child in enumerate(existing):
+                by_key.setdefault(payload_hash([getattr(child, field) for field in match_on]), []).append(index)
+            for row, (values, _) in enumerate(rows):
+                candidates = by_key.get(payload_hash([values.get(field) for field in match_on]))
+                if candidates:
+                    matches[row] = candidates.pop(0)
+        # The rest is matched by position within the gaps, so an edited child keeps its id
+        claimed = {index for index in matches if index is not None}
+        previous = -1
+        for row in range(len(rows)):
+            if matches[row] is None:
+                following = next((index for index in matches[row + 1:] if index is not None), len(existing))
+                matches[row] = next(
+                    (index for index in range(previous + 1, following) if index not in claimed), None
+                )
+            if matches[row] is not None:
+                claimed.add(matches[row])
+                previous = matches[row]
+
+        created, updated, changed_fields = [], [], set()
+        for (values, files), index in zip(rows, matches):
+            if index is not None:
+                child = existing[index]
+                changed = {k for k, v in values.items() if getattr(child, k) != v}
+                for k in changed:
+                    setattr(child, k, values[k])
+                if changed:
+                    updated.append(child)
+                    changed_fields |= changed
+            else:
+                child = Model(**{parent_field: parent}, **values)
+                created.append(child)
+            for field_name, path in files.items():
+                self.attachments.append((child, field_name, path))
+
+        stale = [child.pk for index, child in enumerate(existing) if index not in claimed]
+        if stale:
+            Model.objects.filter(pk__in=stale).delete()
+        Model.objects.bulk_create(created, batch_size=500)
+        if updated:
+            Model.objects.bulk_update(updated, sorted(changed_fields), batch_size=500)
+        self._log(
+            f"    {label}: {len(created)} created, {len(updated)} updated, "
+            f"{len(rows) - len(created) - len(updated)} unchanged, {len(stale)} deleted"
+        )
+        if Model.__name__ in SEARCH_CHILDREN:
+            # The bulk queries skip the signal that rebuilds the parent's search document
+            SearchService.index(parent)
+
+    def _attach_files(self):
+        """
+        Saves the files queued by _sync_children. The uploads run on the upload pool (see
+        parallel_uploads) while the rows are written with one bulk_update per model.
+        """
+        saved = {}
+        stored = self._stored_digests(getattr(child, field_name).name for child, field_name, _ in self.attachments)
+        for child, field_name, path in self.attachments:
+            fieldfile = getattr(child, field_name)
+            if self._unchanged_asset(path, stored.get(fieldfile.name)):
+                continue
+            try:
+                with open(path, "rb") as f:
+                    fieldfile.save(path.name, File(f), save=False)
+            except FileNotFoundError:
+                self._err(f"  File not found: {path}")
+                continue
+            saved.setdefault(type(child), {}).setdefault(child.pk, (child, []))[1].append(field_name)
+            self._log(f"  Uploaded {type(child).__name__} {field_name}: {path.name}")
+        self.attachments = []
+
+        for Model, children in saved.items():
+            fields = [f.name for f in Model._meta.concrete_fields if not f.primary_key]
+            instances = [child for child, _ in children.values()]
+            Model.objects.bulk_update(instances, fields, batch_size=500)
+            bulk_sync_media_references(Model, instances)
+            # imagefield generates variants in post_save, which bulk_update skips
+            for child, field_names in children.values():
+                for field_name in field_names:
+                    fieldfile = getattr(child, field_name)
+                    for spec in getattr(fieldfile.field, "formats", None) or ():
+                        fieldfile.process(spec)
+
     def _create_questions(self, quiz, questions: List[dict]):
         self._log(f"  Processing {len(questions)} questions for quiz: {quiz.title}")
+        rows = []
         for order, q in enumerate(questions, start=1):
-            q = q.copy()
-            question_image_name = q.pop("image", None)
-            question_video_name = q.pop("video", None)
-
-            defaults = {
+            values = {
+                "order": order,
                 "question_text": q.get("question_text", ""),
                 "question_type": q.get("question_type", "multiple_choice"),
                 "has_correct_answer": q.get("has_correct_answer", True),
@@ -405,53 +703,27 @@ class Command(BaseCommand):
                 "is_required": q.get("is_required", True),
                 "feedback_config": q.get("feedback_config", {}),
             }
-            try:
-                obj, created = Question.objects.update_or_create(
-                    quiz=quiz, order=order, defaults=defaults
-                )
-
-                # If optional question image in json upload it
-                if question_image_name:
-                    self._save_model_file(
-                        instance=obj,
-                        field_name="image",
-                        rel_path=self.folder_path / question_image_name,
-                        label=f"Question image",
-                    )
-
-                # same thing but for video
-                if question_video_name:
-                    self._save_model_file(
-                        instance=obj,
-                        field_name="video",
-                        rel_path=self.folder_path / question_video_name,
-                        label=f"Question video"
-                    )
-                self._log(
-                    f"    {'Created' if created else 'Updated'} question "
-                    f"(Order: {order}): {obj.question_text[:50]}..."
-                )
-            except Exception as e:
-                self._err(
-                    f"    Failed question (Order: {order}) for "
-                    f"quiz '{quiz.title}': {e}"
-                )
+            # Optional question image and video
+            files = {
+                field: self.folder_path / q[field]
+                for field in ("image", "video") if q.get(field)
+            }
+            rows.append((values, files))
+        self._sync_children(Question, "quiz", quiz, rows, "Questions", match_on=("question_text", "question_type"))
 
     def _create_concepts(self, cmap, concepts: List[dict]):
         self._log(
             f"  Processing {len(concepts)} concepts for concept map: {cmap.title}"
         )
+        rows = []
         for order, payload in enumerate(concepts, start=1):
-            payload = payload.copy()
-            image_filename = payload.pop("image", None)
-
             # Process examples array for JSONImageModels
             examples = payload.get("examples", []) or []
             for ex in examples:
                 img_path = ex.get("image")
                 if not img_path:
                     continue
-                
+
                 # Convert path to JSONImageModel UUID
                 image_uuid = self._create_json_image_model(img_path)
                 if image_uuid:
@@ -459,143 +731,61 @@ class Command(BaseCommand):
                 else:
                     ex["image"] = None
 
-            model_fields = {f.name: f for f in Concept._meta.get_fields()}
-            defaults = {
+            values = {
+                "order": order,
                 "title": payload.get("title", f"Concept {order}"),
                 "description": payload.get("description", ""),
                 "examples": examples,
                 "instructions": payload.get("instructions"),
             }
-            defaults = {
-                k: v
-                for k, v in defaults.items()
-                if k in model_fields and (v is not None or getattr(model_fields[k], "null", False))
-            }
-
-            try:
-                obj, created = Concept.objects.update_or_create(
-                    concept_map=cmap,
-                    order=order,
-                    defaults=defaults,
-                )
-                if image_filename:
-                    self._save_model_file(
-                        instance=obj,
-                        field_name="image",
-                        rel_path=self.folder_path / image_filename,
-                        label="Concept image",
-                    )
-                self._log(
-                    f"    {'Created' if created else 'Updated'} concept "
-                    f"(Order: {order}): {obj.title[:50]}..."
-                )
-            except Exception as e:
-                self._err(
-                    f"    Failed concept (Order: {order}) for "
-                    f"'{cmap.title}': {e}"
-                )
+            files = {"image": self.folder_path / payload["image"]} if payload.get("image") else {}
+            rows.append((values, files))
+        self._sync_children(Concept, "concept_map", cmap, rows, "Concepts", match_on=("title",))
 
     def _create_cust_assets(self, custom_activity, images: List[str]):
         self._log(
-            f"  Processing {len(images)} idents for custom activity: {custom_activity.title}"
+            f"  Processing {len(images)} images for custom activity: {custom_activity.title}"
         )
-        for order, image_name in enumerate(images, start=1):
-            model_fields = {f.name: f for f in CustomActivityImageAsset._meta.get_fields()}
-            defaults = {}
-            defaults = {
-                k: v
-                for k, v in defaults.items()
-                if k in model_fields and (v is not None or getattr(model_fields[k], "null", False))
-            }
+        # CustomActivityImageAsset has no order, the images are matched in creation order
+        rows = [({}, {"image": self.folder_path / image_name} if image_name else {}) for image_name in images]
+        self._sync_children(CustomActivityImageAsset, "custom_activity", custom_activity, rows, "Custom activity images")
 
-            try:
-                # Use CustomActivityImageAsset for custom activity images
-                obj, created = CustomActivityImageAsset.objects.update_or_create(
-                    custom_activity=custom_activity,
-                    # Note: CustomActivityImageAsset might not have 'order', so we rely on ID if unique constraint isn't on order
-                    # Assuming we just create them. If distinct images are needed, update_or_create logic might differ.
-                    # Here we try to match if possible, but images list is just strings.
-                    defaults=defaults,
-                )
-                if image_name:
-                    self._save_model_file(
-                        instance=obj,
-                        field_name="image",
-                        rel_path=self.folder_path / image_name,
-                        label="Custom Activity Image image",
-                    )
-                self._log(
-                    f"    {'Created' if created else 'Updated'} Custom Activity Image "
-                    f"(Order: {order}): ..."
-                )
-            except Exception as e:
-                self._err(
-                    f"    Failed Custom Activity Image (Order: {order}) for "
-                    f"'{custom_activity.title}': {e}"
-                )
-        
     def _create_idents(self, ident_parent, boxes: List[dict]):
         self._log(
             f"  Processing {len(boxes)} idents for identification: {ident_parent.title}"
         )
+        rows = []
         for order, payload in enumerate(boxes, start=1):
-            payload = payload.copy()
-            image_filename = payload.pop("image", None)
-
-            model_fields = {f.name: f for f in IdentificationItem._meta.get_fields()}
-            defaults = {
-                "hints": payload.get("hints",True),
+            values = {
+                "order": order,
+                "hints": payload.get("hints", True),
                 "areas": payload.get("areas"),
             }
-            defaults = {
-                k: v
-                for k, v in defaults.items()
-                if k in model_fields and (v is not None or getattr(model_fields[k], "null", False))
-            }
-
-            try:
-                obj, created = IdentificationItem.objects.update_or_create(
-                    identification=ident_parent,
-                    order=order,
-                    defaults=defaults,
-                )
-                if image_filename:
-                    self._save_model_file(
-                        instance=obj,
-                        field_name="image",
-                        rel_path=self.folder_path / image_filename,
-                        label="Identification image",
-                    )
-                self._log(
-                    f"    {'Created' if created else 'Updated'} Identification Item "
-                    f"(Order: {order}): ..."
-                )
-            except Exception as e:
-                self._err(
-                    f"    Failed Identification Item (Order: {order}) for "
-                    f"'{ident_parent.title}': {e}"
-                )
+            files = {"image": self.folder_path / payload["image"]} if payload.get("image") else {}
+            rows.append((values, files))
+        self._sync_children(
+            IdentificationItem, "identification", ident_parent, rows, "Identification items", match_on=("areas",)
+        )
 
     def _create_slides(self, slideshow: Slideshow, slides: List[dict]):
         self._log(f"  Processing {len(slides)} slides for slideshow: {slideshow.title}")
-        for order, s in enumerate(slides, start=0):
-            s = s.copy()
-            image_filename = s.pop("image", None)
-            slide = Slide.objects.create(
-                slideshow=slideshow, order=order, content=s.get("content")
+        rows = [
+            (
+                {"order": order, "content": s.get("content")},
+                {"image": self.folder_path / s["image"]} if s.get("image") else {},
             )
-            if image_filename:
-                self._save_model_file(
-                    instance=slide,
-                    field_name="image",
-                    rel_path=self.folder_path / image_filename,
-                    label="Slide image",
-                )
+            for order, s in enumerate(slides, start=0)
+        ]
+        self._sync_children(Slide, "slideshow", slideshow, rows, "Slides", match_on=("content",))
 
     # ---------- Storage helpers ----------
     def _save_model_file(
         self, instance, field_name: str, rel_path: Path, label: str
     ):
+        name = getattr(instance, field_name).name
+        if self._unchanged_asset(rel_path, self._stored_digests([name]).get(name)):
+            self._log(f"  Unchanged {label}: {rel_path.name}")
+            return
         try:
             with open(rel_path, "rb") as f:
                 getattr(instance, field_name).save(
@@ -617,23 +807,23 @@ class Command(BaseCommand):
         with open(final_path, "rb") as f:
             save_key = f"public/{key_prefix}{Path(image_filename).name}"
             saved = default_storage.save(save_key, f)
-            url = default_storage.url(saved)
             self._log(".UPLOADED")
-            return url
+            return saved
 
     def bucket_url_call(self, image_filename: str, key_prefix: str = "") -> Optional[str]:
+        """Uploads an image referenced by content unless it is stored already, returns its key."""
         msg = f"  UPLOADING: '{image_filename}' INTO 'public/{key_prefix}'"
         self._log(f"{msg:.<77}", ending="")
         final_key = f"public/{key_prefix}{Path(image_filename).name}"
         try:
             if default_storage.exists(final_key):
                 self._log("CACHE HIT")
-                return default_storage.url(final_key)
+                return final_key
             return self._upload_image_to_bucket(image_filename, key_prefix)
         except Exception:
             self._err("No bucket found or connection error.")
             self._err("Attempting to create bucket...")
-            if settings.DEBUG:
+            if settings.DEBUG and settings.MEDIA_BACKEND != "local":
                 self._warn("Development mode: Creating MinIO bucket")
                 self._create_minio_bucket()
                 return self._upload_image_to_bucket(image_filename, key_prefix)
@@ -652,7 +842,7 @@ class Command(BaseCommand):
             aws_access_key_id="minioadmin",
             aws_secret_access_key="minioadmin",
         )
-        bucket = settings.STORAGES["default"]["OPTIONS"]["bucket_name"]
+        bucket = settings.STORAGES["s3"]["OPTIONS"]["bucket_name"]
         try:
             s3_client.create_bucket(Bucket=bucket)
             self._ok(f"Bucket Created: {bucket}")
@@ -673,4 +863,5 @@ class Command(BaseCommand):
         self.stdout.write(self.style.WARNING(msg))
 
     def _err(self, msg: str):
+        self.report["errors"] += 1
         self.stdout.write(self.style.ERROR(msg))
\ No newline at end of file
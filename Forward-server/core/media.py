@@ -0,0 +1,373 @@
+"""
+Upload-time processing for media files (videos, PDFs, image placeholders and HTML documents).
+
+Everything here works on local temporary files so uploads never have to be held in
+memory. External tools (ffmpeg, qpdf, poppler's pdfinfo/pdftoppm) are only used when
+they are installed; the pure python paths are always available.
+"""
+import base64
+import hashlib
+import io
+import logging
+import os
+import re
+import shutil
+import struct
+import subprocess
+from typing import BinaryIO, Iterator
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+# Atoms that only contain other atoms on the path from moov down to the chunk offset tables
+MP4_CONTAINER_ATOMS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"dinf"}
+MP4_EXTENSIONS = (".mp4", ".m4v", ".mov")
+# Longest side of the inline preview shown while an image loads
+PLACEHOLDER_SIZE = 20
+
+
+class MediaError(Exception):
+    """Raised when a media file cannot be parsed or processed."""
+
+
+def tool(name: str) -> str | None:
+    """Returns the path to an external binary if it is installed."""
+    return shutil.which(name)
+
+
+def copy_stream(src: BinaryIO, dst: BinaryIO, length: int | None = None):
+    """Copies `length` bytes (or everything) from src to dst in fixed size chunks."""
+    while length is None or length > 0:
+        chunk = src.read(CHUNK_SIZE if length is None else min(CHUNK_SIZE, length))
+        if not chunk:
+            if length:
+                raise MediaError("Unexpected end of file")
+            return
+        dst.write(chunk)
+        if length is not None:
+            length -= len(chunk)
+
+
+# ---------- MP4 ----------
+
+def iter_atoms(f: BinaryIO, start: int, end: int) -> Iterator[tuple[bytes, int, int, int]]:
+    """
+        Yields (type, offset, header_size, total_size) for each atom between start and end.
+        An end of -1 reads until EOF.
+    """
+    offset = start
+    while end == -1 or offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:  # atom extends to the end of the file
+            f.seek(0, os.SEEK_END)
+            size = f.tell() - offset
+        if size < header_size:
+            raise MediaError(f"Invalid size for atom {kind!r} at {offset}")
+        yield kind, offset, header_size, size
+        offset += size
+
+
+def is_faststart(f: BinaryIO) -> bool:
+    """True when the moov atom comes before the media data, or there is nothing to move."""
+    for kind, *_ in iter_atoms(f, 0, -1):
+        if kind == b"moov":
+            return True
+        if kind == b"mdat":
+            return False
+    return True
+
+
+def _patch_chunk_offsets(moov: bytearray, start: int, end: int, shift: int):
+    """Adds `shift` to every entry of the stco/co64 tables inside moov[start:end]."""
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", moov, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", moov, offset + 8)[0]
+            header_size = 16
+        if size < header_size or offset + size > end:
+            raise MediaError(f"Invalid size for atom {kind!r} inside moov")
+
+        if kind in MP4_CONTAINER_ATOMS:
+            _patch_chunk_offsets(moov, offset + header_size, offset + size, shift)
+        elif kind in (b"stco", b"co64"):
+            width = "I" if kind == b"stco" else "Q"
+            count = struct.unpack_from(">I", moov, offset + header_size + 4)[0]
+            table = offset + header_size + 8
+            values = [v + shift for v in struct.unpack_from(f">{count}{width}", moov, table)]
+            if kind == b"stco" and values and max(values) > 0xFFFFFFFF:
+                raise MediaError("Chunk offset overflows stco, file needs co64")
+            struct.pack_into(f">{count}{width}", moov, table, *values)
+        elif kind == b"cmov":
+            raise MediaError("Compressed moov atoms are not supported")
+        offset += size
+
+
+def faststart(src: BinaryIO, dst: BinaryIO) -> bool:
+    """
+        Rewrites an MP4 so the moov atom precedes mdat, the layout browsers need to start
+        playback before the whole file has downloaded.
+
+        Atoms are streamed from src to dst and only the moov atom (the sample tables,
+        normally a few hundred KB) is held in memory. Padding in front of mdat is dropped.
+        Returns False without writing anything when src is already fast-start.
+    """
+    atoms = list(iter_atoms(src, 0, -1))
+    kinds = [a[0] for a in atoms]
+    if b"moov" not in kinds or b"mdat" not in kinds:
+        raise MediaError("Not an MP4 file (missing moov or mdat)")
+    if kinds.index(b"moov") < kinds.index(b"mdat"):
+        return False
+
+    moov_index = kinds.index(b"moov")
+    last_mdat = len(kinds) - 1 - kinds[::-1].index(b"mdat")
+    if moov_index < last_mdat:
+        # Media data on both sides of moov would need two different offset shifts
+        raise MediaError("moov atom sits between mdat atoms")
+
+    _, moov_offset, moov_header, moov_size = atoms[moov_index]
+    src.seek(moov_offset)
+    moov = bytearray(src.read(moov_size))
+
+    # Everything before the first mdat stays in front of moov (ftyp, etc.), minus padding
+    first_mdat = kinds.index(b"mdat")
+    head = [a for a in atoms[:first_mdat] if a[0] not in (b"free", b"skip")]
+    tail = [a for a in atoms[first_mdat:] if a[0] != b"moov"]
+
+    shift = sum(a[3] for a in head) + moov_size - atoms[first_mdat][1]
+    _patch_chunk_offsets(moov, moov_header, moov_size, shift)
+
+    for _, offset, _, size in head:
+        src.seek(offset)
+        copy_stream(src, dst, size)
+    dst.write(moov)
+    for _, offset, _, size in tail:
+        src.seek(offset)
+        copy_stream(src, dst, size)
+    return True
+
+
+def mp4_duration(f: BinaryIO) -> float | None:
+    """Reads the presentation duration in seconds from the mvhd atom."""
+    for kind, offset, header_size, size in iter_atoms(f, 0, -1):
+        if kind != b"moov":
+            continue
+        for child, child_offset, child_header, _ in iter_atoms(f, offset + header_size, offset + size):
+            if child != b"mvhd":
+                continue
+            f.seek(child_offset + child_header)
+            version = f.read(4)[0]
+            if version == 1:
+                _, _, timescale, duration = struct.unpack(">QQIQ", f.read(28))
+            else:
+                _, _, timescale, duration = struct.unpack(">IIII", f.read(16))
+            if not timescale or duration in (0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+                return None
+            return round(duration / timescale, 3)
+    return None
+
+
+def normalize_mp4(src_path: str, dst_path: str) -> bool:
+    """
+        Writes a fast-start copy of src_path to dst_path. Tries the in-python rewriter first
+        and falls back to ffmpeg (when installed) for files it cannot handle.
+        Returns False if src_path already is fast-start or could not be rewritten.
+    """
+    try:
+        with open(src_path, "rb") as src:
+            if is_faststart(src):
+                return False
+            src.seek(0)
+            with open(dst_path, "wb") as dst:
+                return faststart(src, dst)
+    except (MediaError, struct.error, IndexError) as e:
+        ffmpeg = tool("ffmpeg")
+        if not ffmpeg:
+            logger.warning("Could not move moov atom of %s: %s", src_path, e)
+            return False
+        result = subprocess.run(
+            [ffmpeg, "-y", "-v", "error", "-i", src_path, "-map", "0", "-c", "copy",
+             "-movflags", "+faststart", "-f", "mp4", dst_path],
+            capture_output=True,
+        )
+        if result.returncode != 0:
+            logger.warning("ffmpeg faststart failed for %s: %s", src_path, result.stderr.decode(errors="ignore"))
+            return False
+        return True
+
+
+def video_poster(path: str, duration: float | None = None, width: int = 1280) -> bytes | None:
+    """Renders a JPEG poster frame with ffmpeg, or returns None when ffmpeg is not installed."""
+    ffmpeg = tool("ffmpeg")
+    if not ffmpeg:
+        return None
+    # Skip past fade-ins/black leaders without going beyond very short clips
+    at = min(1.0, duration / 2) if duration else 0
+    result = subprocess.run(
+        [ffmpeg, "-v", "error", "-ss", str(at), "-i", path, "-frames:v", "1",
+         "-vf", f"scale='min({width},iw)':-2", "-q:v", "3", "-f", "image2", "-c:v", "mjpeg", "pipe:1"],
+        capture_output=True,
+    )
+    if result.returncode != 0 or not result.stdout:
+        logger.warning("Could not render poster for %s: %s", path, result.stderr.decode(errors="ignore"))
+        return None
+    return result.stdout
+
+
+# ---------- PDF ----------
+
+PDF_PAGE_PATTERN = re.compile(rb"/Type\s*/Page(?![A-Za-z])")
+PDF_LINEARIZED_PATTERN = re.compile(rb"/Linearized\s")
+
+
+def pdf_page_count(path: str) -> int | None:
+    """
+        Number of pages, from pdfinfo when installed. Otherwise page objects are counted
+        by scanning the file, which misses pages stored in compressed object streams, in
+        that case None is returned.
+    """
+    pdfinfo = tool("pdfinfo")
+    if pdfinfo:
+        result = subprocess.run([pdfinfo, path], capture_output=True)
+        match = re.search(rb"^Pages:\s+(\d+)", result.stdout, re.M)
+        if result.returncode == 0 and match:
+            return int(match.group(1))
+
+    count = 0
+    overlap = b""
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            data = overlap + chunk
+            # Matches starting in the last few bytes are counted with the next chunk
+            safe = max(len(data) - 32, 0)
+            count += sum(1 for m in PDF_PAGE_PATTERN.finditer(data) if m.start() < safe)
+            overlap = data[safe:]
+        count += len(PDF_PAGE_PATTERN.findall(overlap))
+    return count or None
+
+
+def pdf_is_linearized(path: str) -> bool:
+    """A linearization dictionary has to be the first object in the file."""
+    with open(path, "rb") as f:
+        return bool(PDF_LINEARIZED_PATTERN.search(f.read(1024)))
+
+
+def linearize_pdf(src_path: str, dst_path: str) -> bool:
+    """
+        Writes a linearized ("fast web view") copy of the PDF with qpdf, so viewers can
+        render page one from the first few range requests. Returns False if qpdf is not
+        installed, the file already is linearized, or qpdf failed.
+    """
+    qpdf = tool("qpdf")
+    if not qpdf or pdf_is_linearized(src_path):
+        return False
+    result = subprocess.run([qpdf, "--linearize", src_path, dst_path], capture_output=True)
+    # qpdf exits with 3 when it succeeded with warnings
+    if result.returncode not in (0, 3):
+        logger.warning("qpdf could not linearize %s: %s", src_path, result.stderr.decode(errors="ignore"))
+        return False
+    return True
+
+
+def pdf_thumbnail(path: str, width: int = 800) -> bytes | None:
+    """Renders the first page as a JPEG with pdftoppm, or returns None when it is not installed."""
+    pdftoppm = tool("pdftoppm")
+    if not pdftoppm:
+        return None
+    result = subprocess.run(
+        [pdftoppm, "-f", "1", "-l", "1", "-singlefile", "-scale-to", str(width), "-jpeg", path],
+        capture_output=True,
+    )
+    if result.returncode != 0 or not result.stdout:
+        logger.warning("Could not render thumbnail for %s: %s", path, result.stderr.decode(errors="ignore"))
+        return None
+    return result.stdout
+
+
+def image_placeholder(f: BinaryIO) -> str:
+    """
+        Returns a tiny JPEG preview of an image as a data URI, small enough to inline in
+        API responses and show blurred while the real image loads.
+    """
+    with Image.open(f) as img:
+        # Lets JPEG decode at a fraction of the full size
+        img.draft("RGB", (PLACEHOLDER_SIZE * 8, PLACEHOLDER_SIZE * 8))
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "P", "PA"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        preview = img.convert("RGB")
+        preview.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+        buffer = io.BytesIO()
+        preview.save(buffer, format="JPEG", quality=50, optimize=True)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+HTML_IMAGE_SRC = re.compile(
+    r"""(<img\b[^>]*?\bsrc\s*=\s*)(["']?)([^"'\s>]+\.(?:jpe?g|png|gif|bmp|webp|tiff?))\2""",
+    re.IGNORECASE,
+)
+# Blocks whose whitespace is significant (or is code) and is left untouched by minify_html
+HTML_VERBATIM = re.compile(r"(<(pre|textarea|script|style)\b.*?</\2\s*>)", re.IGNORECASE | re.DOTALL)
+HTML_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+# Stands in for an image URL in stored documents, URLs may be signed so they're filled in per request
+HTML_ASSET_MARKER = "forward-asset:"
+
+
+def html_image_sources(html: str) -> list[str]:
+    """Image files referenced by <img src> in a document, in order of first use."""
+    return list(dict.fromkeys(match.group(3) for match in HTML_IMAGE_SRC.finditer(html)))
+
+
+def replace_image_sources(html: str, replace) -> str:
+    """Rewrites every <img src> found by html_image_sources with replace(src)."""
+    return HTML_IMAGE_SRC.sub(lambda m: f"{m.group(1)}{m.group(2) or chr(34)}{replace(m.group(3))}{m.group(2) or chr(34)}", html)
+
+
+def resolve_image_markers(html: str, urls: dict[str, str]) -> str:
+    """Replaces HTML_ASSET_MARKER sources with their URL, or the original file name if unknown."""
+    return re.sub(
+        re.escape(HTML_ASSET_MARKER) + r"""([^"'\s>]+)""",
+        lambda m: urls.get(m.group(1), m.group(1)),
+        html,
+    )
+
+
+def compile_html_document(content: bytes) -> tuple[list[str], str, str]:
+    """
+        The images a document references, its minified copy with image sources replaced by
+        HTML_ASSET_MARKER, and the SHA-256 of the original bytes.
+    """
+    html = content.decode("utf-8", errors="replace")
+    compiled = replace_image_sources(html, lambda src: f"{HTML_ASSET_MARKER}{src}")
+    return html_image_sources(html), minify_html(compiled), hashlib.sha256(content).hexdigest()
+
+
+def minify_html(html: str) -> str:
+    """
+        Conservative minification: drops comments and collapses whitespace, leaving
+        <pre>, <textarea>, <script> and <style> contents as they are.
+    """
+    parts = HTML_VERBATIM.split(html)
+    out = []
+    # split() yields text, block, tag name, text, block, tag name, ...
+    for index in range(0, len(parts), 3):
+        # Runs of whitespace render as a single space anyway
+        out.append(re.sub(r"\s+", " ", HTML_COMMENT.sub("", parts[index])))
+        if index + 1 < len(parts):
+            out.append(parts[index + 1])
+    return "".join(out).strip()
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-19 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_alter_bugreport_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='duration',
+            field=models.FloatField(blank=True, editable=False, help_text='Length of the video in seconds, read from the file on upload', null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='poster',
+            field=models.ImageField(blank=True, editable=False, height_field='poster_height', help_text='First frame preview, generated on upload when ffmpeg is available', upload_to='public/video/posters/', width_field='poster_width'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='poster_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='poster_ppoi',
+            field=models.CharField(default='0.5x0.5', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='poster_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
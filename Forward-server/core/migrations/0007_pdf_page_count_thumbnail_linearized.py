@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-19 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_video_duration_poster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdf',
+            name='linearized',
+            field=models.BooleanField(default=False, editable=False, help_text='Whether the stored file is linearized, allowing page one to render before the whole file is downloaded'),
+        ),
+        migrations.AddField(
+            model_name='pdf',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Number of pages, read from the file on upload', null=True),
+        ),
+        migrations.AddField(
+            model_name='pdf',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, height_field='thumbnail_height', help_text='First page preview, generated on upload when poppler is available', upload_to='public/pdf/thumbnails/', width_field='thumbnail_width'),
+        ),
+        migrations.AddField(
+            model_name='pdf',
+            name='thumbnail_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdf',
+            name='thumbnail_ppoi',
+            field=models.CharField(default='0.5x0.5', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='pdf',
+            name='thumbnail_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-19 04:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0007_pdf_page_count_thumbnail_linearized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Storage key of the file', max_length=512, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('content_type', models.CharField(blank=True, max_length=255)),
+                ('metadata', models.JSONField(blank=True, default=dict, help_text='Values computed while processing the upload (duration, page count, ...), copied to rows that reuse it')),
+                ('pinned', models.BooleanField(default=False, help_text='Referenced from content that is not tracked by MediaReference (e.g. Twine image names), never pruned')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Media Blob',
+                'verbose_name_plural': 'Media Blobs',
+            },
+        ),
+        migrations.CreateModel(
+            name='MediaReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.CharField(max_length=64)),
+                ('field', models.CharField(max_length=100)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='references', to='core.mediablob')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'verbose_name': 'Media Reference',
+                'verbose_name_plural': 'Media References',
+                'constraints': [models.UniqueConstraint(fields=('content_type', 'object_id', 'field'), name='unique_media_reference')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 04:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_image_placeholders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customactivity',
+            name='compiled_document',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Minified document with image sources replaced by markers, see render_document()'),
+        ),
+        migrations.AddField(
+            model_name='customactivity',
+            name='compiled_source',
+            field=models.CharField(blank=True, default='', editable=False, help_text='SHA-256 of the document compiled_document was built from', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='customactivity',
+            name='detected_images',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='Image files the document references, found when it was uploaded'),
+        ),
+    ]
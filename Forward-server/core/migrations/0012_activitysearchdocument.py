@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-19 05:36
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivitySearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity_type', models.CharField(help_text='Key of the activity in ActivityManager.registered_activities', max_length=50)),
+                ('activity_id', models.UUIDField()),
+                ('title', models.CharField(max_length=200)),
+                ('order', models.PositiveIntegerField()),
+                ('document', django.contrib.postgres.search.SearchVectorField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='core.lesson')),
+            ],
+            options={
+                'verbose_name': 'Activity Search Document',
+                'verbose_name_plural': 'Activity Search Documents',
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['document'], name='activity_search_document')],
+                'constraints': [models.UniqueConstraint(fields=('activity_type', 'activity_id'), name='unique_activity_search_document')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 05:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_activitysearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonSeedManifest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Seed file, relative to seed_data/lesson_data', max_length=255, unique=True)),
+                ('lesson_hash', models.CharField(blank=True, max_length=64)),
+                ('activities', models.JSONField(blank=True, default=dict, help_text='Content hash by activity id')),
+                ('assets', models.JSONField(blank=True, default=dict, help_text='SHA-256 by asset path')),
+                ('seeded_at', models.DateTimeField(auto_now=True)),
+                ('lesson', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seed_manifest', to='core.lesson')),
+            ],
+            options={
+                'verbose_name': 'Lesson Seed Manifest',
+                'verbose_name_plural': 'Lesson Seed Manifests',
+            },
+        ),
+    ]
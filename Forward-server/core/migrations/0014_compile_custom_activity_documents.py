@@ -0,0 +1,36 @@
+from django.db import migrations
+
+from core import media
+
+
+def compile_documents(apps, schema_editor):
+    """
+    Compiles the documents of custom activities uploaded before 0010, which render nothing
+    until they are. Documents that can't be read are left to `process_media --kind html`.
+    """
+    CustomActivity = apps.get_model("core", "CustomActivity")
+    activities = CustomActivity.objects.filter(compiled_source="").exclude(document="")
+    for activity in activities.iterator():
+        if not activity.document.name.lower().endswith((".html", ".htm")):
+            continue
+        try:
+            with activity.document.open("rb") as f:
+                content = f.read()
+        except Exception as e:
+            print(f"\n  Could not read {activity.document.name} ({e}), run process_media --kind html")
+            continue
+        images, compiled, digest = media.compile_html_document(content)
+        CustomActivity.objects.filter(pk=activity.pk).update(
+            detected_images=images, compiled_document=compiled, compiled_source=digest
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_lessonseedmanifest'),
+    ]
+
+    operations = [
+        migrations.RunPython(compile_documents, migrations.RunPython.noop),
+    ]
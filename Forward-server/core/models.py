@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinLengthValidator
 from django.urls import reverse
 from django.core.validators import FileExtensionValidator
@@ -18,11 +21,86 @@ from django_jsonform.models.fields import JSONField
 from martor.models import MartorField
 from django.utils.safestring import mark_safe
 from django.core.files.storage import default_storage
-from imagefield.fields import ImageField
+from django.contrib.contenttypes.models import ContentType
+from .fields import ImageField, VideoField, PDFField, HTMLDocumentField, content_digest
 from .utils import FwdImage
+from . import media
 
 GENERIC_FORWARD_IMAGE = FwdImage()
 
+
+class MediaBlob(models.Model):
+    """
+    A stored file identified by the SHA-256 of its uploaded bytes. Uploads through the fields
+    in core.fields look their content up here first, so byte-identical files share a single
+    storage object (and its generated image variants) instead of being uploaded again.
+    """
+    key = models.CharField(max_length=512, unique=True, help_text="Storage key of the file")
+    # Not unique: files referenced by name (see store) may hold the same bytes under several keys
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=255, blank=True)
+    metadata = models.JSONField(
+        default=dict, blank=True,
+        help_text="Values computed while processing the upload (duration, page count, ...), copied to rows that reuse it"
+    )
+    pinned = models.BooleanField(
+        default=False,
+        help_text="Referenced from content that is not tracked by MediaReference (e.g. Twine image names), never pruned"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Media Blob"
+        verbose_name_plural = "Media Blobs"
+
+    def __str__(self):
+        return self.key
+
+    @staticmethod
+    def store(key: str, content, pinned=False) -> str:
+        """
+        Saves content to default storage under exactly `key` unless a blob with that key already
+        holds the same bytes. Used for files that are referenced by name rather than through a
+        model field, so an existing object under the key is replaced.
+        Returns the storage key.
+        """
+        digest, size = content_digest(content)
+        blob = MediaBlob.objects.filter(key=key).first()
+        if blob and blob.sha256 == digest:
+            return key
+
+        if default_storage.exists(key):
+            default_storage.delete(key)
+        saved = default_storage.save(key, content)
+        MediaBlob.objects.update_or_create(
+            key=saved,
+            defaults={"sha256": digest, "size": size, "content_type": getattr(content, "content_type", "") or "", "pinned": pinned},
+        )
+        return saved
+
+
+class MediaReference(models.Model):
+    """
+    One model field currently pointing at a MediaBlob. Kept in sync by core.signals, a blob's
+    storage object is only deleted once nothing references it anymore.
+    """
+    blob = models.ForeignKey(MediaBlob, on_delete=models.PROTECT, related_name="references")
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.CharField(max_length=64)
+    field = models.CharField(max_length=100)
+
+    class Meta:
+        verbose_name = "Media Reference"
+        verbose_name_plural = "Media References"
+        constraints = [
+            models.UniqueConstraint(fields=["content_type", "object_id", "field"], name="unique_media_reference"),
+        ]
+
+    def __str__(self):
+        return f"{self.content_type.model}:{self.object_id}.{self.field} -> {self.blob.key}"
+
+
 class JSONImageModel(models.Model):
     """
     Class for models that store images in JSON fields. Provides utility methods for handling image URLs.
@@ -42,6 +120,20 @@ class JSONImageModel(models.Model):
             return GENERIC_FORWARD_IMAGE.stringify(model.image)
         except JSONImageModel.DoesNotExist:
             return None
+
+    @staticmethod
+    def from_file(file) -> "JSONImageModel":
+        """
+        Returns the JSONImageModel already holding these exact bytes, or creates a new one.
+        JSON fields only store the id, so identical images can safely share a row.
+        """
+        digest, _ = content_digest(file)
+        blob = MediaBlob.objects.filter(sha256=digest).first()
+        if blob:
+            existing = JSONImageModel.objects.filter(image=blob.key).first()
+            if existing:
+                return existing
+        return JSONImageModel.objects.create(image=file)
     
 # Custom User model that extends Django's AbstractUser
 # This gives us all the default user functionality (username, password, groups, permissions)
@@ -70,6 +162,13 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'user'
         verbose_name_plural = 'users'
+        # Trigram indexes for the admin's user search (icontains compares UPPER() of both
+        # sides), which also backs the autocomplete filters of the response admins
+        indexes = [
+            GinIndex(OpClass(Upper('username'), name='gin_trgm_ops'), name='user_username_trgm'),
+            GinIndex(OpClass(Upper('display_name'), name='gin_trgm_ops'), name='user_display_name_trgm'),
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='user_email_trgm'),
+        ]
 
     # By default, Django requires email for user creation
     # We override this to make email optional since we're using username-based auth
@@ -338,6 +437,10 @@ class BaseActivity(models.Model):
     def activity_type(self):
         return self.__class__.__name__
 
+    def search_content(self) -> list[str]:
+        """Text besides the title and instructions the activity can be found by, see ActivitySearchDocument."""
+        return []
+
     @abstractmethod
     def to_dict(self):
         return {
@@ -381,6 +484,9 @@ class TextContent(BaseActivity):
     def activity_type(self):
         return self.__class__.__name__
 
+    def search_content(self):
+        return [self.content]
+
     def to_dict(self):
         return {
             **super().to_dict(),
@@ -391,8 +497,23 @@ class TextContent(BaseActivity):
 class PDF(BaseActivity):
 
 
-    pdf_file = models.FileField(upload_to='public/pdf/', blank=True, null=True, validators=[FileExtensionValidator(allowed_extensions=['pdf'])],
-                       help_text="Pdf content to acompany lesson")
+    pdf_file = PDFField(upload_to='public/pdf/', blank=True, null=True, validators=[FileExtensionValidator(allowed_extensions=['pdf'])],
+                       help_text="Pdf content to acompany lesson",
+                       page_count_field="page_count", thumbnail_field="thumbnail", linearized_field="linearized")
+
+    page_count = models.PositiveIntegerField(
+        null=True, blank=True, editable=False,
+        help_text="Number of pages, read from the file on upload"
+    )
+
+    linearized = models.BooleanField(
+        default=False, editable=False,
+        help_text="Whether the stored file is linearized, allowing page one to render before the whole file is downloaded"
+    )
+
+    thumbnail = ImageField(upload_to='public/pdf/thumbnails/', blank=True, editable=False,
+                           help_text="First page preview, generated on upload when poppler is available",
+                           auto_add_fields=True, formats=GENERIC_FORWARD_IMAGE.formats)
     
     class Meta:
         ordering = ['order', 'created_at']
@@ -403,7 +524,10 @@ class PDF(BaseActivity):
     def to_dict(self):
         return{
             **super().to_dict(),
-            "pdf_file": self.pdf_file.url if self.pdf_file else None
+            "pdf_file": self.pdf_file.url if self.pdf_file else None,
+            "page_count": self.page_count,
+            "linearized": self.linearized,
+            "thumbnail": GENERIC_FORWARD_IMAGE.stringify(self.thumbnail) if self.thumbnail else None,
         }
         
 
@@ -414,9 +538,19 @@ class Video(BaseActivity):
     Model for video content within a lesson.
     Can be used to embed videos from external sources or local files.
     """
-    video = models.FileField(
+    video = VideoField(
         upload_to="public/video/",
-        validators=[FileExtensionValidator(allowed_extensions=['mp4'])])
+        validators=[FileExtensionValidator(allowed_extensions=['mp4'])],
+        duration_field="duration", poster_field="poster")
+
+    duration = models.FloatField(
+        null=True, blank=True, editable=False,
+        help_text="Length of the video in seconds, read from the file on upload"
+    )
+
+    poster = ImageField(upload_to='public/video/posters/', blank=True, editable=False,
+                        help_text="First frame preview, generated on upload when ffmpeg is available",
+                        auto_add_fields=True, formats=GENERIC_FORWARD_IMAGE.formats)
 
     scrubbable = models.BooleanField(
         default=False,
@@ -438,10 +572,15 @@ class Video(BaseActivity):
     def __str__(self):
         return f"Video Content: {self.title}"
 
+    def search_content(self):
+        return [self.transcript]
+
     def to_dict(self):
         return {
             **super().to_dict(),
             "video": self.video.url if self.video else None,
+            "duration": self.duration,
+            "poster": GENERIC_FORWARD_IMAGE.stringify(self.poster) if self.poster else None,
             "transcript": self.transcript
         }
 
@@ -488,6 +627,10 @@ class Writing(BaseActivity):
         verbose_name = "Writing"
         verbose_name_plural = "Writings"
         
+    def search_content(self):
+        # Prompts used to be plain strings
+        return [item.get("prompt") if isinstance(item, dict) else item for item in self.prompts or []]
+
     def to_dict(self):
         prompts = copy.deepcopy(self.prompts)
         for item in prompts:
@@ -583,7 +726,7 @@ class Quiz(BaseActivity):
         help_text="Optional Image to accompany the Quiz",
         formats=GENERIC_FORWARD_IMAGE.formats, auto_add_fields=True)
 
-    video = models.FileField(upload_to='public/video', null=True, blank=True, validators=[FileExtensionValidator(allowed_extensions=['mp4'])], help_text= "Optional video to accompany the Quiz")
+    video = VideoField(upload_to='public/video', null=True, blank=True, validators=[FileExtensionValidator(allowed_extensions=['mp4'])], help_text= "Optional video to accompany the Quiz")
 
     passing_score = models.PositiveIntegerField(
         help_text="Minimum score required to pass the quiz",
@@ -594,6 +737,9 @@ class Quiz(BaseActivity):
         verbose_name = "Quiz"
         verbose_name_plural = "Quizzes"
 
+    def search_content(self):
+        return list(self.questions.values_list("question_text", flat=True))
+
     def to_dict(self):
         return {
             **super().to_dict(),
@@ -662,7 +808,7 @@ class Question(models.Model):
     )
     
     image = ImageField(upload_to='public/question/', blank=True, help_text="Optional image to accompany the Question",formats=GENERIC_FORWARD_IMAGE.formats, auto_add_fields=True)
-    video = models.FileField( upload_to='public/question/', null=True, blank=True, validators=[FileExtensionValidator(allowed_extensions=['mp4'])], help_text="Optional video to accompany the Question")
+    video = VideoField( upload_to='public/question/', null=True, blank=True, validators=[FileExtensionValidator(allowed_extensions=['mp4'])], help_text="Optional video to accompany the Question")
     
     # User's generated uuid
     id = models.UUIDField(
@@ -874,6 +1020,13 @@ class DndMatch(BaseActivity):
             associated_activity=self
         )
 
+    def search_content(self):
+        text = []
+        for category in self.content or []:
+            text.append(category.get("category"))
+            text += [match for match in category.get("matches", []) if isinstance(match, str)]
+        return text
+
     def to_dict(self):
         content = copy.deepcopy(self.content)
         for group in content:
@@ -973,6 +1126,10 @@ class FillInTheBlank(BaseActivity):
 
 
     # delete this later comment later, just for me --> but remakes it into a json to give to frontend
+    def search_content(self):
+        # Keeps the words of <options>...</options> tags, not the markers of correct answers
+        return [re.sub(r"</?options>|\*", " ", sentence) for sentence in self.content or []]
+
     def to_dict(self):
         return {
             **super().to_dict(),
@@ -993,6 +1150,12 @@ class ConceptMap(BaseActivity):
         verbose_name_plural = "Concept Maps"
 
     #TODO return and configure images for fill in the blank activities
+    def search_content(self):
+        text = [self.content]
+        for title, description in self.concepts.values_list("title", "description"):
+            text += [title, description]
+        return text
+
     def to_dict(self):
         return {
             **super().to_dict(),
@@ -1160,6 +1323,9 @@ class LikertScale(BaseActivity):
         verbose_name = "Likert Scale"
         verbose_name_plural = "Likert Scales"
 
+    def search_content(self):
+        return [item.get("statement") for item in self.content or []]
+
     def to_dict(self):
         return {
             **super().to_dict(),
@@ -1179,6 +1345,9 @@ class Slideshow(BaseActivity):
     def get_num_slides(self):
         return Slide.objects.filter(slideshow=self).count()
     
+    def search_content(self):
+        return list(self.slides.values_list("content", flat=True))
+
     def to_dict(self):
         return {
             **super().to_dict(),
@@ -1243,8 +1412,10 @@ class CustomActivity(BaseActivity):
                     <code>&lt;script&gt;window.parent.postMessage({{ type: \"activityEnd\" }}, \"*\");&lt;/script&gt;</code><br><br>
                 to tell FORWARD the activity is completed, and let students proceede in the lesson."""))
     
-    document = models.FileField(validators=[FileExtensionValidator(allowed_extensions=[
-                                "html"]),validate_passing_script], null=False, blank=False, help_text=mark_safe("""
+    document = HTMLDocumentField(validators=[FileExtensionValidator(allowed_extensions=[
+                                "html"]),validate_passing_script], null=False, blank=False,
+                                images_field="detected_images", compiled_field="compiled_document", digest_field="compiled_source",
+                                help_text=mark_safe("""
                                     This is an HTML document that has no external dependencies other than image files.<br>
                                     Once this activity is saved, all detected images in the document will be displayed below.
                                     Images that are referenced can furthermore be uploaded farther down below BUT must have the
@@ -1273,15 +1444,33 @@ class CustomActivity(BaseActivity):
                                     </details>
                                 """))
 
+    detected_images = models.JSONField(
+        default=list, blank=True, editable=False,
+        help_text="Image files the document references, found when it was uploaded"
+    )
+
+    compiled_document = models.TextField(
+        blank=True, default="", editable=False,
+        help_text="Minified document with image sources replaced by markers, see render_document()"
+    )
+
+    compiled_source = models.CharField(
+        max_length=64, blank=True, default="", editable=False,
+        help_text="SHA-256 of the document compiled_document was built from"
+    )
+
     def referenced_images(self):
-        try:
-            with self.document.storage.open(self.document.name, "rb") as f:
-                f.seek(0)
-                content = f.read(self.document.size).decode("utf-8", errors="replace")
-                found = re.findall(r"<img[^>]+src=[\'\"]?([^\'\"]+\.(?:jpe?g|png|gif|bmp|webp|tiff?))[\'\"]?", content)
-                return found
-        except:
-            return []
+        return self.detected_images
+
+    def render_document(self, images: dict[str, str]) -> str:
+        """
+        The compiled document with image sources pointing at the uploaded assets. Empty until
+        the document is compiled, which happens on upload, never while reading.
+        """
+        if not self.compiled_source:
+            # Uploaded before documents were compiled, see `process_media --kind html`
+            return ""
+        return media.resolve_image_markers(self.compiled_document, images)
         
     class Meta:
         verbose_name = "Custom Activity"
@@ -1295,6 +1484,7 @@ class CustomActivity(BaseActivity):
         return {
             **super().to_dict(),
             "document": self.document.url,
+            "compiled_document": self.render_document(images),
             "images": images,
         }
 
@@ -2082,6 +2272,55 @@ class ActivityManager():
 # Register on launch
 ActivityManager()
 
+
+class ActivitySearchDocument(models.Model):
+    """
+    Full-text search document of one top-level activity, weighted by title (A), instructions (B)
+    and the activity's search_content() (C). Rebuilt by core.signals whenever the activity or one
+    of its children is saved, see core.services.SearchService.
+    """
+    activity_type = models.CharField(max_length=50, help_text="Key of the activity in ActivityManager.registered_activities")
+    activity_id = models.UUIDField()
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name="search_documents")
+    title = models.CharField(max_length=200)
+    order = models.PositiveIntegerField()
+    document = SearchVectorField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Activity Search Document"
+        verbose_name_plural = "Activity Search Documents"
+        constraints = [
+            models.UniqueConstraint(fields=["activity_type", "activity_id"], name="unique_activity_search_document"),
+        ]
+        indexes = [
+            GinIndex(fields=["document"], name="activity_search_document"),
+        ]
+
+    def __str__(self):
+        return f"{self.activity_type}: {self.title}"
+
+
+class LessonSeedManifest(models.Model):
+    """
+    What seed_lessons_data last wrote for one seed file: content hashes of the lesson payload, of
+    each activity (by activity id) and of each asset file (by its path in the seed folder).
+    `seed_lessons_data --incremental` diffs the JSON against it and only touches what changed.
+    """
+    source = models.CharField(max_length=255, unique=True, help_text="Seed file, relative to seed_data/lesson_data")
+    lesson = models.OneToOneField(Lesson, on_delete=models.CASCADE, related_name="seed_manifest")
+    lesson_hash = models.CharField(max_length=64, blank=True)
+    activities = models.JSONField(default=dict, blank=True, help_text="Content hash by activity id")
+    assets = models.JSONField(default=dict, blank=True, help_text="SHA-256 by asset path")
+    seeded_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Lesson Seed Manifest"
+        verbose_name_plural = "Lesson Seed Manifests"
+
+    def __str__(self):
+        return self.source
+
 class BugReport(models.Model):
     """
     Model for reporting bugs within the platform
@@ -0,0 +1,326 @@
+"""
+Content hashes for incremental lesson seeding, see `seed_lessons_data --incremental` and
+LessonSeedManifest, and LessonExporter which writes a lesson back into a seed folder. Also
+the lesson lookups shared by the seeding and copying commands.
+
+An activity's hash covers its JSON payload and the bytes of every file it references, so
+replacing an image in the seed folder marks the activities using it as changed even though
+the JSON is the same.
+"""
+import hashlib
+import json
+import posixpath
+import re
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import CommandError
+from django.db.models import FileField
+
+from .fields import content_digest
+from .models import (ActivityManager, Concept, CustomActivityImageAsset, IdentificationItem, JSONImageModel,
+                     Lesson, Question, Slide)
+from .services import LessonService
+
+# Files referenced inside text: Markdown images (TextContent) and `image:<path>` markers (Twine, DnD)
+MARKDOWN_IMAGE = re.compile(r"!\[.*?\]\((.*?)\)")
+IMAGE_MARKER = re.compile(r"image:(.*?\.(?:jpe?g|png|gif|bmp|webp|tiff?))")
+# The random suffixes Storage.get_available_name appends to a name that is taken (not plain words)
+AVAILABLE_NAME_SUFFIX = re.compile(r"(?:_(?=[a-z]*[A-Z0-9])[a-zA-Z0-9]{7})+$")
+
+
+def lesson_data_root() -> Path:
+    """The folder holding the seed folders of the bundled lessons."""
+    return Path(settings.BASE_DIR) / "core" / "management" / "seed_data" / "lesson_data"
+
+
+def get_lesson(value: str) -> Lesson:
+    """Looks a lesson up by id or, failing that, by its exact title for a management command."""
+    try:
+        lookup = {"pk": uuid.UUID(value)}
+    except ValueError:
+        lookup = {"title": value}
+    lessons = list(Lesson.objects.filter(**lookup)[:2])
+    if not lessons:
+        raise CommandError(f"No lesson matches '{value}'")
+    if len(lessons) > 1:
+        raise CommandError(f"Several lessons are titled '{value}', pass its id instead")
+    return lessons[0]
+
+
+def payload_hash(payload) -> str:
+    """SHA-256 of a JSON value, independent of key order."""
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def iter_strings(value):
+    """Yields every string nested in a JSON value."""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from iter_strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from iter_strings(item)
+
+
+class AssetHashes:
+    """SHA-256 of the files in a seed folder by their relative path, each file is read once."""
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+        self.hashes: dict[str, str | None] = {}
+
+    def get(self, rel_path: str) -> str | None:
+        """Hash of a file in the folder, None if there is no such file."""
+        if rel_path not in self.hashes:
+            path = self.folder / rel_path
+            digest = None
+            if path.is_file():
+                with open(path, "rb") as f:
+                    digest, _ = content_digest(File(f))
+            self.hashes[rel_path] = digest
+        return self.hashes[rel_path]
+
+    def referenced(self, payload) -> dict[str, str]:
+        """Hashes of the existing files a JSON payload references, by relative path."""
+        found = {}
+        for value in iter_strings(payload):
+            candidates = [value, *MARKDOWN_IMAGE.findall(value), *IMAGE_MARKER.findall(value)]
+            for candidate in candidates:
+                candidate = candidate.strip()
+                if not candidate or len(candidate) > 255 or "\n" in candidate:
+                    continue
+                digest = self.get(candidate)
+                if digest:
+                    found[candidate] = digest
+                    if candidate.lower().endswith(".html"):
+                        found.update(self.twine_images(candidate))
+        return found
+
+    def twine_images(self, rel_path: str) -> dict[str, str]:
+        """Hashes of the images a Twine story references, stored in the folder's twine/ directory."""
+        with open(self.folder / rel_path, "r", encoding="utf-8", errors="replace") as f:
+            content = f.read()
+        found = {}
+        for name in IMAGE_MARKER.findall(content):
+            candidate = f"twine/{name.strip()}"
+            digest = self.get(candidate)
+            if digest:
+                found[candidate] = digest
+        return found
+
+
+class LessonExporter:
+    """
+    Writes a lesson in the layout seed_lessons_data reads: a lesson.json next to the files it
+    references, so seeding the folder recreates the lesson. Activities are read through the
+    ActivityManager registry with one query per type, JSONImageModel ids are replaced by the
+    name of their file and the storage objects are downloaded by a thread pool.
+    """
+
+    # File fields seed_lessons_data attaches by activity type, besides instructions_image
+    ACTIVITY_FILES = {
+        "textcontent": ("image",),
+        "fillintheblank": ("image",),
+        "quiz": ("image", "video"),
+        "video": ("video",),
+        "twine": ("file",),
+        "customactivity": ("document",),
+        "pdf": ("pdf_file",),
+    }
+    # Children seed_lessons_data creates: type -> (JSON key, model, parent field, fields, file fields)
+    CHILDREN = {
+        "quiz": ("questions", Question, "quiz",
+                 ("question_text", "question_type", "has_correct_answer", "choices", "is_required",
+                  "feedback_config"),
+                 ("image", "video")),
+        "conceptmap": ("examples", Concept, "concept_map", ("title", "description", "examples"), ("image",)),
+        "identification": ("content", IdentificationItem, "identification", ("hints", "areas"), ("image",)),
+        "slideshow": ("slides", Slide, "slideshow", ("content",), ("image",)),
+        "customactivity": ("images", CustomActivityImageAsset, "custom_activity", (), ("image",)),
+    }
+
+    def __init__(self, lesson, folder: Path, workers: int = 8):
+        self.lesson = lesson
+        self.folder = folder
+        self.workers = workers
+        # Storage key -> path in the folder
+        self.files: dict[str, str] = {}
+        self.names: set[str] = set()
+        # JSONImageModel id -> storage key
+        self.json_images: dict[str, str] = {}
+        self.missing: list[str] = []
+
+    def export(self) -> dict:
+        """Writes the folder and returns {"activities", "files", "bytes"}."""
+        data = {"lesson": self._lesson(), "activities": self._activities()}
+        self.folder.mkdir(parents=True, exist_ok=True)
+        size = self._download()
+        with open(self.folder / "lesson.json", "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+            f.write("\n")
+        return {"activities": len(data["activities"]), "files": len(self.files) - len(self.missing), "bytes": size}
+
+    # ---------- JSON ----------
+    @staticmethod
+    def _values(instance, exclude=()) -> dict:
+        """Editable field values, without files (and their focal points) or relations."""
+        skip = set(exclude)
+        for field in instance._meta.concrete_fields:
+            if isinstance(field, FileField):
+                skip.update((field.name, getattr(field, "ppoi_field", None)))
+        return {
+            field.name: field.value_from_object(instance)
+            for field in instance._meta.concrete_fields
+            if field.editable and not field.primary_key and not field.is_relation and field.name not in skip
+        }
+
+    def _lesson(self) -> dict:
+        # Seeded lessons are active, a draft is exported to be published
+        data = self._values(self.lesson, exclude=("active",))
+        if self.lesson.image:
+            data["image"] = self._asset(self.lesson.image.name)
+        return data
+
+    def _activities(self) -> list:
+        index = LessonService.get_activity_index(lesson=self.lesson)
+        ids = {}
+        for entry in index:
+            ids.setdefault(entry["type"], []).append(entry["id"])
+        activities = {}
+        for key, pks in ids.items():
+            Model = ActivityManager.registered_activities[key][0]
+            for pk, activity in Model.objects.in_bulk(pks).items():
+                activities[(key, pk)] = activity
+
+        children = {}
+        for key, (_, Model, parent_field, __, ___) in self.CHILDREN.items():
+            if key not in ids:
+                continue
+            ordering = ["order", "pk"] if any(f.name == "order" for f in Model._meta.fields) else ["pk"]
+            for child in Model.objects.filter(**{f"{parent_field}_id__in": ids[key]}).order_by(*ordering):
+                children.setdefault((key, getattr(child, f"{parent_field}_id")), []).append(child)
+
+        self._load_json_images([*activities.values(), *(c for group in children.values() for c in group)])
+        return [
+            self._activity(entry["type"], activities[(entry["type"], entry["id"])],
+                           children.get((entry["type"], entry["id"]), []))
+            for entry in index
+        ]
+
+    def _activity(self, key: str, activity, children: list) -> dict:
+        data = {"type": key, **self._values(activity, exclude=("order",))}
+        for field_name in ("instructions_image", *self.ACTIVITY_FILES.get(key, ())):
+            fieldfile = getattr(activity, field_name)
+            if fieldfile:
+                data[field_name] = self._asset(fieldfile.name)
+
+        if key == "writing":
+            data["prompts"] = [self._resolve_image(prompt) for prompt in data.get("prompts") or []]
+        elif key == "dndmatch":
+            data["content"] = [
+                {**group, "matches": [self._resolve_image(match) for match in group.get("matches", [])]}
+                if isinstance(group, dict) else group
+                for group in data.get("content") or []
+            ]
+            # `image:<path>` markers, uploaded to public/dndmatch/ by name
+            for value in iter_strings(data["content"]):
+                for name in IMAGE_MARKER.findall(value):
+                    self._asset(f"public/dndmatch/{posixpath.basename(name.strip())}", name.strip())
+        elif key == "twine" and activity.file:
+            self._twine_images(activity.file)
+
+        if key in self.CHILDREN:
+            json_key, _, __, fields, file_fields = self.CHILDREN[key]
+            data[json_key] = [self._child(key, child, fields, file_fields) for child in children]
+        return data
+
+    def _child(self, key: str, child, fields, file_fields):
+        if key == "customactivity":
+            # Listed as bare file names
+            return self._asset(child.image.name) if child.image else None
+        data = {field: getattr(child, field) for field in fields}
+        if key == "conceptmap":
+            data["examples"] = [self._resolve_image(example) for example in data["examples"] or []]
+        for field_name in file_fields:
+            fieldfile = getattr(child, field_name)
+            if fieldfile:
+                data[field_name] = self._asset(fieldfile.name)
+        return data
+
+    def _twine_images(self, fieldfile):
+        """The images a story references, stored in public/twine/images/ by name."""
+        with fieldfile.open("rb") as f:
+            content = f.read().decode("utf-8", errors="replace")
+        for name in IMAGE_MARKER.findall(content):
+            name = name.strip()
+            self._asset(f"public/twine/images/{posixpath.basename(name)}", f"twine/{name}")
+
+    # ---------- Images and files ----------
+    def _load_json_images(self, instances: list):
+        """Storage keys of every JSONImageModel the instances' JSON fields may reference, in one query."""
+        ids = set()
+        for instance in instances:
+            for field in instance._meta.concrete_fields:
+                if field.get_internal_type() != "JSONField":
+                    continue
+                for value in iter_strings(field.value_from_object(instance)):
+                    try:
+                        ids.add(uuid.UUID(value))
+                    except ValueError:
+                        continue
+        if ids:
+            self.json_images = {
+                str(pk): image
+                for pk, image in JSONImageModel.objects.filter(pk__in=ids).values_list("pk", "image")
+                if image
+            }
+
+    def _resolve_image(self, item):
+        """Replaces the JSONImageModel id of a {"image": id, ...} item by the name of its file."""
+        if isinstance(item, dict) and item.get("image") in self.json_images:
+            return {**item, "image": self._asset(self.json_images[item["image"]])}
+        return item
+
+    def _asset(self, key: str, name: str | None = None) -> str:
+        """Path of a storage object in the folder, its file name unless given. Downloaded by _download."""
+        if key not in self.files:
+            stem, ext = posixpath.splitext(name or posixpath.basename(key))
+            if not name:
+                # Seeding the file again would add another suffix
+                stem = AVAILABLE_NAME_SUFFIX.sub("", stem)
+            name = f"{stem}{ext}"
+            number = 1
+            while name in self.names:
+                number += 1
+                name = f"{stem}-{number}{ext}"
+            self.files[key] = name
+            self.names.add(name)
+        return self.files[key]
+
+    def _download(self) -> int:
+        """Streams every referenced storage object into the folder, returns the bytes written."""
+
+        def fetch(item) -> int:
+            key, name = item
+            path = self.folder / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                with default_storage.open(key, "rb") as source, open(path, "wb") as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+            except FileNotFoundError:
+                path.unlink(missing_ok=True)
+                self.missing.append(key)
+                return 0
+            return path.stat().st_size
+
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as pool:
+            return sum(pool.map(fetch, self.files.items()))
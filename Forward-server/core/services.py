@@ -1,13 +1,39 @@
 # Business logic
-from django.db import transaction
+import csv
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from django.db import connection, transaction
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import CharField, Count, F, Max, TextField, Value
+from django.core.cache import cache
+from django.core.files import File
+from django.db.models.fields.files import FieldFile
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.files.storage import default_storage
 from django.utils import timezone
 from django.contrib.auth import login, logout
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
-from .models import ActivityManager, User, Lesson, Quiz, Question, UserQuizResponse, UserQuestionResponse, Embed, EmbedResponse, Facility, BaseResponse
+from .models import ActivityManager, User, Lesson, Quiz, Question, UserQuizResponse, UserQuestionResponse, Embed, EmbedResponse, Facility, BaseResponse, MediaBlob, MediaReference, ActivitySearchDocument
+from .utils import storage_key_from_url, DEFAULT_IMAGE_FORMATS
+from .media import copy_stream
+from .signals import media_fields
 from rest_framework.request import Request as DRFRequest
 from django.core.exceptions import ValidationError as DjangoValidationError
 
+logger = logging.getLogger(__name__)
+
+
 class UserService:
     @staticmethod
     @transaction.atomic
@@ -85,9 +111,13 @@ class UserService:
         Raises:
             ValidationError: If login fails
         """
+        if user._state.adding:
+            # Never saved, there is no account to log in to
+            raise ValidationError('login failed. Please try again.')
         try:
-            # Log the user in (validates with HTTP session storage)
-            login(request, user)
+            # Log the user in (validates with HTTP session storage). A user that was just
+            # created did not go through authenticate() and has no backend to record
+            login(request, user, backend=getattr(user, 'backend', None) or 'core.backends.CachedModelBackend')
 
             return {
                 'user': user.to_dict()
@@ -119,13 +149,118 @@ class UserService:
 class LessonService:
     @staticmethod
     def get_lesson_completion(user: User, lesson: Lesson):
-        responses = 0                       
+        return LessonService.get_completions([user.pk], [lesson.pk]).get((user.pk, lesson.pk), 0)
+
+    @staticmethod
+    def _grouped_counts(models, fields: list[str], **filters):
+        """
+        Counts rows of every model grouped by `fields`, as one UNION query. Yields
+        (*field values, count) rows, one per model and group.
+        """
+        querysets = [
+            Model.objects.filter(**filters).values_list(*fields).annotate(n=Count("id")).order_by()
+            for Model in models
+        ]
+        if not querysets:
+            return []
+        return querysets[0].union(*querysets[1:], all=True)
+
+    @staticmethod
+    def _top_level_models():
+        """(activity models, response models) of the activities that count towards completion."""
+        activities, responses = [], []
         for value in ActivityManager.registered_activities.values():
-            [_, Response, _, child_class] = value[:4]
+            [Activity, Response, _, child_class] = value[:4]
             if not child_class:
-                responses += Response.objects.filter(lesson=lesson,user=user).count()
-        return (responses/lesson.total_activities) if lesson.total_activities != 0 else 0
-    
+                activities.append(Activity)
+                responses.append(Response)
+        return activities, responses
+
+    @staticmethod
+    def get_activity_totals(lesson_ids) -> dict:
+        """Number of top-level activities in each lesson as {lesson_id: count}, in one query."""
+        totals = {}
+        activities, _ = LessonService._top_level_models()
+        for lesson_id, count in LessonService._grouped_counts(activities, ["lesson_id"], lesson_id__in=lesson_ids):
+            totals[lesson_id] = totals.get(lesson_id, 0) + count
+        return totals
+
+    @staticmethod
+    def get_response_counts(user_ids, lesson_ids) -> dict:
+        """Number of responses of each user in each lesson as {(user_id, lesson_id): count}, in one query."""
+        counts = {}
+        _, responses = LessonService._top_level_models()
+        for user_id, lesson_id, count in LessonService._grouped_counts(
+                responses, ["user_id", "lesson_id"], user_id__in=user_ids, lesson_id__in=lesson_ids):
+            counts[(user_id, lesson_id)] = counts.get((user_id, lesson_id), 0) + count
+        return counts
+
+    @staticmethod
+    def get_completions(user_ids, lesson_ids) -> dict:
+        """
+        Completion of each user in each lesson as {(user_id, lesson_id): fraction}, counted the
+        same way as get_lesson_completion but with two queries however many users and lessons
+        there are. Pairs without any responses are left out.
+        """
+        totals = LessonService.get_activity_totals(lesson_ids)
+        return {
+            key: (count / totals[key[1]]) if totals.get(key[1]) else 0
+            for key, count in LessonService.get_response_counts(user_ids, lesson_ids).items()
+        }
+
+    @staticmethod
+    def get_overall_completions(user_ids) -> dict:
+        """Completion of each user across all active lessons as {user_id: fraction}, in three queries."""
+        lesson_ids = list(Lesson.objects.filter(active=True).values_list("id", flat=True))
+        total = sum(LessonService.get_activity_totals(lesson_ids).values())
+        answered = {}
+        for (user_id, _), count in LessonService.get_response_counts(user_ids, lesson_ids).items():
+            answered[user_id] = answered.get(user_id, 0) + count
+        return {user_id: (count / total) if total else 0 for user_id, count in answered.items()}
+
+    @staticmethod
+    def _typed_union(models: dict, fields: list[str], **filters):
+        """
+        Rows of every model matching `filters` as one UNION query, each prefixed with the
+        model's registered type. Yields (type, *field values) rows.
+        """
+        querysets = [
+            Model.objects.filter(**filters).order_by()
+            .annotate(type=Value(key, output_field=CharField())).values_list("type", *fields)
+            for key, Model in models.items()
+        ]
+        if not querysets:
+            return []
+        return querysets[0].union(*querysets[1:], all=True)
+
+    @staticmethod
+    def get_activity_index(**filters) -> list[dict]:
+        """
+        The top-level activities matching `filters` (e.g. lesson=lesson) as
+        {"type", "id", "lesson_id", "title", "order"} dicts, ordered by lesson and order. One
+        query that only reads those columns, whatever content the activities hold.
+        """
+        models = {
+            key: value[0]
+            for key, value in ActivityManager.registered_activities.items()
+            if not value[3]
+        }
+        if not models:
+            return []
+        fields = ["id", "lesson_id", "title", "order"]
+        rows = LessonService._typed_union(models, fields, **filters).order_by("lesson_id", "order", "type")
+        return [dict(zip(["type", *fields], row)) for row in rows]
+
+    @staticmethod
+    def get_response_types(**filters) -> list[str]:
+        """Registered types that have responses matching `filters` (e.g. user=user), in one query."""
+        models = {
+            key: value[1]
+            for key, value in ActivityManager.registered_activities.items()
+            if value[1] is not None
+        }
+        return sorted({row[0] for row in LessonService._typed_union(models, ["id"], **filters)})
+
     @staticmethod
     def get_lesson_content(lesson_id):
         """
@@ -147,27 +282,618 @@ class LessonService:
             lesson = Lesson.objects.get(id=lesson_id)
         except Lesson.DoesNotExist:
             raise
-            raise
         lesson_dict = lesson.to_dict()
 
-        activity_list = []
+        # Only the activity types the lesson uses are loaded in full
+        index = LessonService.get_activity_index(lesson=lesson)
+        ids_by_type = {}
+        for entry in index:
+            ids_by_type.setdefault(entry["type"], []).append(entry["id"])
+        activities = {}
+        for key, ids in ids_by_type.items():
+            ActivityModel = ActivityManager.registered_activities[key][0]
+            for activity in ActivityModel.objects.filter(id__in=ids):
+                activities[activity.id] = activity
+
+        lesson_dict["activities"] = [
+            activities[entry["id"]].to_dict() for entry in index if entry["id"] in activities
+        ]
+
+        return {
+            "lesson": lesson_dict
+        }
+
+
+class LessonCopyService:
+    @staticmethod
+    def clone(instance, **overrides):
+        """
+        An unsaved copy of `instance` with a fresh primary key. File fields keep pointing at the
+        same storage objects, nothing is uploaded again.
+        """
+        Model = type(instance)
+        values = {}
+        for field in Model._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            value = getattr(instance, field.attname)
+            values[field.attname] = value.name if isinstance(value, FieldFile) else value
+        values.update(overrides)
+        return Model(**values)
+
+    @staticmethod
+    def child_relations(Model) -> list:
+        """The one-to-many relations of an activity model that are content (not student responses)."""
+        return [
+            relation for relation in Model._meta.related_objects
+            if relation.one_to_many and not issubclass(relation.related_model, BaseResponse)
+        ]
+
+    @staticmethod
+    def _copy_rows(Model, rows, created: list, overrides) -> dict:
+        """Bulk creates copies of `rows` with the fields `overrides(row)` returns, returns {old pk: new pk}."""
+        copies = [LessonCopyService.clone(row, **overrides(row)) for row in rows]
+        Model.objects.bulk_create(copies, batch_size=500)
+        created.extend(copies)
+        return {row.pk: copy.pk for row, copy in zip(rows, copies)}
+
+    @staticmethod
+    def _add_media_references(instances):
+        """bulk_create skips the post_save signal that records which rows use which MediaBlob."""
+        by_key = {}
+        for instance in instances:
+            for field in media_fields(type(instance)):
+                name = getattr(instance, field.attname).name
+                if name:
+                    by_key.setdefault(name, []).append((instance, field.name))
+        blobs = dict(MediaBlob.objects.filter(key__in=by_key).values_list("key", "id"))
+        MediaReference.objects.bulk_create([
+            MediaReference(
+                blob_id=blobs[key],
+                content_type=ContentType.objects.get_for_model(instance),
+                object_id=str(instance.pk),
+                field=field,
+            )
+            for key, uses in by_key.items() if key in blobs
+            for instance, field in uses
+        ], batch_size=500)
+
+    @staticmethod
+    @transaction.atomic
+    def duplicate(lesson: Lesson, title: str | None = None) -> Lesson:
+        """
+        Copies a lesson with all its activities and their children (questions, slides, concepts,
+        identification items, custom activity images). Every table is copied with one bulk
+        insert and the copies share the original's stored files. The copy starts inactive so
+        it can be adjusted before students see it.
+        """
+        created = []
+        copy = LessonCopyService.clone(lesson, title=title or f"{lesson.title} (copy)", active=False)
+        copy.save()
+
+        ids_by_type = {}
+        for entry in LessonService.get_activity_index(lesson=lesson):
+            ids_by_type.setdefault(entry["type"], []).append(entry["id"])
+
+        for key, ids in ids_by_type.items():
+            ActivityModel = ActivityManager.registered_activities[key][0]
+            activities = list(ActivityModel.objects.filter(id__in=ids))
+            new_ids = LessonCopyService._copy_rows(
+                ActivityModel, activities, created, lambda row: {"lesson_id": copy.pk}
+            )
+            for relation in LessonCopyService.child_relations(ActivityModel):
+                parent = relation.field.attname
+                children = list(relation.related_model.objects.filter(**{f"{parent}__in": ids}))
+                LessonCopyService._copy_rows(
+                    relation.related_model, children, created,
+                    lambda row: {parent: new_ids[getattr(row, parent)]},
+                )
+
+        LessonCopyService._add_media_references(created)
+        # bulk_create skips the search signals too
+        SearchService.index_lesson(copy)
+        return copy
+
+
+class SearchService:
+    RESULT_LIMIT = 20
+
+    @staticmethod
+    def _vector(text, weight: str):
+        return SearchVector(Value(text or "", output_field=TextField()), weight=weight, config=settings.SEARCH_CONFIG)
+
+    @staticmethod
+    def index(activity):
+        """Builds or rebuilds the ActivitySearchDocument of a top-level activity."""
+        body = "\n".join(text for text in activity.search_content() if text)
+        ActivitySearchDocument.objects.update_or_create(
+            activity_type=type(activity).__name__.lower(),
+            activity_id=activity.pk,
+            defaults={
+                "lesson_id": activity.lesson_id,
+                "title": activity.title,
+                "order": activity.order,
+                "document": (
+                    SearchService._vector(activity.title, "A")
+                    + SearchService._vector(activity.instructions, "B")
+                    + SearchService._vector(body, "C")
+                ),
+            },
+        )
+
+    @staticmethod
+    def remove(activity):
+        ActivitySearchDocument.objects.filter(
+            activity_type=type(activity).__name__.lower(), activity_id=activity.pk
+        ).delete()
+
+    @staticmethod
+    def index_lesson(lesson: Lesson) -> int:
+        """(Re)builds the documents of every activity in a lesson, returns how many there are."""
+        ids_by_type = {}
+        for entry in LessonService.get_activity_index(lesson=lesson):
+            ids_by_type.setdefault(entry["type"], []).append(entry["id"])
+        count = 0
+        for key, ids in ids_by_type.items():
+            ActivityModel = ActivityManager.registered_activities[key][0]
+            for activity in ActivityModel.objects.filter(id__in=ids):
+                SearchService.index(activity)
+                count += 1
+        return count
+
+    @staticmethod
+    def search(text: str, active_only: bool = True, lesson_id=None, limit: int = RESULT_LIMIT) -> list[dict]:
+        """
+        Activities matching a web search style query (quoted phrases, `or`, `-word`), best
+        matches first. Titles rank above instructions, which rank above the activity content.
+        """
+        query = SearchQuery(text, search_type="websearch", config=settings.SEARCH_CONFIG)
+        documents = (
+            ActivitySearchDocument.objects.filter(document=query)
+            .annotate(rank=SearchRank(F("document"), query))
+            .select_related("lesson")
+            .order_by("-rank", "lesson__order", "order")
+        )
+        if active_only:
+            documents = documents.filter(lesson__active=True)
+        if lesson_id:
+            documents = documents.filter(lesson_id=lesson_id)
+        return [
+            {
+                "lesson_id": document.lesson_id,
+                "lesson_title": document.lesson.title,
+                "id": document.activity_id,
+                "type": document.activity_type,
+                "title": document.title,
+                "order": document.order,
+                "rank": document.rank,
+            }
+            for document in documents[:limit]
+        ]
+
 
+class LessonMediaService:
+    # URLs embedded in text, e.g. the image: references Twine.to_dict rewrites
+    EMBEDDED_URL = re.compile(r"https?://[^\s\"'()<>\\]+")
+    # Signed URLs expire (AWS_QUERYSTRING_EXPIRE defaults to an hour), so cached manifests must too
+    CACHE_TIMEOUT = 30 * 60
 
+    @staticmethod
+    def get_content_version(lesson: Lesson) -> str:
+        """
+        Cheap fingerprint of a lesson's content: its own and its activities' last update, the
+        activity counts and the counts of their children (questions, slides, ...). Changes
+        whenever an activity or child is added, removed or saved, saving or deleting a child
+        bumps its activity's updated_at (see core.signals.touch_parent_activity).
+        """
+        parts = [str(lesson.id), lesson.updated_at.isoformat()]
         for value in ActivityManager.registered_activities.values():
             ActivityModel, child_class = value[0], value[3]
             if not child_class:
-                activities = list(ActivityModel.objects.filter(
-                    lesson=lesson).order_by('order'))
-                for activity in activities:
-                    activity_list.append(activity.to_dict())
+                stats = ActivityModel.objects.filter(lesson=lesson).aggregate(latest=Max("updated_at"), count=Count("id"))
+                parts.append(f"{ActivityModel.__name__}:{stats['count']}:{stats['latest']}")
+                for relation in LessonCopyService.child_relations(ActivityModel):
+                    count = relation.related_model.objects.filter(**{f"{relation.field.name}__lesson": lesson}).count()
+                    parts.append(f"{relation.related_model.__name__}:{count}")
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+    @staticmethod
+    def collect_urls(value, found: dict, order: int):
+        """Records every storage URL in a serialized structure, keeping the lowest activity order."""
+        if isinstance(value, dict):
+            # FwdImage.stringify uses the variant URLs as keys of "optimized"
+            for key, item in value.items():
+                LessonMediaService.collect_urls(key, found, order)
+                LessonMediaService.collect_urls(item, found, order)
+        elif isinstance(value, list):
+            for item in value:
+                LessonMediaService.collect_urls(item, found, order)
+        elif isinstance(value, str) and "/" in value:
+            candidates = [value] if "\n" not in value and " " not in value.strip() else []
+            candidates += LessonMediaService.EMBEDDED_URL.findall(value)
+            for url in candidates:
+                url = url.rstrip(".,;")
+                key = storage_key_from_url(url)
+                if key and (key not in found or found[key]["order"] > order):
+                    found[key] = {"url": url, "order": order}
+
+    @staticmethod
+    def stat(keys: list[str]) -> dict[str, dict]:
+        """Size, content type and a content-derived cache key for each storage key."""
+        stats = {}
+        for blob in MediaBlob.objects.filter(key__in=keys):
+            stats[blob.key] = {
+                "size": blob.size,
+                "content_type": blob.content_type or mimetypes.guess_type(blob.key)[0],
+                "cache_key": f"sha256-{blob.sha256[:32]}",
+            }
+
+        for key in keys:
+            if key in stats:
+                continue
+            try:
+                if hasattr(default_storage, "bucket"):
+                    # One HEAD request gives everything for S3 objects
+                    obj = default_storage.bucket.Object(default_storage._normalize_name(key))
+                    stats[key] = {
+                        "size": obj.content_length,
+                        "content_type": obj.content_type,
+                        "cache_key": f"etag-{obj.e_tag.strip(chr(34))}",
+                    }
+                else:
+                    size = default_storage.size(key)
+                    modified = default_storage.get_modified_time(key).timestamp()
+                    stats[key] = {
+                        "size": size,
+                        "content_type": mimetypes.guess_type(key)[0],
+                        "cache_key": hashlib.sha256(f"{key}:{size}:{modified}".encode()).hexdigest()[:32],
+                    }
+            except Exception:
+                stats[key] = {"size": None, "content_type": mimetypes.guess_type(key)[0], "cache_key": None}
+        return stats
 
-        lesson_dict["activities"] = sorted(
-            activity_list, key=lambda x: x["order"])
+    @staticmethod
+    def get_manifest(lesson_id) -> tuple[dict, str]:
+        """
+        Lists every media asset referenced by the lesson content, in the order the student meets
+        them, built from the same serialization as LessonService.get_lesson_content.
+        Cached per content version.
+
+        Returns:
+            tuple: (manifest, etag)
+
+        Raises:
+            Lesson.DoesNotExist: If the lesson doesn't exist
+        """
+        lesson = Lesson.objects.get(id=lesson_id)
+        version = LessonMediaService.get_content_version(lesson)
+        cache_key = f"lesson-media-manifest:{version}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        content = LessonService.get_lesson_content(lesson.id)["lesson"]
+        found = {}
+        activities = content.pop("activities")
+        LessonMediaService.collect_urls(content, found, order=0)
+        for activity in activities:
+            LessonMediaService.collect_urls(activity, found, order=activity["order"])
+
+        stats = LessonMediaService.stat(list(found))
+        assets = [
+            {"url": item["url"], "key": key, "order": item["order"], **stats[key]}
+            for key, item in sorted(found.items(), key=lambda kv: (kv[1]["order"], kv[0]))
+        ]
+        manifest = {
+            "lesson_id": str(lesson.id),
+            "version": version,
+            "total_size": sum(a["size"] or 0 for a in assets),
+            "assets": assets,
+        }
+        etag = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:32]
+        cache.set(cache_key, (manifest, etag), LessonMediaService.CACHE_TIMEOUT)
+        return manifest, etag
+
+
+class LessonBundleService:
+    """
+    Packages a lesson, its content JSON and every file it references, into a single zip for
+    sites with poor or metered connections. Bundles are stored under private/bundles/ and
+    keyed by content version, so a lesson is only rebuilt after it changes.
+    """
+    PREFIX = "private/bundles"
+    # Already compressed formats are stored as-is, deflating them again only costs CPU
+    STORED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp4", ".m4v", ".mov", ".pdf", ".zip")
+    # Bundles requested before they were built, one at a time per process, off the request thread
+    BUILDS = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bundle")
+    BUILD_LOCK_TIMEOUT = 30 * 60
 
+    @staticmethod
+    def variants() -> dict[str, int | None]:
+        """Image sizes a bundle can be built at, by name, with their maximum width."""
         return {
-            "lesson": lesson_dict
+            **{name: value[1][1][0] for name, value in DEFAULT_IMAGE_FORMATS.items()},
+            "original": None,
         }
 
+    @staticmethod
+    def bundle_key(lesson: Lesson, version: str, variant: str) -> str:
+        return f"{LessonBundleService.PREFIX}/{lesson.id}/{version}-{variant}.zip"
+
+    @staticmethod
+    def select_variant(image: dict, max_width: int | None) -> dict:
+        """Collapses a FwdImage.stringify dict down to the single largest variant within max_width."""
+        url = image["original"]
+        if max_width is not None:
+            fitting = [(width, u) for u, width in image["optimized"].items() if u and width <= max_width]
+            if fitting:
+                url = max(fitting)[1]
+        width = image["optimized"].get(url)
+        return {**image, "thumbnail": url, "original": url, "optimized": {url: width} if width else {}}
+
+    @staticmethod
+    def localize(value, max_width: int | None, keys: dict):
+        """
+        Returns a copy of serialized content with storage URLs replaced by bundle-relative
+        paths, filling keys with {storage key: path} for every file that needs packaging.
+        """
+        def local(url):
+            key = storage_key_from_url(url.rstrip(".,;"))
+            if not key:
+                return url
+            keys[key] = f"media/{key}"
+            return url.replace(url.rstrip(".,;"), keys[key])
+
+        if isinstance(value, dict):
+            if {"thumbnail", "original", "optimized"} <= set(value):
+                value = LessonBundleService.select_variant(value, max_width)
+            return {
+                LessonBundleService.localize(k, max_width, keys): LessonBundleService.localize(v, max_width, keys)
+                for k, v in value.items()
+            }
+        if isinstance(value, list):
+            return [LessonBundleService.localize(item, max_width, keys) for item in value]
+        if isinstance(value, str) and "/" in value:
+            if "\n" not in value and " " not in value.strip() and storage_key_from_url(value):
+                return local(value)
+            return LessonMediaService.EMBEDDED_URL.sub(lambda m: local(m.group(0)), value)
+        return value
+
+    @staticmethod
+    def build(lesson: Lesson, variant: str, version: str, path: str):
+        """Writes the bundle zip to a local path, streaming each file from storage."""
+        max_width = LessonBundleService.variants()[variant]
+        keys = {}
+        content = LessonBundleService.localize(LessonService.get_lesson_content(lesson.id), max_width, keys)
+
+        assets = []
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+            for key, arcname in sorted(keys.items()):
+                info = zipfile.ZipInfo(arcname, date_time=timezone.now().timetuple()[:6])
+                if key.lower().endswith(LessonBundleService.STORED_EXTENSIONS):
+                    info.compress_type = zipfile.ZIP_STORED
+                else:
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                try:
+                    with default_storage.open(key, "rb") as src, bundle.open(info, "w", force_zip64=True) as dst:
+                        copy_stream(src, dst)
+                except FileNotFoundError:
+                    logger.warning("Bundle for lesson %s: missing file %s", lesson.id, key)
+                    continue
+                assets.append({"path": arcname, "size": bundle.getinfo(arcname).file_size})
+
+            bundle.writestr("lesson.json", json.dumps(content, cls=DjangoJSONEncoder))
+            bundle.writestr("bundle.json", json.dumps({
+                "lesson_id": str(lesson.id),
+                "version": version,
+                "variant": variant,
+                "created_at": timezone.now().isoformat(),
+                "assets": assets,
+            }))
+
+    @staticmethod
+    def _current(lesson_id, variant: str) -> tuple[Lesson, str, str]:
+        """The lesson, its content version and the storage key of its bundle for that version."""
+        if variant not in LessonBundleService.variants():
+            raise ValueError(f"Unknown variant '{variant}', choose from {', '.join(LessonBundleService.variants())}")
+        lesson = Lesson.objects.get(id=lesson_id)
+        version = LessonMediaService.get_content_version(lesson)
+        return lesson, version, LessonBundleService.bundle_key(lesson, version, variant)
+
+    @staticmethod
+    def find_bundle(lesson_id, variant: str = "original") -> str | None:
+        """
+        Returns the storage key of the lesson's bundle if it is built for the current content,
+        None otherwise. Never builds, so it is safe to call from a request.
+
+        Raises:
+            Lesson.DoesNotExist: If the lesson doesn't exist
+            ValueError: If the variant is unknown
+        """
+        _lesson, _version, key = LessonBundleService._current(lesson_id, variant)
+        return key if default_storage.exists(key) else None
+
+    @staticmethod
+    def schedule_build(lesson_id, variant: str = "original"):
+        """
+        Builds the lesson's bundle on a background thread, unless a build of it is already
+        running (the lock is shared by every process with a shared cache).
+        """
+        lock = f"lesson-bundle-build:{lesson_id}:{variant}"
+        if not cache.add(lock, True, LessonBundleService.BUILD_LOCK_TIMEOUT):
+            return
+
+        def build():
+            try:
+                LessonBundleService.get_bundle(lesson_id, variant)
+            except Exception:
+                logger.exception("Building the %s bundle of lesson %s failed", variant, lesson_id)
+            finally:
+                cache.delete(lock)
+                # The thread's own connection, the pool's thread outlives the request
+                connection.close()
+
+        LessonBundleService.BUILDS.submit(build)
+
+    @staticmethod
+    def get_bundle(lesson_id, variant: str = "original", force: bool = False) -> str:
+        """
+        Returns the storage key of the lesson's bundle, building and storing it first if the
+        lesson changed since the last build. Older bundles of the same variant are removed.
+        Building downloads every file of the lesson, use export_lesson_bundle or schedule_build
+        rather than calling this from a request.
+
+        Raises:
+            Lesson.DoesNotExist: If the lesson doesn't exist
+            ValueError: If the variant is unknown
+        """
+        lesson, version, key = LessonBundleService._current(lesson_id, variant)
+        if not force and default_storage.exists(key):
+            return key
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bundle.zip")
+            LessonBundleService.build(lesson, variant, version, path)
+            if default_storage.exists(key):
+                default_storage.delete(key)
+            with open(path, "rb") as f:
+                key = default_storage.save(key, File(f, name=os.path.basename(key)))
+
+        directory = os.path.dirname(key)
+        _dirs, files = default_storage.listdir(directory)
+        for name in files:
+            if name.endswith(f"-{variant}.zip") and f"{directory}/{name}" != key:
+                default_storage.delete(f"{directory}/{name}")
+        return key
+
+
+class ResponseExportService:
+    """
+    Streams responses of every registered activity (and quiz questions) as CSV or JSON Lines for
+    research. Each response type is read with one joined query through a server-side cursor, so
+    memory use does not depend on how many responses there are.
+    """
+    FORMATS = ("csv", "jsonl")
+    CHUNK_SIZE = 2000
+    COLUMNS = [
+        "response_type", "id", "user_id", "username", "display_name", "facility", "consent",
+        "lesson_id", "lesson_title", "activity_id", "activity_title", "activity_order", "parent_activity_id",
+        "partial_response", "time_spent", "attempts_left", "created_at", "updated_at", "data",
+    ]
+    # Columns read the same way for every response model
+    COMMON_PATHS = {
+        "id": "id",
+        "user_id": "user_id",
+        "username": "user__username",
+        "display_name": "user__display_name",
+        "facility": "user__facility__code",
+        "consent": "user__consent",
+        "lesson_id": "lesson_id",
+        "lesson_title": "lesson__title",
+        "partial_response": "partial_response",
+        "time_spent": "time_spent",
+        "attempts_left": "attempts_left",
+        "created_at": "created_at",
+        "updated_at": "updated_at",
+    }
+
+    @staticmethod
+    def response_models() -> dict:
+        """{response_type: model} of every registered response model, plus quiz questions."""
+        models = {
+            name: value[1]
+            for name, value in ActivityManager.registered_activities.items()
+            if value[1] is not None
+        }
+        models["question"] = UserQuestionResponse
+        return models
+
+    @staticmethod
+    def activity_paths(Model) -> dict:
+        if Model is UserQuestionResponse:
+            return {
+                "activity_id": "question_id",
+                "activity_title": "question__question_text",
+                "activity_order": "question__order",
+                "parent_activity_id": "question__quiz_id",
+            }
+        return {
+            "activity_id": "associated_activity_id",
+            "activity_title": "associated_activity__title",
+            "activity_order": "associated_activity__order",
+        }
+
+    @staticmethod
+    def data_fields(Model) -> list[str]:
+        """The model's own fields, exported together in the `data` column."""
+        paths = set(ResponseExportService.COMMON_PATHS.values()) | set(ResponseExportService.activity_paths(Model).values())
+        return [
+            field.attname for field in Model._meta.concrete_fields
+            if field.attname not in paths and field.attname not in ("quiz_response_id",)
+        ]
+
+    @staticmethod
+    def filter_queryset(queryset, consented_only=False, facilities=None, lessons=None, since=None, until=None):
+        """Narrows a response queryset. Dates apply to when the response was last saved."""
+        if consented_only:
+            queryset = queryset.filter(user__consent=True)
+        if facilities:
+            queryset = queryset.filter(user__facility__code__in=facilities)
+        if lessons:
+            queryset = queryset.filter(lesson_id__in=lessons)
+        if since:
+            queryset = queryset.filter(updated_at__gte=since)
+        if until:
+            queryset = queryset.filter(updated_at__lt=until)
+        return queryset
+
+    @staticmethod
+    def iter_rows(response_type: str, queryset, chunk_size: int = CHUNK_SIZE):
+        """Yields one dict per response of the queryset, with the columns of COLUMNS."""
+        Model = queryset.model
+        paths = {**ResponseExportService.COMMON_PATHS, **ResponseExportService.activity_paths(Model)}
+        data_fields = ResponseExportService.data_fields(Model)
+        columns = list(paths) + data_fields
+        # values_list skips model instances, and no related objects are fetched per row
+        rows = queryset.order_by().values_list(*paths.values(), *data_fields).iterator(chunk_size=chunk_size)
+        for values in rows:
+            row = dict(zip(columns, values))
+            yield {
+                "response_type": response_type,
+                **{column: row.get(column) for column in ResponseExportService.COLUMNS[1:-1]},
+                "data": {field: row[field] for field in data_fields},
+            }
+
+    @staticmethod
+    def iter_all_rows(response_types=None, chunk_size: int = CHUNK_SIZE, **filters):
+        """Yields the rows of every (or the given) response type, filtered with filter_queryset."""
+        for response_type, Model in ResponseExportService.response_models().items():
+            if response_types and response_type not in response_types:
+                continue
+            queryset = ResponseExportService.filter_queryset(Model.objects.all(), **filters)
+            yield from ResponseExportService.iter_rows(response_type, queryset, chunk_size)
+
+    @staticmethod
+    def iter_lines(rows, format: str = "csv"):
+        """Encodes rows as CSV (with a header, `data` as JSON) or JSON Lines, one line at a time."""
+        if format == "jsonl":
+            for row in rows:
+                yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+            return
+
+        class Line:
+            def write(self, value):
+                return value
+
+        writer = csv.writer(Line())
+        yield writer.writerow(ResponseExportService.COLUMNS)
+        for row in rows:
+            row["data"] = json.dumps(row["data"], cls=DjangoJSONEncoder)
+            yield writer.writerow([
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in (row[column] for column in ResponseExportService.COLUMNS)
+            ])
+
 
 class ResponseService:
     staticmethod
@@ -0,0 +1,186 @@
+from django.apps import apps
+from django.contrib.auth.signals import user_logged_out
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .backends import invalidate_user, user_cache_key
+from .fields import DeduplicatedFileMixin
+
+
+def media_fields(model) -> list:
+    """File fields of a model whose uploads are tracked as MediaBlobs."""
+    return [
+        field for field in model._meta.concrete_fields
+        if issubclass(getattr(field, "attr_class", object), DeduplicatedFileMixin)
+    ]
+
+
+def sync_media_references(sender, instance, raw=False, **kwargs):
+    """Points the instance's MediaReference rows at the blobs its file fields currently hold."""
+    if raw:
+        return
+    MediaBlob = apps.get_model("core", "MediaBlob")
+    MediaReference = apps.get_model("core", "MediaReference")
+
+    content_type = ContentType.objects.get_for_model(sender)
+    object_id = str(instance.pk)
+    names = {field.name: getattr(instance, field.attname).name for field in media_fields(sender)}
+    blobs = dict(MediaBlob.objects.filter(key__in=[n for n in names.values() if n]).values_list("key", "id"))
+    current = {
+        ref.field: ref for ref in MediaReference.objects.filter(content_type=content_type, object_id=object_id)
+    }
+
+    stale = []
+    for field, name in names.items():
+        blob_id = blobs.get(name)
+        ref = current.get(field)
+        if blob_id is None:
+            if ref:
+                stale.append(ref.pk)
+        elif ref is None:
+            MediaReference.objects.create(blob_id=blob_id, content_type=content_type, object_id=object_id, field=field)
+        elif ref.blob_id != blob_id:
+            ref.blob_id = blob_id
+            ref.save(update_fields=["blob"])
+    if stale:
+        MediaReference.objects.filter(pk__in=stale).delete()
+
+
+def bulk_sync_media_references(model, instances):
+    """sync_media_references for rows written with bulk_create/bulk_update, which skip post_save."""
+    fields = media_fields(model)
+    if not fields or not instances:
+        return
+    MediaBlob = apps.get_model("core", "MediaBlob")
+    MediaReference = apps.get_model("core", "MediaReference")
+
+    content_type = ContentType.objects.get_for_model(model)
+    names = {
+        (str(instance.pk), field.name): getattr(instance, field.attname).name
+        for instance in instances for field in fields
+    }
+    blobs = dict(MediaBlob.objects.filter(key__in=[n for n in names.values() if n]).values_list("key", "id"))
+    MediaReference.objects.filter(
+        content_type=content_type, object_id__in={object_id for object_id, _ in names}
+    ).delete()
+    MediaReference.objects.bulk_create([
+        MediaReference(blob_id=blobs[name], content_type=content_type, object_id=object_id, field=field)
+        for (object_id, field), name in names.items() if name in blobs
+    ], batch_size=500)
+
+
+def drop_media_references(sender, instance, **kwargs):
+    """
+    Removes the deleted instance's references. The blobs themselves are left for
+    `manage.py media_blobs --prune`, so deleting and re-seeding a lesson reuses its files.
+    """
+    MediaReference = apps.get_model("core", "MediaReference")
+    MediaReference.objects.filter(
+        content_type=ContentType.objects.get_for_model(sender), object_id=str(instance.pk)
+    ).delete()
+
+
+def connect_media_signals():
+    for model in apps.get_app_config("core").get_models():
+        if media_fields(model):
+            post_save.connect(sync_media_references, sender=model, dispatch_uid=f"media_refs_save_{model.__name__}")
+            post_delete.connect(drop_media_references, sender=model, dispatch_uid=f"media_refs_delete_{model.__name__}")
+
+
+# Children whose text is part of their parent activity's search document, by parent field
+SEARCH_CHILDREN = {"Question": "quiz", "Concept": "concept_map", "Slide": "slideshow"}
+
+
+def index_activity(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .services import SearchService
+    SearchService.index(instance)
+
+
+def drop_activity_document(sender, instance, **kwargs):
+    from .services import SearchService
+    SearchService.remove(instance)
+
+
+def index_parent_activity(sender, instance, raw=False, origin=None, **kwargs):
+    """Rebuilds the parent's document when a child is saved or deleted on its own."""
+    if raw:
+        return
+    # Deleting the parent deletes its children first, the parent's document goes with it
+    if kwargs["signal"] is post_delete and not isinstance(origin, sender) and getattr(origin, "model", None) is not sender:
+        return
+    from .services import SearchService
+    parent = getattr(instance, SEARCH_CHILDREN[sender.__name__], None)
+    if parent is not None:
+        SearchService.index(parent)
+
+
+def connect_search_signals():
+    from .models import ActivityManager
+    for ActivityClass, _, __, child_class, ___ in ActivityManager.registered_activities.values():
+        if child_class:
+            continue
+        name = ActivityClass.__name__
+        post_save.connect(index_activity, sender=ActivityClass, dispatch_uid=f"search_save_{name}")
+        post_delete.connect(drop_activity_document, sender=ActivityClass, dispatch_uid=f"search_delete_{name}")
+    for name in SEARCH_CHILDREN:
+        Model = apps.get_model("core", name)
+        post_save.connect(index_parent_activity, sender=Model, dispatch_uid=f"search_child_save_{name}")
+        post_delete.connect(index_parent_activity, sender=Model, dispatch_uid=f"search_child_delete_{name}")
+
+
+# Content children (questions, slides, ...) by model: their parent activity's model and foreign key
+CONTENT_CHILDREN = {}
+
+
+def touch_parent_activity(sender, instance, raw=False, origin=None, **kwargs):
+    """
+    Bumps the parent activity's updated_at when a child is saved or deleted on its own. Children
+    have no timestamp, LessonMediaService.get_content_version reads their parent's.
+    """
+    if raw:
+        return
+    if kwargs["signal"] is post_delete and not isinstance(origin, sender) and getattr(origin, "model", None) is not sender:
+        return
+    ParentModel, attname = CONTENT_CHILDREN[sender]
+    ParentModel.objects.filter(pk=getattr(instance, attname)).update(updated_at=timezone.now())
+
+
+def connect_content_signals():
+    from .models import ActivityManager
+    from .services import LessonCopyService
+    for ActivityClass, _, __, child_class, ___ in ActivityManager.registered_activities.values():
+        if child_class:
+            continue
+        for relation in LessonCopyService.child_relations(ActivityClass):
+            Model = relation.related_model
+            CONTENT_CHILDREN[Model] = (ActivityClass, relation.field.attname)
+            name = Model.__name__
+            post_save.connect(touch_parent_activity, sender=Model, dispatch_uid=f"content_child_save_{name}")
+            post_delete.connect(touch_parent_activity, sender=Model, dispatch_uid=f"content_child_delete_{name}")
+
+
+def drop_cached_user(sender, instance=None, user=None, **kwargs):
+    """Removes a saved, deleted or logged out user from the authentication cache."""
+    user = user or instance
+    if user is not None:
+        invalidate_user(user.pk)
+
+
+def drop_cached_facility_users(sender, instance, **kwargs):
+    """Cached users hold their facility, so renaming one invalidates its users."""
+    User = apps.get_model("core", "User")
+    ids = User.objects.filter(facility=instance).values_list("pk", flat=True)
+    cache.delete_many([user_cache_key(pk) for pk in ids])
+
+
+def connect_user_cache_signals():
+    User = apps.get_model("core", "User")
+    Facility = apps.get_model("core", "Facility")
+    post_save.connect(drop_cached_user, sender=User, dispatch_uid="user_cache_save")
+    post_delete.connect(drop_cached_user, sender=User, dispatch_uid="user_cache_delete")
+    user_logged_out.connect(drop_cached_user, dispatch_uid="user_cache_logout")
+    post_save.connect(drop_cached_facility_users, sender=Facility, dispatch_uid="user_cache_facility_save")
@@ -0,0 +1,16 @@
+'use strict';
+{
+    // Changelist filters picked with select2, see core.admin.AutocompleteListFilter.
+    // autocomplete.js turns the selects into select2 widgets, this follows their changes.
+    const $ = django.jQuery;
+
+    $(function() {
+        $('.autocomplete-filter').on('change', function() {
+            const params = new URLSearchParams(this.dataset.allUrl);
+            if (this.value) {
+                params.set(this.dataset.lookupKwarg, this.value);
+            }
+            window.location.search = params.toString();
+        });
+    });
+}
@@ -0,0 +1,293 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import unquote, urljoin, urlsplit
+
+from botocore import UNSIGNED
+from botocore.config import Config
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage, default_storage
+from django.utils.functional import empty
+from django.utils.encoding import filepath_to_uri
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+
+class ForwardS3Storage(S3Storage):
+    """
+        S3Storage that hands out stable, unsigned URLs for publicly readable keys.
+
+        With `public_urls` enabled, any key under one of `public_prefixes` is
+        uploaded with `public_acl` and a Cache-Control header, and `url()` returns
+        the same URL every time so browsers and CDNs can cache it. If
+        `public_domain` is set the URL is built from that domain (e.g. a CDN in
+        front of the bucket), otherwise it points straight at the bucket endpoint.
+        Every other key keeps the regular signed querystring behaviour.
+    """
+
+    def __init__(self, **settings):
+        super().__init__(**settings)
+        self.public_prefixes = tuple(
+            clean_name(prefix).lstrip("/") for prefix in self.public_prefixes
+        )
+        self._unsigned_connections = threading.local()
+
+    def get_default_settings(self):
+        return {
+            **super().get_default_settings(),
+            "public_urls": False,
+            # imagefield writes its generated variants to __processed__/ next to the source
+            "public_prefixes": ("public/", "__processed__/"),
+            "public_domain": None,
+            "public_acl": "public-read",
+            # keys are overwritten in place by the admin, so avoid `immutable`
+            "public_cache_control": "public, max-age=86400",
+        }
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop("_unsigned_connections", None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._unsigned_connections = threading.local()
+
+    def is_public(self, name: str) -> bool:
+        if not self.public_urls:
+            return False
+        name = clean_name(name).lstrip("/")
+        return name.startswith(self.public_prefixes)
+
+    @property
+    def unsigned_client(self):
+        """boto3 client that builds plain object URLs without computing a signature."""
+        client = getattr(self._unsigned_connections, "client", None)
+        if client is None:
+            client = self._create_session().client(
+                "s3",
+                region_name=self.region_name,
+                use_ssl=self.use_ssl,
+                endpoint_url=self.endpoint_url,
+                config=self.config.merge(Config(signature_version=UNSIGNED)),
+                verify=self.verify,
+            )
+            self._unsigned_connections.client = client
+        return client
+
+    def get_object_parameters(self, name):
+        params = super().get_object_parameters(name)
+        if self.is_public(name):
+            if self.public_acl:
+                params.setdefault("ACL", self.public_acl)
+            if self.public_cache_control:
+                params.setdefault("CacheControl", self.public_cache_control)
+        return params
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        if parameters or not self.is_public(name):
+            return super().url(name, parameters, expire, http_method)
+
+        name = self._normalize_name(clean_name(name))
+        if self.public_domain:
+            return "{}//{}/{}".format(
+                self.url_protocol, self.public_domain, filepath_to_uri(name)
+            )
+        return self.unsigned_client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket_name, "Key": name}
+        )
+
+
+class ForwardFileSystemStorage(FileSystemStorage):
+    """
+        FileSystemStorage for single node deployments where Caddy serves MEDIA_ROOT directly.
+
+        URLs carry a digest of the file's size and modification time as their first path
+        segment (`/media/<digest>/<key>`), so a replaced file gets a new URL and Caddy can
+        send long lived immutable caching headers. Caddy strips the segment again before
+        looking the file up. Missing files get a digest of zeros.
+    """
+    DIGEST_LENGTH = 10
+    DIGEST_SEGMENT = re.compile(r"^[0-9a-f]{%d}/" % DIGEST_LENGTH)
+
+    def digest(self, name: str) -> str:
+        try:
+            stat = os.stat(self.path(name))
+        except OSError:
+            return "0" * self.DIGEST_LENGTH
+        return hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[: self.DIGEST_LENGTH]
+
+    def url(self, name):
+        if self.base_url is None:
+            raise ValueError("This file is not accessible via a URL.")
+        url = filepath_to_uri(name)
+        if url is not None:
+            url = url.lstrip("/")
+        return urljoin(self.base_url, f"{self.digest(name)}/{url}")
+
+    def key_from_url(self, url: str) -> str | None:
+        """Inverse of url(), used by core.utils.storage_key_from_url."""
+        base = urlsplit(self.base_url)
+        parts = urlsplit(url)
+        if base.netloc and parts.netloc != base.netloc:
+            return None
+        path = unquote(parts.path)
+        if not path.startswith(base.path):
+            return None
+        rest = path[len(base.path):]
+        if not self.DIGEST_SEGMENT.match(rest):
+            return None
+        return rest[self.DIGEST_LENGTH + 1:] or None
+
+
+def asset_kind(name: str) -> str:
+    """Groups storage keys for upload statistics: image, image variant, video, pdf, html or other."""
+    if "__processed__/" in name:
+        return "image variant"
+    content_type = mimetypes.guess_type(name)[0] or ""
+    if content_type == "application/pdf":
+        return "pdf"
+    if content_type == "text/html":
+        return "html"
+    major = content_type.split("/")[0]
+    return major if major in ("image", "video") else "other"
+
+
+class ParallelUploadStorage:
+    """
+        Wraps a storage so uploads run on a bounded thread pool while the caller carries on.
+        Used by seed_lessons_data to overlap uploads with its ordered, transactional database
+        writes, which all stay on the calling thread.
+
+        save() spools the content to a temporary file, queues the upload and returns the name
+        right away. exists() lists each directory once and answers from that listing and the
+        queued uploads instead of one round trip per key. Queued files are read back from
+        their spooled copy. wait() blocks until everything is stored and raises the first
+        upload error. Everything not overridden here goes to the wrapped storage.
+    """
+
+    def __init__(self, storage, workers: int = 8):
+        self.storage = storage
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+        self.spool = tempfile.mkdtemp(prefix="uploads-")
+        # name -> (future, spooled path)
+        self.pending = {}
+        # directory -> names of the files in it
+        self.listings = {}
+        # kind -> [files, bytes, seconds spent uploading]
+        self.stats = defaultdict(lambda: [0, 0, 0.0])
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    # ---------- Names ----------
+    def exists(self, name):
+        if name in self.pending:
+            return True
+        directory, basename = posixpath.split(name)
+        if directory not in self.listings:
+            try:
+                _, files = self.storage.listdir(directory)
+            except FileNotFoundError:
+                files = []
+            self.listings[directory] = set(files)
+        return basename in self.listings[directory]
+
+    def is_name_available(self, name, max_length=None):
+        if getattr(self.storage, "file_overwrite", False) or getattr(self.storage, "allow_overwrite", False):
+            return not (max_length and len(name) > max_length)
+        return Storage.is_name_available(self, name, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # The wrapped storage's version would check every candidate with its own exists()
+        return Storage.get_available_name(self, name, max_length)
+
+    # ---------- Files ----------
+    def save(self, name, content, max_length=None):
+        return Storage.save(self, name, content, max_length)
+
+    def _save(self, name, content):
+        fd, path = tempfile.mkstemp(dir=self.spool)
+        with os.fdopen(fd, "wb") as f:
+            for chunk in content.chunks():
+                f.write(chunk)
+        self.pending[name] = (self.executor.submit(self._upload, name, path), path)
+        return name
+
+    def _upload(self, name, path):
+        started = time.monotonic()
+        with open(path, "rb") as f:
+            saved = self.storage._save(name, File(f, name=name))
+        if saved != name:
+            raise RuntimeError(f"Uploaded {name} was stored as {saved}")
+        with self.lock:
+            stats = self.stats[asset_kind(name)]
+            stats[0] += 1
+            stats[1] += os.path.getsize(path)
+            stats[2] += time.monotonic() - started
+
+    def open(self, name, mode="rb"):
+        if name in self.pending and "w" not in mode:
+            # Named after the spooled path so it can be reopened like a local file
+            return File(open(self.pending[name][1], mode))
+        return self.storage.open(name, mode)
+
+    def size(self, name):
+        if name in self.pending:
+            return os.path.getsize(self.pending[name][1])
+        return self.storage.size(name)
+
+    def url(self, name, *args, **kwargs):
+        # Only local storage URLs depend on the stored file (its digest), S3 URLs are known upfront
+        if isinstance(self.storage, ForwardFileSystemStorage):
+            self._wait_for(name)
+        return self.storage.url(name, *args, **kwargs)
+
+    def delete(self, name):
+        self._wait_for(name)
+        self.pending.pop(name, None)
+        directory, basename = posixpath.split(name)
+        self.listings.get(directory, set()).discard(basename)
+        self.storage.delete(name)
+
+    # ---------- Lifecycle ----------
+    def _wait_for(self, name):
+        if name in self.pending:
+            self.pending[name][0].result()
+
+    def wait(self):
+        """Blocks until every queued upload is stored, raising the first failure."""
+        for future, _ in list(self.pending.values()):
+            future.result()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(self.spool, ignore_errors=True)
+
+
+@contextmanager
+def parallel_uploads(workers: int = 8):
+    """
+        Routes default_storage (and every field using it) through a ParallelUploadStorage for
+        the duration of the block. Uploads that are still queued when the block raises are
+        cancelled, call wait() inside the block to make sure everything was stored.
+    """
+    if default_storage._wrapped is empty:
+        default_storage._setup()
+    storage = ParallelUploadStorage(default_storage._wrapped, workers)
+    default_storage._wrapped = storage
+    try:
+        yield storage
+    finally:
+        default_storage._wrapped = storage.storage
+        storage.close()
@@ -0,0 +1,29 @@
+import tempfile
+
+from django.test import override_settings
+
+
+class TempMediaStorageMixin:
+    """
+        Points the default storage at a FileSystemStorage in a temporary directory
+        (`self.media_root`) for each test. Set `media_base_url` when the test needs
+        absolute media URLs.
+    """
+    media_base_url = None
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        options = {"location": self.media_root.name}
+        if self.media_base_url:
+            options["base_url"] = self.media_base_url
+        storages = override_settings(STORAGES={
+            "default": {
+                "BACKEND": "django.core.files.storage.FileSystemStorage",
+                "OPTIONS": options,
+            },
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+        })
+        storages.enable()
+        self.addCleanup(storages.disable)
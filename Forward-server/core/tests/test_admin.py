@@ -0,0 +1,202 @@
+import json
+from django.contrib.auth.models import Group
+from django.contrib.messages.storage.session import SessionStorage
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from core.admin import custom_admin_site, EstimatedCountPaginator
+from core.models import User, Facility, Lesson, TextContent, TextContentResponse, Writing, WritingResponse
+
+
+class ResponseAdminTests(TestCase):
+    """Test cases for the response admin changelists."""
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', password='TestPassword123!', display_name='Admin'
+        )
+        self.factory = RequestFactory()
+
+    def _add_responses(self, count):
+        for i in range(count):
+            lesson = Lesson.objects.create(title=f'Lesson {Lesson.objects.count()}')
+            user = User.objects.create_user(
+                username=f'student{User.objects.count()}', password='TestPassword123!', display_name='Student'
+            )
+            text = TextContent.objects.create(lesson=lesson, title='Text', content='Text', order=1)
+            TextContentResponse.objects.create(user=user, lesson=lesson, associated_activity=text)
+            writing = Writing.objects.create(lesson=lesson, title='Writing', order=2, prompts=[])
+            WritingResponse.objects.create(user=user, lesson=lesson, associated_activity=writing)
+
+    def _request(self, user, **params):
+        request = self.factory.get('/', params)
+        request.user = user
+        request.session = {}
+        request._messages = SessionStorage(request)
+        return request
+
+    def _changelist(self, model, **params):
+        response = custom_admin_site._registry[model].changelist_view(self._request(self.admin_user, **params))
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def _changelist_queries(self, model):
+        with CaptureQueriesContext(connection) as captured:
+            self._changelist(model)
+        return len(captured)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Test that a changelist page takes the same number of queries for 2 or 8 rows."""
+        for model in (TextContentResponse, WritingResponse):
+            self._add_responses(2)
+            few = self._changelist_queries(model)
+            self._add_responses(6)
+            # The lesson filter lists one more choice per row, not more queries
+            self.assertEqual(self._changelist_queries(model), few, model.__name__)
+
+    def test_estimated_count(self):
+        """Test that big tables are counted from the planner's estimate."""
+        self._add_responses(3)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {TextContentResponse._meta.db_table}')
+
+        class Paginator(EstimatedCountPaginator):
+            ESTIMATE_THRESHOLD = 1
+
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(Paginator(TextContentResponse.objects.order_by('id'), 10).count, 3)
+        self.assertNotIn('COUNT(', captured[0]['sql'])
+
+        # Below the threshold the count is exact
+        self.assertEqual(EstimatedCountPaginator(TextContentResponse.objects.order_by('id'), 10).count, 3)
+
+    def test_user_filter_is_autocomplete(self):
+        """Test that the user filter only renders the selected user."""
+        self._add_responses(3)
+        student = TextContentResponse.objects.first().user
+
+        content = self._changelist(TextContentResponse).content.decode()
+        self.assertIn('autocomplete-filter', content)
+        self.assertNotIn(f'value="{student.pk}"', content)
+
+        response = self._changelist(TextContentResponse, user__id__exact=str(student.pk))
+        self.assertIn(f'<option value="{student.pk}" selected>{student.username}</option>', response.content.decode())
+        self.assertEqual(list(response.context_data['cl'].result_list), list(TextContentResponse.objects.filter(user=student)))
+
+    def test_autocomplete_scoped_to_facility(self):
+        """Test that instructors are only offered students of their facility."""
+        north = Facility.objects.create(name='North Campus', code='NORTH')
+        south = Facility.objects.create(name='South Campus', code='SOUTH')
+        instructor = User.objects.create_user(
+            username='instructor', password='TestPassword123!', display_name='Instructor', facility=north, is_staff=True
+        )
+        instructor.groups.add(Group.objects.get_or_create(name='Instructors')[0])
+        User.objects.create_user(username='north_student', password='TestPassword123!', display_name='Student', facility=north)
+        User.objects.create_user(username='south_student', password='TestPassword123!', display_name='Student', facility=south)
+
+        request = self._request(instructor, term='student', app_label='core',
+                                model_name='textcontentresponse', field_name='user')
+        response = custom_admin_site.autocomplete_view(request)
+        results = [result['text'] for result in json.loads(response.content)['results']]
+        self.assertEqual(results, ['north_student'])
+
+    def test_export_action(self):
+        """Test that the export action streams the selected responses."""
+        self._add_responses(2)
+        model_admin = custom_admin_site._registry[WritingResponse]
+        request = self._request(self.admin_user)
+        self.assertIn('export_csv', model_admin.get_actions(request))
+
+        response = model_admin.export_csv(request, WritingResponse.objects.all())
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith('writing,'))
+
+
+class AdminSearchTests(TestCase):
+    """Test cases for the admin search page."""
+
+    def test_search_page(self):
+        """Test that the search page links ranked activities of inactive lessons too."""
+        admin_user = User.objects.create_superuser(username='admin', password='TestPassword123!', display_name='Admin')
+        lesson = Lesson.objects.create(title='Draft Lesson')
+        writing = Writing.objects.create(lesson=lesson, title='Reflection', order=1,
+                                         prompts=[{'prompt': 'Describe your monthly budget'}])
+        request = RequestFactory().get('/', {'q': 'budget'})
+        request.user = admin_user
+
+        response = custom_admin_site.search_view(request)
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['title'] for result in response.context_data['results']], ['Reflection'])
+        self.assertIn(f'/admin/core/writing/{writing.pk}/change/', response.content.decode())
+
+
+class FacilityAdminQueryTests(TestCase):
+    """Test cases for the number of queries of the user and facility admin pages."""
+
+    def setUp(self):
+        self.facility = Facility.objects.create(name='North Campus', code='NORTH')
+        self.other = Facility.objects.create(name='South Campus', code='SOUTH')
+        self.superuser = User.objects.create_superuser(username='admin', password='TestPassword123!', display_name='Admin')
+        self.instructor = User.objects.create_user(
+            username='instructor', password='TestPassword123!', display_name='Instructor', facility=self.facility, is_staff=True
+        )
+        self.instructor.groups.add(Group.objects.get_or_create(name='Instructors')[0])
+        self.factory = RequestFactory()
+
+    def _add_students(self, count):
+        start = User.objects.count()
+        User.objects.bulk_create([
+            User(username=f'student{start + i}', display_name='Student', password='!',
+                 facility=self.facility if i % 2 else self.other)
+            for i in range(count)
+        ])
+
+    def _queries(self, user, view, *args):
+        request = self.factory.get('/')
+        request.user = User.objects.select_related('facility').get(pk=user.pk)
+        request.session = {}
+        request._messages = SessionStorage(request)
+        with CaptureQueriesContext(connection) as captured:
+            response = view(request, *args)
+            response.render()
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def _page_queries(self):
+        user_admin = custom_admin_site._registry[User]
+        facility_admin = custom_admin_site._registry[Facility]
+        return [
+            self._queries(user, view, *args)
+            for user in (self.superuser, self.instructor)
+            for view, args in (
+                (user_admin.changelist_view, ()),
+                (facility_admin.changelist_view, ()),
+                (facility_admin.change_view, (str(self.facility.pk),)),
+            )
+        ]
+
+    def test_queries_do_not_grow_with_users(self):
+        """Test that the pages take the same number of queries with 10 or 1,000 users."""
+        self._add_students(10)
+        # Warms the content type cache
+        self._page_queries()
+        few = self._page_queries()
+        # User changelist, facility changelist and facility page, as superuser then as instructor
+        self.assertEqual(few, [5, 3, 2, 8, 6, 5])
+        self._add_students(990)
+        self.assertEqual(self._page_queries(), few)
+
+    def test_role_checked_once_per_request(self):
+        """Test that the instructor check runs one query however many hooks ask."""
+        self._add_students(10)
+        request = self.factory.get('/')
+        request.user = self.instructor
+        facility_admin = custom_admin_site._registry[Facility]
+        with CaptureQueriesContext(connection) as captured:
+            facility_admin.has_module_permission(request)
+            facility_admin.has_view_permission(request)
+            facility_admin.has_change_permission(request, self.facility)
+        self.assertEqual(len(captured), 1)
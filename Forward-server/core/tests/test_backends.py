@@ -0,0 +1,77 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from core.backends import CachedModelBackend
+from core.models import User, Facility
+
+
+@override_settings(USER_CACHE_TIMEOUT=300)
+class CachedModelBackendTests(TestCase):
+    """Test cases for loading users through the cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.facility = Facility.objects.create(name='North Campus')
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='TestPassword123!',
+            display_name='Test User',
+            facility=self.facility,
+        )
+        self.backend = CachedModelBackend()
+
+    def test_user_and_facility_in_one_query(self):
+        """Test that the first load reads the facility along with the user and later loads hit the cache."""
+        with self.assertNumQueries(1):
+            user = self.backend.get_user(self.user.pk)
+            self.assertEqual(user.to_dict()['facility'], 'North Campus')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk).pk, self.user.pk)
+
+    def test_invalidated_on_save(self):
+        """Test that profile changes are visible on the next load."""
+        self.backend.get_user(self.user.pk)
+        self.user.display_name = 'Renamed'
+        self.user.save()
+
+        self.assertEqual(self.backend.get_user(self.user.pk).display_name, 'Renamed')
+
+    def test_invalidated_on_facility_change(self):
+        """Test that renaming a facility invalidates the cached users in it."""
+        self.backend.get_user(self.user.pk)
+        self.facility.name = 'South Campus'
+        self.facility.save()
+
+        self.assertEqual(self.backend.get_user(self.user.pk).facility.name, 'South Campus')
+
+    def test_inactive_and_deleted_users(self):
+        """Test that deactivated or deleted users are not returned from the cache."""
+        self.backend.get_user(self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+        user_id = self.user.pk
+        self.user.delete()
+        self.assertIsNone(self.backend.get_user(user_id))
+
+    def test_authenticate(self):
+        """Test that authenticate loads the facility and rejects wrong passwords."""
+        user = self.backend.authenticate(None, username='testuser', password='TestPassword123!')
+        with self.assertNumQueries(0):
+            self.assertEqual(user.facility.name, 'North Campus')
+        self.assertIsNone(self.backend.authenticate(None, username='testuser', password='wrong'))
+
+
+@override_settings(USER_CACHE_TIMEOUT=0)
+class UncachedModelBackendTests(TestCase):
+    """Test cases for the backend with the cache turned off."""
+
+    def test_always_reads_database(self):
+        """Test that a timeout of 0 never caches users."""
+        user = User.objects.create_user(username='testuser', password='TestPassword123!', display_name='Test User')
+        backend = CachedModelBackend()
+        backend.get_user(user.pk)
+        with self.assertNumQueries(1):
+            backend.get_user(user.pk)
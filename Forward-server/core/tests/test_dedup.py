@@ -0,0 +1,88 @@
+import io
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from PIL import Image
+from core.models import Lesson, TextContent, JSONImageModel, MediaBlob, MediaReference
+from core.tests.mixins import TempMediaStorageMixin
+
+
+def png_bytes(color) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class MediaDedupTests(TempMediaStorageMixin, TestCase):
+    """Test cases for content-addressed uploads and reference counting."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.lesson = Lesson.objects.create(title="Test Lesson", description="A test lesson", objectives=["Learn"])
+
+    def text_content(self, order, data, name="photo.png"):
+        activity = TextContent(lesson=self.lesson, title=f"Reading {order}", order=order)
+        activity.image.save(name, ContentFile(data, name=name))
+        return activity
+
+    def test_identical_uploads_share_storage(self):
+        """Test that identical bytes are stored once and referenced by both rows."""
+        first = self.text_content(1, png_bytes("red"))
+        second = self.text_content(2, png_bytes("red"), name="copy.png")
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(MediaBlob.objects.count(), 1)
+        self.assertEqual(MediaReference.objects.filter(blob__key=first.image.name).count(), 2)
+
+    def test_name_collision_keeps_both_files(self):
+        """Test that a different file with an existing name does not overwrite the stored one."""
+        first = self.text_content(1, png_bytes("red"))
+        second = self.text_content(2, png_bytes("blue"))
+
+        self.assertNotEqual(first.image.name, second.image.name)
+        self.assertTrue(default_storage.exists(first.image.name))
+        self.assertTrue(default_storage.exists(second.image.name))
+
+    def test_shared_file_not_deleted_while_referenced(self):
+        """Test that deleting one row's file keeps the storage object the other row uses."""
+        first = self.text_content(1, png_bytes("red"))
+        second = self.text_content(2, png_bytes("red"))
+        name = first.image.name
+
+        first.image.delete()
+        self.assertFalse(first.image)
+        self.assertTrue(default_storage.exists(name))
+
+        second.image.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(key=name).exists())
+
+    def test_json_image_model_reused(self):
+        """Test that JSONImageModel.from_file returns the existing row for identical images."""
+        first = JSONImageModel.from_file(ContentFile(png_bytes("green"), name="a.png"))
+        second = JSONImageModel.from_file(ContentFile(png_bytes("green"), name="b.png"))
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(JSONImageModel.objects.count(), 1)
+
+    def test_store_skips_identical_content(self):
+        """Test that MediaBlob.store only writes when the content under a key changes."""
+        key = MediaBlob.store("public/twine/images/map.png", ContentFile(png_bytes("red"), name="map.png"), pinned=True)
+        modified = default_storage.get_modified_time(key)
+
+        self.assertEqual(MediaBlob.store(key, ContentFile(png_bytes("red"), name="map.png"), pinned=True), key)
+        self.assertEqual(default_storage.get_modified_time(key), modified)
+
+        MediaBlob.store(key, ContentFile(png_bytes("blue"), name="map.png"), pinned=True)
+        self.assertEqual(MediaBlob.objects.get(key=key).size, len(png_bytes("blue")))
+
+    def test_placeholder_and_dimensions(self):
+        """Test that uploads record their size and a placeholder, and copies reuse them."""
+        first = self.text_content(1, png_bytes("red"))
+        self.assertEqual((first.image_width, first.image_height), (32, 32))
+        self.assertTrue(first.image_placeholder.startswith("data:image/jpeg;base64,"))
+
+        second = self.text_content(2, png_bytes("red"), name="copy.png")
+        self.assertEqual(second.image_placeholder, first.image_placeholder)
+        self.assertEqual(second.image_width, 32)
@@ -0,0 +1,132 @@
+import io
+import os
+import struct
+import tempfile
+from unittest import mock
+from django.test import SimpleTestCase
+from core import media
+
+
+def atom(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", len(payload) + 8, kind) + payload
+
+
+def build_mp4(moov_first=False, co64=False):
+    """Builds a minimal MP4 whose single chunk offset points at `SAMPLE` inside mdat."""
+    ftyp = atom(b"ftyp", b"isom\x00\x00\x02\x00isomiso2mp41")
+    sample = b"SAMPLE-DATA"
+
+    def moov_for(offset):
+        # version 0 mvhd: flags, creation, modification, timescale=1000, duration=12500
+        mvhd = atom(b"mvhd", struct.pack(">IIIII", 0, 0, 0, 1000, 12500) + b"\x00" * 80)
+        if co64:
+            table = atom(b"co64", struct.pack(">IIQ", 0, 1, offset))
+        else:
+            table = atom(b"stco", struct.pack(">III", 0, 1, offset))
+        trak = atom(b"trak", atom(b"mdia", atom(b"minf", atom(b"stbl", table))))
+        return atom(b"moov", mvhd + trak)
+
+    free = atom(b"free", b"\x00" * 16)
+    if moov_first:
+        moov = moov_for(0)
+        offset = len(ftyp) + len(moov) + 8
+        return ftyp + moov_for(offset) + atom(b"mdat", sample)
+    offset = len(ftyp) + len(free) + 8
+    return ftyp + free + atom(b"mdat", sample) + moov_for(offset)
+
+
+def chunk_offset(data: bytes) -> int:
+    for marker, fmt in ((b"stco", ">I"), (b"co64", ">Q")):
+        index = data.find(marker)
+        if index != -1:
+            return struct.unpack_from(fmt, data, index + 12)[0]
+    raise AssertionError("no chunk offset table")
+
+
+class FastStartTests(SimpleTestCase):
+    """Test cases for the in-python MP4 fast-start rewriter."""
+
+    def test_moov_moved_before_mdat(self):
+        """Test that moov is moved to the front and chunk offsets still point at the samples."""
+        src = io.BytesIO(build_mp4())
+        self.assertFalse(media.is_faststart(src))
+
+        dst = io.BytesIO()
+        self.assertTrue(media.faststart(src, dst))
+        out = dst.getvalue()
+
+        kinds = [a[0] for a in media.iter_atoms(io.BytesIO(out), 0, -1)]
+        self.assertEqual(kinds, [b"ftyp", b"moov", b"mdat"])
+        offset = chunk_offset(out)
+        self.assertEqual(out[offset:offset + 11], b"SAMPLE-DATA")
+
+    def test_co64_offsets(self):
+        """Test that 64 bit chunk offset tables are shifted as well."""
+        dst = io.BytesIO()
+        media.faststart(io.BytesIO(build_mp4(co64=True)), dst)
+        out = dst.getvalue()
+        offset = chunk_offset(out)
+        self.assertEqual(out[offset:offset + 11], b"SAMPLE-DATA")
+
+    def test_already_faststart(self):
+        """Test that files with moov first are left alone."""
+        src = io.BytesIO(build_mp4(moov_first=True))
+        self.assertTrue(media.is_faststart(src))
+        dst = io.BytesIO()
+        self.assertFalse(media.faststart(src, dst))
+        self.assertEqual(dst.getvalue(), b"")
+
+    def test_not_an_mp4(self):
+        """Test that files without moov/mdat raise MediaError."""
+        with self.assertRaises(media.MediaError):
+            media.faststart(io.BytesIO(atom(b"ftyp", b"isom")), io.BytesIO())
+
+    def test_duration(self):
+        """Test that the duration is read from mvhd."""
+        self.assertEqual(media.mp4_duration(io.BytesIO(build_mp4())), 12.5)
+
+
+def build_pdf(pages: int, linearized=False) -> bytes:
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"<< /Type /Pages /Kids [] /Count %d >>" % pages]
+    objects += [b"<< /Type /Page /Parent 2 0 R >>" for _ in range(pages)]
+    if linearized:
+        objects.insert(0, b"<< /Linearized 1 /L 1000 >>")
+    body = b"".join(b"%d 0 obj\n%s\nendobj\n" % (i + 1, obj) for i, obj in enumerate(objects))
+    return b"%PDF-1.4\n" + body + b"%%EOF\n"
+
+
+class PDFMetadataTests(SimpleTestCase):
+    """Test cases for the PDF helpers when no external tools are installed."""
+
+    def setUp(self):
+        patcher = mock.patch.object(media, "tool", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, data: bytes) -> str:
+        path = os.path.join(self.tmp.name, "doc.pdf")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_page_count_fallback(self):
+        """Test that page objects are counted without pdfinfo, ignoring the /Pages node."""
+        self.assertEqual(media.pdf_page_count(self.write(build_pdf(7))), 7)
+
+    def test_page_count_across_chunks(self):
+        """Test that page objects are counted once when the file spans several read chunks."""
+        with mock.patch.object(media, "CHUNK_SIZE", 40):
+            self.assertEqual(media.pdf_page_count(self.write(build_pdf(12))), 12)
+
+    def test_linearized_detection(self):
+        """Test that the linearization dictionary is detected at the start of the file."""
+        self.assertTrue(media.pdf_is_linearized(self.write(build_pdf(2, linearized=True))))
+        self.assertFalse(media.pdf_is_linearized(self.write(build_pdf(2))))
+
+    def test_without_tools(self):
+        """Test that linearizing and thumbnails are skipped when qpdf/poppler are missing."""
+        path = self.write(build_pdf(1))
+        self.assertFalse(media.linearize_pdf(path, path + ".out"))
+        self.assertIsNone(media.pdf_thumbnail(path))
@@ -1,9 +1,16 @@
+import importlib
+from unittest import mock
+from django.apps import apps
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.files.base import ContentFile
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.db.utils import IntegrityError
 from django.core.exceptions import ValidationError
-from core.models import User, Lesson, TextContent, Quiz, Question, Writing, UserQuizResponse, UserQuestionResponse
+from core.models import User, Lesson, TextContent, Quiz, Question, Writing, UserQuizResponse, UserQuestionResponse, CustomActivity, CustomActivityImageAsset
+from core.tests.mixins import TempMediaStorageMixin
 
 User = get_user_model()
 
@@ -651,4 +658,66 @@ class QuizResponseModelTests(TestCase):
         self.assertEqual(quiz_dict['quizId'], self.quiz.id)
         self.assertEqual(quiz_dict['score'], 3)
         self.assertEqual(quiz_dict['isComplete'], True)
-        self.assertEqual(len(quiz_dict['questionResponses']), 1)
\ No newline at end of file
+        self.assertEqual(len(quiz_dict['questionResponses']), 1)
+
+
+class CustomActivityModelTests(TempMediaStorageMixin, TestCase):
+    """Test cases for the CustomActivity document compiled on upload."""
+
+    DOCUMENT = b"""<html>
+    <!-- author notes -->
+    <body>
+        <img src="map.png" alt="Map">
+        <img src='missing.jpg'>
+        <script>window.parent.postMessage({ type: "activityEnd" }, "*")</script>
+    </body>
+</html>"""
+
+    media_base_url = "http://testserver/media/"
+
+    def setUp(self):
+        super().setUp()
+
+        self.lesson = Lesson.objects.create(title='Test Lesson', description='A test lesson', objectives=['Play'])
+        self.activity = CustomActivity(lesson=self.lesson, title='Game', order=1)
+        self.activity.document.save('game.html', ContentFile(self.DOCUMENT), save=False)
+        self.activity.save()
+
+    def test_compiled_on_save(self):
+        """Test that images are detected and a minified copy is stored when the document is uploaded."""
+        self.assertEqual(self.activity.detected_images, ['map.png', 'missing.jpg'])
+        self.assertNotIn('author notes', self.activity.compiled_document)
+        self.assertIn('window.parent.postMessage', self.activity.compiled_document)
+
+    def test_to_dict_does_not_read_document(self):
+        """Test that to_dict resolves asset URLs without reading the document from storage."""
+        CustomActivityImageAsset.objects.create(
+            custom_activity=self.activity,
+            image=ContentFile(b'not really a png', name='map.png'),
+        )
+        activity = CustomActivity.objects.get(pk=self.activity.pk)
+        with mock.patch.object(activity.document.storage, 'open', side_effect=AssertionError('document was read')):
+            document = activity.to_dict()['compiled_document']
+
+        asset = CustomActivityImageAsset.objects.get(custom_activity=activity)
+        self.assertIn(f'src="{asset.image.url}"', document)
+        self.assertIn("src='missing.jpg'", document)
+
+    def test_to_dict_does_not_compile(self):
+        """Test that a document that was never compiled is not compiled (and saved) while reading."""
+        CustomActivity.objects.filter(pk=self.activity.pk).update(compiled_document='', compiled_source='')
+        activity = CustomActivity.objects.get(pk=self.activity.pk)
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(activity.to_dict()['compiled_document'], '')
+        self.assertFalse([query for query in captured if not query['sql'].startswith('SELECT')])
+        self.assertEqual(CustomActivity.objects.get(pk=self.activity.pk).compiled_source, '')
+
+    def test_existing_documents_compiled_by_migration(self):
+        """Test that the data migration compiles documents uploaded before compilation existed."""
+        migration = importlib.import_module('core.migrations.0014_compile_custom_activity_documents')
+        CustomActivity.objects.filter(pk=self.activity.pk).update(compiled_document='', compiled_source='', detected_images=[])
+        migration.compile_documents(apps, None)
+
+        activity = CustomActivity.objects.get(pk=self.activity.pk)
+        self.assertEqual(activity.detected_images, ['map.png', 'missing.jpg'])
+        self.assertIn('window.parent.postMessage', activity.to_dict()['compiled_document'])
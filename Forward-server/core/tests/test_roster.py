@@ -0,0 +1,121 @@
+import csv
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.test import TestCase
+from core.models import User, Facility
+
+
+class ImportRosterTests(TestCase):
+    """Test cases for the import_roster command."""
+
+    def setUp(self):
+        self.facility = Facility.objects.create(name='North Campus', code='NORTH')
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def _roster(self, rows):
+        path = os.path.join(self.dir.name, 'roster.csv')
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['username', 'display_name', 'password', 'facility', 'group'])
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def _import(self, path, *args):
+        output = os.path.join(self.dir.name, 'report.csv')
+        call_command('import_roster', path, '--output', output, '--workers', '1', *args, stderr=StringIO())
+        with open(output, newline='') as f:
+            return {row['username']: row for row in csv.DictReader(f)}
+
+    def test_creates_users(self):
+        """Test that users are created with their facility and a usable password."""
+        path = self._roster([
+            {'username': 'student1', 'display_name': 'Student One', 'password': 'Secret123!', 'facility': 'north'},
+            {'username': 'student2', 'display_name': 'Student Two', 'password': '', 'facility': 'NORTH'},
+        ])
+        report = self._import(path, '--generate-passwords')
+
+        self.assertEqual(report['student1']['status'], 'created')
+        self.assertTrue(User.objects.get(username='student1').check_password('Secret123!'))
+        student2 = User.objects.get(username='student2')
+        self.assertEqual(student2.facility, self.facility)
+        self.assertTrue(student2.check_password(report['student2']['password']))
+
+    def test_rerun_is_idempotent(self):
+        """Test that importing the same roster again leaves existing users alone."""
+        path = self._roster([
+            {'username': 'student1', 'display_name': 'Student One', 'password': 'Secret123!', 'facility': 'NORTH'},
+        ])
+        self._import(path)
+        report = self._import(self._roster([
+            {'username': 'student1', 'display_name': 'Student One', 'password': 'Changed123!', 'facility': 'NORTH'},
+        ]))
+
+        self.assertEqual(report['student1']['status'], 'exists')
+        self.assertEqual(report['student1']['password'], '')
+        self.assertEqual(User.objects.filter(username='student1').count(), 1)
+        self.assertTrue(User.objects.get(username='student1').check_password('Secret123!'))
+
+    def test_invalid_rows_are_reported(self):
+        """Test that rows with unknown facilities or missing passwords are reported and not created."""
+        path = self._roster([
+            {'username': 'student1', 'display_name': 'Student One', 'password': 'Secret123!', 'facility': 'SOUTH'},
+            {'username': 'student2', 'display_name': 'Student Two', 'password': '', 'facility': 'NORTH'},
+        ])
+        report = self._import(path)
+
+        self.assertTrue(report['student1']['status'].startswith('error'))
+        self.assertTrue(report['student2']['status'].startswith('error'))
+        self.assertFalse(User.objects.filter(username__in=['student1', 'student2']).exists())
+
+    def test_dry_run_saves_nothing(self):
+        """Test that a dry run neither creates users nor the groups they would join."""
+        path = self._roster([
+            {'username': 'student1', 'display_name': 'Student One', 'password': 'Secret123!', 'facility': 'NORTH',
+             'group': 'Cohort A'},
+        ])
+        report = self._import(path, '--dry-run')
+
+        self.assertEqual(report['student1']['status'], 'created')
+        self.assertFalse(User.objects.filter(username='student1').exists())
+        self.assertFalse(Group.objects.filter(name='Cohort A').exists())
+
+        self._import(path)
+        self.assertEqual(list(User.objects.get(username='student1').groups.values_list('name', flat=True)), ['Cohort A'])
+
+    def test_update_keeps_blank_columns(self):
+        """Test that --update leaves fields alone when their column is blank."""
+        self._import(self._roster([
+            {'username': 'student1', 'display_name': 'Student One', 'password': 'Secret123!', 'facility': 'NORTH'},
+        ]))
+        report = self._import(self._roster([
+            {'username': 'student1', 'display_name': '', 'password': '', 'facility': ''},
+        ]), '--update')
+
+        self.assertEqual(report['student1']['status'], 'updated')
+        self.assertEqual(report['student1']['display_name'], 'Student One')
+        student1 = User.objects.get(username='student1')
+        self.assertEqual(student1.display_name, 'Student One')
+        self.assertEqual(student1.facility, self.facility)
+        self.assertTrue(student1.check_password('Secret123!'))
+
+    def test_weak_passwords_are_rejected(self):
+        """Test that supplied passwords go through the password validators."""
+        self._import(self._roster([
+            {'username': 'student1', 'display_name': 'Student One', 'password': 'Secret123!', 'facility': 'NORTH'},
+        ]))
+        report = self._import(self._roster([
+            {'username': 'student1', 'display_name': 'Renamed', 'password': '123', 'facility': 'NORTH'},
+            {'username': 'student2', 'display_name': 'Student Two', 'password': '123', 'facility': 'NORTH'},
+        ]), '--update')
+
+        self.assertTrue(report['student1']['status'].startswith('error'))
+        self.assertTrue(report['student2']['status'].startswith('error'))
+        self.assertFalse(User.objects.filter(username='student2').exists())
+        student1 = User.objects.get(username='student1')
+        self.assertEqual(student1.display_name, 'Student One')
+        self.assertTrue(student1.check_password('Secret123!'))
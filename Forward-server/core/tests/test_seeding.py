@@ -0,0 +1,329 @@
+import io
+import json
+import os
+import tempfile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from core.models import (ActivitySearchDocument, Lesson, LessonSeedManifest, MediaReference, Question, Quiz,
+                         Slide, TextContent, User, UserQuestionResponse, UserQuizResponse, Writing, WritingResponse)
+from core.tests.mixins import TempMediaStorageMixin
+
+
+class SeedTestCase(TempMediaStorageMixin, TestCase):
+    """Seeds a lesson from a temporary folder into temporary media storage."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.path = os.path.join(self.folder.name, "lesson.json")
+        self._image("chart.png", "red")
+        self.data = {
+            "lesson": {"title": "Budgeting", "description": "Managing money", "order": 1},
+            "activities": [
+                {"type": "textcontent", "title": "Introduction", "content": "Welcome", "image": "chart.png"},
+                {"type": "writing", "title": "Reflection", "prompts": [{"prompt": "What do you spend on?"}]},
+                {"type": "quiz", "title": "Check", "questions": [
+                    {"question_text": "Is saving good?", "question_type": "multiple_choice", "choices": {}},
+                ]},
+            ],
+        }
+
+    def _image(self, name, color):
+        Image.new("RGB", (16, 16), color).save(os.path.join(self.folder.name, name), format="PNG")
+
+    def _seed(self, *args):
+        with open(self.path, "w") as f:
+            json.dump(self.data, f)
+        out = io.StringIO()
+        call_command("seed_lessons_data", self.path, *args, stdout=out)
+        return out.getvalue()
+
+
+class IncrementalSeedTests(SeedTestCase):
+    """Test cases for seed_lessons_data --incremental."""
+
+    def test_manifest(self):
+        """Test that every seed records the hashes of its activities and assets."""
+        self._seed()
+        manifest = LessonSeedManifest.objects.get(source=self.path)
+        self.assertEqual(manifest.lesson.title, "Budgeting")
+        self.assertEqual(len(manifest.activities), 3)
+        self.assertEqual(list(manifest.assets), ["chart.png"])
+
+    def test_unchanged(self):
+        """Test that an unchanged seed file touches nothing."""
+        self._seed()
+        image = TextContent.objects.get().image.name
+        output = self._seed("--incremental")
+        self.assertIn("Unchanged lesson: Budgeting", output)
+        self.assertEqual(output.count("Unchanged "), 4)
+        self.assertEqual(TextContent.objects.get().image.name, image)
+
+    def test_changes_keep_ids_and_responses(self):
+        """Test that changed, moved and new activities keep existing ids and responses."""
+        self._seed()
+        writing = Writing.objects.get()
+        question = Question.objects.get()
+        user = User.objects.create_user(username="student", password="TestPassword123!", display_name="Student")
+        WritingResponse.objects.create(user=user, lesson=writing.lesson, associated_activity=writing)
+
+        self.data["activities"][1]["prompts"][0]["prompt"] = "What do you save for?"
+        self.data["activities"].insert(0, {"type": "textcontent", "title": "Goals", "content": "Plan ahead"})
+        del self.data["activities"][-1]
+        output = self._seed("--incremental")
+
+        writing.refresh_from_db()
+        self.assertEqual((writing.order, writing.prompts[0]["prompt"]), (3, "What do you save for?"))
+        self.assertTrue(WritingResponse.objects.filter(associated_activity=writing).exists())
+        self.assertIn("Moved textcontent (Order: 1 -> 2): Introduction", output)
+        self.assertEqual(list(TextContent.objects.order_by("order").values_list("title", flat=True)), ["Goals", "Introduction"])
+        self.assertFalse(Question.objects.filter(pk=question.pk).exists())
+        self.assertEqual(len(LessonSeedManifest.objects.get().activities), 3)
+
+    def test_changed_asset(self):
+        """Test that replacing a file re-seeds the activities using it, under the same id."""
+        self._seed()
+        text = TextContent.objects.get()
+        self._image("chart.png", "blue")
+        output = self._seed("--incremental")
+
+        self.assertIn("Updated textcontent (Order: 1): Introduction", output)
+        self.assertIn("Unchanged writing", output)
+        self.assertNotEqual(TextContent.objects.get(pk=text.pk).image.name, text.image.name)
+
+    def test_swapped_assets(self):
+        """Test that unchanged files swapped between activities are attached to their new activity."""
+        self._image("goals.png", "blue")
+        self.data["activities"].insert(1, {"type": "textcontent", "title": "Goals", "content": "Plan", "image": "goals.png"})
+        self._seed()
+        names = dict(TextContent.objects.values_list("title", "image"))
+
+        self.data["activities"][0]["image"], self.data["activities"][1]["image"] = "goals.png", "chart.png"
+        self._seed("--incremental")
+        self.assertEqual(dict(TextContent.objects.values_list("title", "image")),
+                         {"Introduction": names["Goals"], "Goals": names["Introduction"]})
+
+    def test_renamed_lesson(self):
+        """Test that a renamed lesson is updated instead of seeded again."""
+        self._seed()
+        lesson = Lesson.objects.get()
+        self.data["lesson"]["title"] = "Budgeting Basics"
+        self._seed("--incremental")
+        self.assertEqual(list(Lesson.objects.values_list("pk", "title")), [(lesson.pk, "Budgeting Basics")])
+
+    def test_reset_and_incremental(self):
+        """Test that --reset cannot be combined with --incremental."""
+        with self.assertRaises(CommandError):
+            self._seed("--reset", "--incremental")
+
+
+class SeedChildrenTests(SeedTestCase):
+    """Test cases for seeding the questions, slides, ... of an activity."""
+
+    def _questions(self, count, text="Question"):
+        self.data["activities"][2]["questions"] = [
+            {"question_text": f"{text} {i}", "question_type": "multiple_choice", "choices": {}}
+            for i in range(count)
+        ]
+
+    def _queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            self._seed()
+        return len(captured)
+
+    def test_queries_do_not_grow_with_questions(self):
+        """Test that seeding a quiz takes the same number of queries for 4 or 40 questions."""
+        self._questions(4)
+        self._seed()
+        Quiz.objects.all().delete()
+        few = self._queries()
+        Quiz.objects.all().delete()
+        self._questions(40)
+        self.assertEqual(self._queries(), few)
+
+        # Updating every question of an existing quiz does not take more queries either
+        self._questions(40, text="Updated question")
+        self._queries()
+        self._questions(40, text="Question")
+        self.assertLessEqual(self._queries(), few)
+        self.assertEqual(Question.objects.count(), 40)
+
+    def test_children_diff(self):
+        """Test that existing children keep their ids and responses, and extra ones are deleted."""
+        self._questions(3)
+        self._seed()
+        first = Question.objects.get(order=1)
+        user = User.objects.create_user(username="student", password="TestPassword123!", display_name="Student")
+        UserQuizResponse.objects.create(user=user, lesson=first.quiz.lesson, associated_activity=first.quiz)
+
+        self._questions(2, text="Reworded")
+        output = self._seed()
+
+        self.assertIn("Questions: 0 created, 2 updated, 0 unchanged, 1 deleted", output)
+        first.refresh_from_db()
+        self.assertEqual(first.question_text, "Reworded 0")
+        self.assertEqual(UserQuizResponse.objects.count(), 1)
+        document = ActivitySearchDocument.objects.get(activity_id=first.quiz_id)
+        self.assertIn("reword", str(document.document))
+
+    def test_children_insert_in_middle(self):
+        """Test that inserting a question keeps the others' ids, responses and images."""
+        self._image("goals.png", "blue")
+        self._questions(3)
+        for question, image in zip(self.data["activities"][2]["questions"], ("chart.png", "goals.png", None)):
+            if image:
+                question["image"] = image
+        self._seed()
+        before = {q.question_text: (q.pk, q.image.name) for q in Question.objects.all()}
+        second = Question.objects.get(question_text="Question 1")
+        user = User.objects.create_user(username="student", password="TestPassword123!", display_name="Student")
+        quiz_response = UserQuizResponse.objects.create(user=user, lesson=second.quiz.lesson, associated_activity=second.quiz)
+        UserQuestionResponse.objects.create(user=user, lesson=second.quiz.lesson, quiz_response=quiz_response, question=second,
+                                            response_data={})
+
+        self.data["activities"][2]["questions"].insert(1, {"question_text": "New", "question_type": "multiple_choice",
+                                                           "choices": {}})
+        self.assertIn("Questions: 1 created, 2 updated, 1 unchanged, 0 deleted", self._seed())
+        for args in ((), ("--incremental",)):
+            if args:
+                # An incremental seed only skips files already on the right question
+                self.data["activities"][2]["questions"].append({"question_text": "Last", "choices": {}})
+                self._seed(*args)
+            self.assertEqual(
+                {q.question_text: (q.pk, q.image.name) for q in Question.objects.exclude(question_text__in=["New", "Last"])},
+                before,
+            )
+        self.assertEqual(list(Question.objects.order_by("order").values_list("question_text", flat=True)),
+                         ["Question 0", "New", "Question 1", "Question 2", "Last"])
+        self.assertEqual(UserQuestionResponse.objects.get().question.question_text, "Question 1")
+
+    def test_child_files(self):
+        """Test that child files are stored, referenced and get their image variants."""
+        self._image("slide.png", "green")
+        self.data["activities"].append({"type": "slideshow", "title": "Tour", "slides": [
+            {"content": "First", "image": "slide.png"},
+            {"content": "Second", "image": "chart.png"},
+        ]})
+        self._seed()
+
+        slides = list(Slide.objects.order_by("order"))
+        self.assertEqual([slide.order for slide in slides], [0, 1])
+        self.assertTrue(all(slide.image.name and slide.image_width == 16 for slide in slides))
+        self.assertEqual(MediaReference.objects.filter(object_id__in=[str(slide.pk) for slide in slides]).count(), 2)
+        processed = os.path.join(self.media_root.name, "__processed__")
+        self.assertTrue(os.path.isdir(processed) and os.listdir(processed))
+
+        # Reseeding reuses the stored files
+        self._seed()
+        self.assertEqual([slide.image.name for slide in Slide.objects.order_by("order")], [s.image.name for s in slides])
+
+
+class ExportLessonTests(SeedTestCase):
+    """Test cases for export_lesson."""
+
+    def _export(self, folder, *args):
+        out = io.StringIO()
+        call_command("export_lesson", "Budgeting", "--output", folder, *args, stdout=out)
+        return out.getvalue()
+
+    def _read(self, folder):
+        files = {}
+        for root, _, names in os.walk(folder):
+            for name in names:
+                with open(os.path.join(root, name), "rb") as f:
+                    files[os.path.relpath(os.path.join(root, name), folder)] = f.read()
+        return files
+
+    def test_round_trip(self):
+        """Test that an exported lesson seeds back into the same lesson, files and JSON images included."""
+        self._image("prompt.png", "green")
+        self.data["activities"][1]["prompts"].append({"prompt": "Draw your budget", "image": "prompt.png"})
+        self.data["activities"].append({"type": "slideshow", "title": "Tour", "slides": [
+            {"content": "First", "image": "chart.png"},
+        ]})
+        self._seed()
+        exported = tempfile.TemporaryDirectory()
+        self.addCleanup(exported.cleanup)
+        output = self._export(exported.name, "--workers", "2")
+        self.assertIn("4 activities, 2 files", output)
+
+        with open(os.path.join(exported.name, "lesson.json")) as f:
+            data = json.load(f)
+        self.assertEqual(data["lesson"], {**self.data["lesson"], "objectives": [], "tags": []})
+        self.assertEqual(data["activities"][0]["image"], "chart.png")
+        self.assertEqual(data["activities"][1]["prompts"][1]["image"], "prompt.png")
+        self.assertEqual(data["activities"][3]["slides"], [{"content": "First", "image": "chart.png"}])
+
+        Lesson.objects.all().delete()
+        call_command("seed_lessons_data", os.path.join(exported.name, "lesson.json"), stdout=io.StringIO())
+        again = tempfile.TemporaryDirectory()
+        self.addCleanup(again.cleanup)
+        self._export(again.name)
+        self.assertEqual(self._read(again.name), self._read(exported.name))
+
+    def test_existing_folder(self):
+        """Test that an existing export is only overwritten with --force, and unknown lessons fail."""
+        self._seed()
+        self._export(self.folder.name, "--force")
+        with self.assertRaises(CommandError):
+            self._export(self.folder.name)
+        with self.assertRaisesMessage(CommandError, "No lesson matches"):
+            call_command("export_lesson", "Saving", stdout=io.StringIO())
+
+
+class SeedAllLessonsTests(TempMediaStorageMixin, TransactionTestCase):
+    """Test cases for seed_all_lessons."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        for name in ("budgeting", "careers"):
+            self._lesson(name, {"title": name.capitalize(), "description": "A lesson", "order": 1})
+
+    def _lesson(self, folder, lesson, padding=0):
+        os.makedirs(os.path.join(self.root.name, folder))
+        with open(os.path.join(self.root.name, folder, "lesson.json"), "w") as f:
+            json.dump({"lesson": lesson, "activities": [
+                {"type": "textcontent", "title": "Introduction", "content": "Welcome" + " " * padding},
+            ]}, f)
+
+    def _seed_all(self, *args):
+        out = io.StringIO()
+        call_command("seed_all_lessons", "--root", self.root.name, *args, stdout=out)
+        return out.getvalue()
+
+    def test_processes(self):
+        """Test that lessons are seeded by a process pool, each with its own manifest."""
+        output = self._seed_all("--processes", "2")
+        self.assertIn("Seeded 2 of 2 lessons", output)
+        self.assertEqual(sorted(Lesson.objects.values_list("title", flat=True)), ["Budgeting", "Careers"])
+        self.assertEqual(LessonSeedManifest.objects.count(), 2)
+
+    def test_failures(self):
+        """Test that failed lessons are reported, and that --fail-fast skips the rest."""
+        # The biggest folder is seeded first
+        self._lesson("broken", {"description": "No title"}, padding=1000)
+        with self.assertRaisesMessage(CommandError, "1 lesson(s) failed"):
+            self._seed_all("--processes", "0")
+        self.assertEqual(Lesson.objects.count(), 2)
+
+        Lesson.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, "2 skipped"):
+            self._seed_all("--processes", "0", "--fail-fast")
+        self.assertFalse(Lesson.objects.exists())
+
+    def test_selected_lessons(self):
+        """Test that only the given folders are seeded."""
+        output = self._seed_all("careers", "--processes", "0")
+        self.assertIn("Seeded 1 of 1 lessons", output)
+        self.assertEqual(list(Lesson.objects.values_list("title", flat=True)), ["Careers"])
+        with self.assertRaises(CommandError):
+            self._seed_all("missing", "--processes", "0")
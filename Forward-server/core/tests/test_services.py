@@ -1,10 +1,26 @@
+import csv
+import io
+import json
+import zipfile
+from io import StringIO
+from unittest import mock
 from django.test import TestCase, RequestFactory
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
+from PIL import Image
 from django.contrib.sessions.middleware import SessionMiddleware
-from core.services import UserService, QuizResponseService, LessonService
-from core.models import User, Lesson, Quiz, Question, UserQuizResponse, UserQuestionResponse, TextContent, Writing
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from api.views import LessonBundleView, LessonMediaView
+from rest_framework.test import APIRequestFactory, force_authenticate
+from core.services import UserService, QuizResponseService, LessonService, LessonMediaService, LessonBundleService, ResponseExportService, LessonCopyService, SearchService
+from core.models import User, Facility, Lesson, Quiz, Question, UserQuizResponse, UserQuestionResponse, TextContent, TextContentResponse, Writing, WritingResponse, PDF, Embed, MediaBlob, MediaReference, LikertScale, ActivitySearchDocument
+from core.tests.mixins import TempMediaStorageMixin
 
 User = get_user_model()
 
@@ -329,6 +345,252 @@ class LessonServiceTests(TestCase):
         # Check that activities dict is empty
         self.assertEqual(len(lesson_content['lesson']['activities']), 0)
 
+class LessonActivityIndexTests(TestCase):
+    """Test cases for listing a lesson's activities in one query."""
+
+    def setUp(self):
+        self.lesson = Lesson.objects.create(title='Test Lesson', order=1, active=True)
+        self.intro = TextContent.objects.create(lesson=self.lesson, title='Introduction', content='Welcome', order=1)
+        self.writing = Writing.objects.create(lesson=self.lesson, title='Test Writing Activity', order=3, prompts=[])
+        self.quiz = Quiz.objects.create(lesson=self.lesson, title='Test Quiz', order=2)
+        self.conclusion = TextContent.objects.create(lesson=self.lesson, title='Conclusion', content='Bye', order=4)
+        TextContent.objects.create(lesson=Lesson.objects.create(title='Other Lesson'), title='Other', content='Other', order=1)
+
+    def test_activity_index(self):
+        """Test that the index lists the lesson's activities in order with one query."""
+        with self.assertNumQueries(1) as captured:
+            index = LessonService.get_activity_index(lesson=self.lesson)
+        self.assertEqual(
+            [(entry['type'], entry['title'], entry['order']) for entry in index],
+            [('textcontent', 'Introduction', 1), ('quiz', 'Test Quiz', 2),
+             ('writing', 'Test Writing Activity', 3), ('textcontent', 'Conclusion', 4)],
+        )
+        self.assertEqual(index[0]['id'], self.intro.id)
+        # The heavy content columns are never read
+        self.assertNotIn('"content"', captured[0]['sql'])
+
+    def test_lesson_content_in_order(self):
+        """Test that the lesson content only loads the activity types the lesson uses."""
+        # The lesson, the index, one query per type and the quiz questions
+        with self.assertNumQueries(6):
+            content = LessonService.get_lesson_content(self.lesson.id)
+        self.assertEqual(
+            [activity['id'] for activity in content['lesson']['activities']],
+            [self.intro.id, self.quiz.id, self.writing.id, self.conclusion.id],
+        )
+
+class LessonCopyServiceTests(TempMediaStorageMixin, TestCase):
+    """Test cases for duplicating lessons."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.lesson = Lesson.objects.create(title='Test Lesson', order=1, active=True)
+        TextContent.objects.create(lesson=self.lesson, title='Introduction', content='Welcome', order=1)
+        self.quiz = Quiz.objects.create(lesson=self.lesson, title='Test Quiz', order=2)
+        chart = io.BytesIO()
+        Image.new('RGB', (32, 32), 'red').save(chart, format='PNG')
+        self.image = self._question(0, ContentFile(chart.getvalue(), name='chart.png')).image.name
+        for order in range(1, 3):
+            self._question(order)
+        self.user = User.objects.create_user(username='testuser', password='TestPassword123!', display_name='Test User')
+        UserQuizResponse.objects.create(user=self.user, lesson=self.lesson, associated_activity=self.quiz)
+
+    def _question(self, order, upload=None):
+        question = Question(quiz=self.quiz, question_text=f'Question {order}', question_type='multiple_choice',
+                            order=order, choices={})
+        if upload:
+            question.image.save(upload.name, upload)
+        else:
+            question.image = self.image
+            question.save()
+        return question
+
+    def test_duplicate(self):
+        """Test that the copy holds the same activities and children, sharing stored files."""
+        copy = LessonCopyService.duplicate(self.lesson, title='Test Lesson - North')
+
+        self.assertEqual(copy.title, 'Test Lesson - North')
+        self.assertFalse(copy.active)
+        strip = lambda index: [(e['type'], e['title'], e['order']) for e in index]
+        self.assertEqual(strip(LessonService.get_activity_index(lesson=copy)),
+                         strip(LessonService.get_activity_index(lesson=self.lesson)))
+
+        quiz = Quiz.objects.get(lesson=copy)
+        self.assertNotEqual(quiz.pk, self.quiz.pk)
+        self.assertEqual(list(quiz.questions.values_list('question_text', flat=True)),
+                         ['Question 0', 'Question 1', 'Question 2'])
+        self.assertEqual(self.quiz.questions.count(), 3)
+        self.assertEqual(quiz.questions.first().image.name, self.image)
+        self.assertEqual(MediaReference.objects.filter(blob__key=self.image).count(), 6)
+        # Responses belong to the original only
+        self.assertFalse(UserQuizResponse.objects.filter(lesson=copy).exists())
+        self.assertEqual(ActivitySearchDocument.objects.filter(lesson=copy).count(), 2)
+
+    def test_fixed_number_of_queries(self):
+        """Test that the number of queries does not grow with the number of children."""
+        with CaptureQueriesContext(connection) as few:
+            LessonCopyService.duplicate(self.lesson)
+        for order in range(3, 20):
+            self._question(order)
+        with CaptureQueriesContext(connection) as many:
+            LessonCopyService.duplicate(self.lesson)
+        self.assertEqual(len(many), len(few))
+
+    def test_command(self):
+        """Test that the command makes one copy per title."""
+        out = StringIO()
+        call_command('duplicate_lesson', 'Test Lesson', '--title', 'North', '--title', 'South', stdout=out)
+        self.assertEqual(set(Lesson.objects.values_list('title', flat=True)), {'Test Lesson', 'North', 'South'})
+        self.assertIn("Created 'North'", out.getvalue())
+
+
+class SearchServiceTests(TestCase):
+    """Test cases for the activity full-text search index."""
+
+    def setUp(self):
+        self.lesson = Lesson.objects.create(title='Money Basics', order=1, active=True)
+        self.budget = TextContent.objects.create(lesson=self.lesson, title='Making a budget', order=1,
+                                                 content='Track what you **spend** each month.')
+        self.quiz = Quiz.objects.create(lesson=self.lesson, title='Check your knowledge', order=2)
+        self.question = Question.objects.create(quiz=self.quiz, question_text='Which bank account earns interest?',
+                                                question_type='multiple_choice', order=1, choices={})
+        LikertScale.objects.create(lesson=self.lesson, title='Confidence', order=3, content=[
+            {'statement': 'I feel confident opening a savings account', 'scale': ['No', 'Yes'], 'continuous': False},
+        ])
+
+    def _titles(self, query, **kwargs):
+        return [result['title'] for result in SearchService.search(query, **kwargs)]
+
+    def test_indexed_on_save(self):
+        """Test that activities and their children are searchable once saved."""
+        self.assertEqual(self._titles('budgets'), ['Making a budget'])
+        self.assertEqual(self._titles('interest'), ['Check your knowledge'])
+        self.assertEqual(self._titles('savings'), ['Confidence'])
+
+        self.question.question_text = 'What is a credit score?'
+        self.question.save()
+        self.assertEqual(self._titles('interest'), [])
+        self.assertEqual(self._titles('credit'), ['Check your knowledge'])
+
+        self.budget.delete()
+        self.assertEqual(self._titles('budget'), [])
+        self.quiz.delete()
+        self.assertFalse(ActivitySearchDocument.objects.filter(activity_id=self.quiz.pk).exists())
+
+    def test_ranked_by_field(self):
+        """Test that title matches rank above content matches and inactive lessons are hidden."""
+        TextContent.objects.create(lesson=self.lesson, title='Spending', order=4, content='Where the money goes.')
+        self.assertEqual(self._titles('spend'), ['Spending', 'Making a budget'])
+
+        self.lesson.active = False
+        self.lesson.save()
+        self.assertEqual(self._titles('spend'), [])
+        self.assertEqual(len(self._titles('spend', active_only=False)), 2)
+
+    def test_rebuild_command(self):
+        """Test that the command rebuilds lost documents."""
+        ActivitySearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(ActivitySearchDocument.objects.filter(lesson=self.lesson).count(), 3)
+        self.assertEqual(self._titles('interest'), ['Check your knowledge'])
+
+
+class LessonCompletionTests(TestCase):
+    """Test cases for computing lesson completion in bulk."""
+
+    def setUp(self):
+        self.lessons = [Lesson.objects.create(title=f'Lesson {i}', order=i, active=True) for i in range(3)]
+        self.texts = [
+            TextContent.objects.create(lesson=lesson, title=f'Text {i}', content='Text', order=i)
+            for lesson in self.lessons for i in range(4)
+        ]
+        self.users = [
+            User.objects.create_user(username=f'student{i}', password='TestPassword123!', display_name=f'Student {i}')
+            for i in range(5)
+        ]
+        # Student n answered the first n texts of each lesson
+        for n, user in enumerate(self.users):
+            for lesson in self.lessons:
+                for text in TextContent.objects.filter(lesson=lesson).order_by('order')[:n]:
+                    TextContentResponse.objects.create(user=user, lesson=lesson, associated_activity=text)
+
+    def test_matches_single_completion(self):
+        """Test that bulk completions match get_lesson_completion."""
+        completions = LessonService.get_completions([u.pk for u in self.users], [l.pk for l in self.lessons])
+        for user in self.users:
+            for lesson in self.lessons:
+                self.assertAlmostEqual(completions.get((user.pk, lesson.pk), 0),
+                                       LessonService.get_lesson_completion(user, lesson))
+        self.assertAlmostEqual(completions[(self.users[2].pk, self.lessons[0].pk)], 0.5)
+
+    def test_fixed_number_of_queries(self):
+        """Test that the number of queries does not grow with users or lessons."""
+        with self.assertNumQueries(2):
+            LessonService.get_completions([self.users[0].pk], [self.lessons[0].pk])
+        with self.assertNumQueries(2):
+            LessonService.get_completions([u.pk for u in self.users], [l.pk for l in self.lessons])
+
+        with self.assertNumQueries(3):
+            overall = LessonService.get_overall_completions([u.pk for u in self.users])
+        self.assertAlmostEqual(overall[self.users[3].pk], 0.75)
+        self.assertNotIn(self.users[0].pk, overall)
+
+
+class ResponseExportServiceTests(TestCase):
+    """Test cases for the research export of responses."""
+
+    def setUp(self):
+        self.north = Facility.objects.create(name='North Campus', code='NORTH')
+        self.south = Facility.objects.create(name='South Campus', code='SOUTH')
+        self.lesson = Lesson.objects.create(title='Lesson', order=1)
+        self.writing = Writing.objects.create(lesson=self.lesson, title='Essay', order=1, prompts=[])
+        self.quiz = Quiz.objects.create(lesson=self.lesson, title='Quiz', order=2)
+        self.question = Question.objects.create(quiz=self.quiz, question_text='Why?', question_type='multiple_choice',
+                                                choices={'options': []}, order=1)
+        self.students = []
+        for i, (facility, consent) in enumerate([(self.north, True), (self.north, False), (self.south, True)]):
+            student = User.objects.create_user(username=f'student{i}', password='TestPassword123!',
+                                               display_name=f'Student {i}', facility=facility, consent=consent)
+            WritingResponse.objects.create(user=student, lesson=self.lesson, associated_activity=self.writing,
+                                           responses=[f'answer {i}'])
+            quiz_response = UserQuizResponse.objects.create(user=student, lesson=self.lesson, associated_activity=self.quiz)
+            UserQuestionResponse.objects.create(user=student, lesson=self.lesson, quiz_response=quiz_response,
+                                                question=self.question, response_data={'selected': 'a'})
+            self.students.append(student)
+
+    def test_rows_joined_in_one_query(self):
+        """Test that rows carry user, lesson and activity details without per-row queries."""
+        with self.assertNumQueries(1):
+            rows = list(ResponseExportService.iter_rows('writing', WritingResponse.objects.all(), chunk_size=1))
+        self.assertEqual(len(rows), 3)
+        row = next(r for r in rows if r['username'] == 'student0')
+        self.assertEqual(row['facility'], 'NORTH')
+        self.assertEqual(row['lesson_title'], 'Lesson')
+        self.assertEqual(row['activity_title'], 'Essay')
+        self.assertEqual(row['data'], {'responses': ['answer 0']})
+
+        with self.assertNumQueries(1):
+            question_rows = list(ResponseExportService.iter_rows('question', UserQuestionResponse.objects.all()))
+        self.assertEqual(question_rows[0]['activity_title'], 'Why?')
+        self.assertEqual(question_rows[0]['parent_activity_id'], self.quiz.id)
+
+    def test_filters(self):
+        """Test filtering by consent and facility."""
+        rows = list(ResponseExportService.iter_all_rows(response_types=['writing', 'question'],
+                                                        consented_only=True, facilities=['NORTH']))
+        self.assertEqual({(r['response_type'], r['username']) for r in rows},
+                         {('writing', 'student0'), ('question', 'student0')})
+
+    def test_command_csv(self):
+        """Test that the command writes a CSV with one row per response."""
+        out = StringIO()
+        call_command('export_responses', '--type', 'writing', '--consented-only', stdout=out, stderr=StringIO())
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual(sorted(r['username'] for r in rows), ['student0', 'student2'])
+        self.assertEqual(json.loads(rows[0]['data'])['responses'][0][:6], 'answer')
+
+
 class QuizResponseServiceTests(TestCase):
     def setUp(self):
         # Create multiple users for testing
@@ -980,4 +1242,127 @@ class ExtendedQuizResponseServiceTests(TestCase):
             QuizResponseService.get_quiz_response_details(
                 user=self.user,
                 response_id=other_response.id
-            )
\ No newline at end of file
+            )
+
+
+class LessonMediaServiceTests(TempMediaStorageMixin, TestCase):
+    """Test cases for the lesson media manifest and offline bundles."""
+
+    media_base_url = "http://testserver/media/"
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+        self.lesson = Lesson.objects.create(title='Media Lesson', description='Has files', objectives=['Watch'])
+        self.pdf = PDF(lesson=self.lesson, title='Syllabus', order=2)
+        self.pdf.pdf_file.save('syllabus.pdf', ContentFile(b'%PDF-1.4\n%%EOF\n'))
+        Embed.objects.create(lesson=self.lesson, title='Outside', order=1, link='https://example.org/video.mp4')
+
+    def test_manifest_lists_stored_files(self):
+        """Test that stored files are listed with their size and external links are not."""
+        manifest, _etag = LessonMediaService.get_manifest(self.lesson.id)
+        keys = [asset['key'] for asset in manifest['assets']]
+
+        self.assertEqual(keys, [self.pdf.pdf_file.name])
+        asset = manifest['assets'][0]
+        blob = MediaBlob.objects.get(key=self.pdf.pdf_file.name)
+        self.assertEqual(asset['order'], 2)
+        self.assertEqual(asset['size'], blob.size)
+        self.assertEqual(asset['cache_key'], f"sha256-{blob.sha256[:32]}")
+        self.assertEqual(manifest['total_size'], blob.size)
+
+    def test_version_changes_with_content(self):
+        """Test that editing an activity changes the manifest version and ETag."""
+        manifest, etag = LessonMediaService.get_manifest(self.lesson.id)
+        TextContent.objects.create(lesson=self.lesson, title='New', content='More', order=3)
+
+        updated, updated_etag = LessonMediaService.get_manifest(self.lesson.id)
+        self.assertNotEqual(manifest['version'], updated['version'])
+        self.assertNotEqual(etag, updated_etag)
+
+    def test_version_changes_with_children(self):
+        """Test that adding, editing or deleting a question changes the version."""
+        quiz = Quiz.objects.create(lesson=self.lesson, title='Check', order=3)
+        versions = [LessonMediaService.get_content_version(self.lesson)]
+        question = Question.objects.create(quiz=quiz, question_text='Is saving good?', question_type='multiple_choice',
+                                           choices={}, order=1)
+        versions.append(LessonMediaService.get_content_version(self.lesson))
+        question.question_text = 'Is spending good?'
+        question.save()
+        versions.append(LessonMediaService.get_content_version(self.lesson))
+        question.delete()
+        versions.append(LessonMediaService.get_content_version(self.lesson))
+        self.assertEqual(len(set(versions)), 4)
+
+    def test_conditional_request(self):
+        """Test that the endpoint answers a matching If-None-Match with 304."""
+        view = LessonMediaView.as_view()
+        factory = RequestFactory()
+        response = view(factory.get('/api/lesson/media'), id=self.lesson.id)
+        self.assertEqual(response.status_code, 200)
+
+        request = factory.get('/api/lesson/media', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(view(request, id=self.lesson.id).status_code, 304)
+
+    def test_missing_lesson(self):
+        """Test that unknown lessons return 404."""
+        with self.assertRaises(Lesson.DoesNotExist):
+            LessonMediaService.get_manifest('00000000-0000-0000-0000-000000000000')
+
+    def test_bundle_contents(self):
+        """Test that a bundle holds the content with bundle-relative URLs and the referenced files."""
+        key = LessonBundleService.get_bundle(self.lesson.id)
+        with default_storage.open(key, 'rb') as f, zipfile.ZipFile(f) as bundle:
+            content = json.loads(bundle.read('lesson.json'))
+            path = f"media/{self.pdf.pdf_file.name}"
+            self.assertIn(path, bundle.namelist())
+            self.assertEqual(bundle.read(path), b'%PDF-1.4\n%%EOF\n')
+
+        pdf = next(a for a in content['lesson']['activities'] if a['type'] == 'PDF')
+        self.assertEqual(pdf['pdf_file'], path)
+
+    def test_bundle_view_serves_built_bundles(self):
+        """Test that the endpoint never builds a bundle in the request, it schedules one and answers 202."""
+        user = User.objects.create_user(username='student', password='TestPassword123!', display_name='Student')
+        view = LessonBundleView.as_view()
+        factory = APIRequestFactory()
+
+        def get():
+            request = factory.get('/api/lesson/bundle', {'variant': 'mobile'})
+            force_authenticate(request, user=user)
+            return view(request, id=self.lesson.id)
+
+        with mock.patch.object(LessonBundleService, 'schedule_build') as schedule_build:
+            response = get()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Retry-After'], '30')
+        schedule_build.assert_called_once_with(self.lesson.id, variant='mobile')
+        self.assertIsNone(LessonBundleService.find_bundle(self.lesson.id, 'mobile'))
+
+        LessonBundleService.get_bundle(self.lesson.id, 'mobile')
+        response = get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        # Not response.close(), its request_finished signal closes the test's connection
+        response.file_to_stream.close()
+
+    def test_schedule_build_once(self):
+        """Test that a bundle requested again while its build is queued is not built twice."""
+        with mock.patch.object(LessonBundleService.BUILDS, 'submit') as submit:
+            LessonBundleService.schedule_build(self.lesson.id, 'mobile')
+            LessonBundleService.schedule_build(self.lesson.id, 'mobile')
+            LessonBundleService.schedule_build(self.lesson.id, 'tablet')
+        self.assertEqual(submit.call_count, 2)
+
+    def test_bundle_cached_by_version(self):
+        """Test that unchanged lessons reuse the stored bundle and changed ones replace it."""
+        key = LessonBundleService.get_bundle(self.lesson.id)
+        modified = default_storage.get_modified_time(key)
+        self.assertEqual(LessonBundleService.get_bundle(self.lesson.id), key)
+        self.assertEqual(default_storage.get_modified_time(key), modified)
+
+        TextContent.objects.create(lesson=self.lesson, title='New', content='More', order=3)
+        updated = LessonBundleService.get_bundle(self.lesson.id)
+        self.assertNotEqual(updated, key)
+        self.assertFalse(default_storage.exists(key))
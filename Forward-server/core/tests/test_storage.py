@@ -0,0 +1,241 @@
+import io
+import os
+import tempfile
+import threading
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from core.models import JSONImageModel, MediaBlob
+from core.storage import ForwardS3Storage, ForwardFileSystemStorage, ParallelUploadStorage, parallel_uploads
+from core.tests.mixins import TempMediaStorageMixin
+from core.utils import storage_key_from_url
+
+
+def make_storage(**options):
+    return ForwardS3Storage(
+        bucket_name="media-bucket",
+        access_key="minioadmin",
+        secret_key="minioadmin",
+        endpoint_url="http://localhost:9000",
+        **options,
+    )
+
+
+class ForwardS3StorageTests(SimpleTestCase):
+    """Test cases for the public URL mode of ForwardS3Storage."""
+
+    def test_public_keys_get_stable_unsigned_urls(self):
+        """Test that keys under public/ are not signed and do not change between calls."""
+        storage = make_storage(public_urls=True)
+        url = storage.url("public/pdf/Course Catalog.pdf")
+
+        self.assertEqual(url, "http://localhost:9000/media-bucket/public/pdf/Course%20Catalog.pdf")
+        self.assertEqual(url, storage.url("public/pdf/Course Catalog.pdf"))
+
+    def test_processed_variants_are_public(self):
+        """Test that imagefield's generated variants share the public URL mode."""
+        storage = make_storage(public_urls=True)
+        self.assertNotIn("Signature", storage.url("__processed__/ab/public-image-123.webp"))
+
+    def test_private_keys_stay_signed(self):
+        """Test that keys outside the public prefixes are still signed."""
+        storage = make_storage(public_urls=True)
+        self.assertIn("Signature", storage.url("private/bundles/lesson.zip"))
+
+    def test_public_urls_disabled_by_default(self):
+        """Test that the default configuration keeps signing every URL."""
+        storage = make_storage()
+        self.assertIn("Signature", storage.url("public/pdf/a.pdf"))
+        self.assertEqual(storage.get_object_parameters("public/pdf/a.pdf"), {})
+
+    def test_public_domain(self):
+        """Test that a custom public domain is used for public keys only."""
+        storage = make_storage(public_urls=True, public_domain="cdn.example.org")
+        self.assertEqual(storage.url("public/video/a.mp4"), "https://cdn.example.org/public/video/a.mp4")
+        self.assertIn("localhost:9000", storage.url("private/a.txt"))
+
+    def test_public_upload_parameters(self):
+        """Test that public uploads receive the ACL and Cache-Control headers."""
+        storage = make_storage(public_urls=True, public_cache_control="public, max-age=60")
+        self.assertEqual(
+            storage.get_object_parameters("public/jsonimagemodel/a.png"),
+            {"ACL": "public-read", "CacheControl": "public, max-age=60"},
+        )
+        self.assertEqual(storage.get_object_parameters("private/a.png"), {})
+
+
+class ForwardFileSystemStorageTests(SimpleTestCase):
+    """Test cases for the local media backend served by Caddy."""
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        self.storage = ForwardFileSystemStorage(location=self.media_root.name, base_url="https://api.example.org/media/")
+
+    def test_url_changes_with_content(self):
+        """Test that URLs carry a digest that changes when the file is replaced."""
+        name = self.storage.save("public/pdf/Course Catalog.pdf", ContentFile(b"first"))
+        url = self.storage.url(name)
+        self.assertRegex(url, r"^https://api\.example\.org/media/[0-9a-f]{10}/public/pdf/Course%20Catalog\.pdf$")
+        self.assertEqual(url, self.storage.url(name))
+
+        self.storage.delete(name)
+        self.storage.save(name, ContentFile(b"second, longer"))
+        self.assertNotEqual(url, self.storage.url(name))
+
+    def test_key_from_url(self):
+        """Test that storage_key_from_url reverses the digest URLs."""
+        name = self.storage.save("public/twine/images/map.png", ContentFile(b"png"))
+        self.assertEqual(storage_key_from_url(self.storage.url(name), self.storage), name)
+        self.assertIsNone(storage_key_from_url("https://example.org/media/0123456789/a.png", self.storage))
+
+    def test_key_from_url_probes_storage_once(self):
+        """Test that the URL prefixes of storages without key_from_url are only worked out once."""
+        storage = FileSystemStorage(location=self.media_root.name, base_url="https://api.example.org/media/")
+        with mock.patch.object(storage, "url", wraps=storage.url) as url:
+            for name in ("a.png", "public/b.pdf", "c/d.mp4"):
+                self.assertEqual(storage_key_from_url(f"https://api.example.org/media/{name}", storage), name)
+            self.assertIsNone(storage_key_from_url("https://example.org/media/a.png", storage))
+        self.assertEqual(url.call_count, 2)
+
+    def test_copy_media(self):
+        """Test that copy_media copies every key and skips files already present."""
+        target = tempfile.TemporaryDirectory()
+        self.addCleanup(target.cleanup)
+        self.storage.save("public/pdf/a.pdf", ContentFile(b"pdf"))
+        self.storage.save("doc.html", ContentFile(b"<html></html>"))
+
+        with override_settings(STORAGES={
+            "default": {
+                "BACKEND": "core.storage.ForwardFileSystemStorage",
+                "OPTIONS": {"location": target.name, "base_url": "/media/"},
+            },
+            "s3": {
+                "BACKEND": "core.storage.ForwardFileSystemStorage",
+                "OPTIONS": {"location": self.media_root.name, "base_url": "/media/"},
+            },
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+        }):
+            call_command("copy_media", stdout=io.StringIO())
+            out = io.StringIO()
+            call_command("copy_media", stdout=out)
+
+        with open(os.path.join(target.name, "public", "pdf", "a.pdf"), "rb") as f:
+            self.assertEqual(f.read(), b"pdf")
+        self.assertTrue(os.path.exists(os.path.join(target.name, "doc.html")))
+        self.assertIn("0 copied, 2 already present", out.getvalue())
+
+
+class CountingStorage(FileSystemStorage):
+    """FileSystemStorage counting its round trips."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = {"exists": 0, "listdir": 0}
+
+    def exists(self, name):
+        self.calls["exists"] += 1
+        return super().exists(name)
+
+    def listdir(self, path):
+        self.calls["listdir"] += 1
+        return super().listdir(path)
+
+
+class ParallelUploadStorageTests(SimpleTestCase):
+    """Test cases for the thread pool uploads used while seeding."""
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        self.storage = CountingStorage(location=self.media_root.name)
+        self.uploads = ParallelUploadStorage(self.storage, workers=4)
+        self.addCleanup(self.uploads.close)
+
+    def test_uploads(self):
+        """Test that queued files can be read back before and after they are stored."""
+        names = [self.uploads.save(f"public/pdf/{i}.pdf", ContentFile(b"pdf" * i)) for i in range(1, 6)]
+        self.assertTrue(self.uploads.exists(names[0]))
+        with self.uploads.open(names[1]) as f:
+            self.assertEqual(f.read(), b"pdfpdf")
+        self.assertEqual(self.uploads.size(names[2]), 9)
+
+        self.uploads.wait()
+        with open(os.path.join(self.media_root.name, "public", "pdf", "5.pdf"), "rb") as f:
+            self.assertEqual(f.read(), b"pdf" * 5)
+        self.assertEqual(self.uploads.stats["pdf"][:2], [5, 45])
+
+    def test_existence_checked_per_directory(self):
+        """Test that existence checks list each directory once instead of asking per key."""
+        self.storage.save("public/twine/images/a.png", ContentFile(b"a"))
+        self.storage.calls["exists"] = 0
+        for name in ("a.png", "b.png", "c.png"):
+            self.uploads.exists(f"public/twine/images/{name}")
+        self.assertFalse(self.uploads.exists("public/missing/a.png"))
+        self.assertTrue(self.uploads.exists("public/twine/images/a.png"))
+        self.assertEqual(self.storage.calls, {"exists": 0, "listdir": 2})
+
+        # Names taken by stored or queued files get an alternative
+        self.assertNotEqual(self.uploads.save("public/twine/images/a.png", ContentFile(b"b")), "public/twine/images/a.png")
+        self.uploads.save("public/twine/images/b.png", ContentFile(b"b"))
+        self.assertNotEqual(self.uploads.save("public/twine/images/b.png", ContentFile(b"c")), "public/twine/images/b.png")
+
+    def test_delete_waits_for_upload(self):
+        """Test that a queued file can be replaced under the same name."""
+        name = self.uploads.save("public/a.txt", ContentFile(b"first"))
+        self.uploads.delete(name)
+        self.assertFalse(self.uploads.exists(name))
+        self.assertEqual(self.uploads.save(name, ContentFile(b"second")), name)
+        self.uploads.wait()
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b"second")
+
+    def test_url_waits_only_for_local_digests(self):
+        """Test that url() only waits for the upload when the URL carries the stored file's digest."""
+        release = threading.Event()
+        self.addCleanup(release.set)
+        save = self.storage._save
+        self.storage._save = lambda name, content: release.wait() and save(name, content)
+        name = self.uploads.save("public/a.txt", ContentFile(b"a"))
+        self.assertEqual(self.uploads.url(name), "/media/public/a.txt")
+        self.assertFalse(self.uploads.pending[name][0].done())
+
+        local = ForwardFileSystemStorage(location=self.media_root.name, base_url="/media/")
+        uploads = ParallelUploadStorage(local, workers=1)
+        self.addCleanup(uploads.close)
+        name = uploads.save("public/b.txt", ContentFile(b"b"))
+        self.assertEqual(uploads.url(name), local.url(name))
+        self.assertNotIn("0" * local.DIGEST_LENGTH, uploads.url(name))
+
+    def test_failed_upload_raises(self):
+        """Test that wait() raises upload errors."""
+        self.storage._save = lambda name, content: (_ for _ in ()).throw(OSError("Bucket unreachable"))
+        self.uploads.save("public/a.txt", ContentFile(b"a"))
+        with self.assertRaisesMessage(OSError, "Bucket unreachable"):
+            self.uploads.wait()
+
+
+class ParallelUploadFieldTests(TempMediaStorageMixin, TestCase):
+    """Test cases for model fields saving through parallel_uploads."""
+
+    def setUp(self):
+        super().setUp()
+
+    def test_image_and_variants(self):
+        """Test that images and their generated variants are uploaded by the pool."""
+        png = io.BytesIO()
+        Image.new("RGB", (64, 48), "blue").save(png, format="PNG")
+
+        with parallel_uploads(workers=2) as uploads:
+            image = JSONImageModel.from_file(ContentFile(png.getvalue(), name="map.png"))
+            uploads.wait()
+        self.assertIsInstance(default_storage._wrapped, FileSystemStorage)
+
+        self.assertEqual(image.image_width, 64)
+        self.assertTrue(MediaBlob.objects.filter(key=image.image.name).exists())
+        self.assertTrue(os.path.exists(os.path.join(self.media_root.name, image.image.name)))
+        self.assertEqual(uploads.stats["image"][0], 1)
+        self.assertGreater(uploads.stats["image variant"][0], 0)
@@ -6,6 +6,7 @@ from typing import IO, Any
 import uuid
 from django.urls import reverse
 import json
+from urllib.parse import urlsplit, unquote
 
 from imagefield.fields import ImageFieldFile
 
@@ -19,7 +20,7 @@ def s3_file_upload(file: IO[Any], s3_path="") -> str:
             default_storage.save(s3_path, file)
         return default_storage.url(s3_path)
     except:
-        if settings.DEBUG:
+        if settings.DEBUG and settings.MEDIA_BACKEND != "local":
             print('Development mode: Creating MinIO bucket')
             s3_client = boto3.client(
                 's3',
@@ -27,7 +28,7 @@ def s3_file_upload(file: IO[Any], s3_path="") -> str:
                 aws_access_key_id='minioadmin',   # maybe need to change these to os.getenv
                 aws_secret_access_key='minioadmin'  
             )
-            bucket_name = settings.STORAGES['default']['OPTIONS']['bucket_name']
+            bucket_name = settings.STORAGES['s3']['OPTIONS']['bucket_name']
             try:
                 s3_client.create_bucket(Bucket=bucket_name)
             except s3_client.exceptions.BucketAlreadyOwnedByYou:
@@ -42,6 +43,45 @@ def s3_file_delete(s3_path):
     except:
         raise
 
+def _storage_url_prefixes(storage) -> list[tuple[str, str]]:
+    """
+        (netloc, path prefix) pairs that `storage.url()` puts in front of a key. Probing costs
+        a presigned URL per pair on S3, so they are worked out once and kept on the storage.
+    """
+    prefixes = getattr(storage, "_key_url_prefixes", None)
+    if prefixes is not None:
+        return prefixes
+    prefixes = []
+    # public/ keys may be served from a different domain than the rest (see ForwardS3Storage)
+    for probe in ("public/__probe__", "__probe__"):
+        parts = urlsplit(storage.url(probe))
+        path = unquote(parts.path)
+        prefix = (parts.netloc, path[: len(path) - len(probe)])
+        if prefix not in prefixes:
+            prefixes.append(prefix)
+    storage._key_url_prefixes = prefixes
+    return prefixes
+
+
+def storage_key_from_url(url: str, storage=default_storage) -> str | None:
+    """
+        Returns the storage key a URL produced by `storage.url()` points at, or None for
+        URLs that do not belong to the storage (external embeds, links, ...).
+    """
+    # Storages whose URLs aren't just a prefix plus the key know how to reverse them
+    if hasattr(storage, "key_from_url"):
+        return storage.key_from_url(url)
+    parts = urlsplit(url)
+    path = unquote(parts.path)
+    for netloc, prefix in _storage_url_prefixes(storage):
+        # A storage without a base URL yields bare keys, which can't be told apart from any other path
+        if not (netloc or prefix):
+            continue
+        if parts.netloc == netloc and path.startswith(prefix) and len(path) > len(prefix):
+            return path[len(prefix):]
+    return None
+
+
 DEFAULT_IMAGE_FORMATS = {
     "mobile":  ("default", ("thumbnail", (480,  480))),
     "tablet":  ("default", ("thumbnail", (800,  800))),
@@ -64,7 +104,7 @@ class FwdImage():
     def formats(self):
         return {key: list(value) for key, value in self._formats.items()}
     
-    def stringify(self, image: ImageFieldFile) -> dict[str, str | dict[str, int]]:
+    def stringify(self, image: ImageFieldFile) -> dict[str, str | int | dict[str, int] | None]:
         if image is None or not isinstance(image, ImageFieldFile):
             raise TypeError("Passed image was not an ImageFieldFile")
         
@@ -72,8 +112,14 @@ class FwdImage():
         for key, value in self._formats.items():
             optimized[getattr(image, key)] = value[1][1][0]
             
+        # Stored by the field on upload, lets the client reserve space before the image loads
+        field, instance = image.field, image.instance
+        placeholder_field = getattr(field, "placeholder_field", None)
         return {
             "thumbnail": image.internal_default_thumbnail if image.internal_default_thumbnail else image.url,
             "original": image.url,
-            "optimized": optimized
+            "optimized": optimized,
+            "width": getattr(instance, field.width_field) if field.width_field else None,
+            "height": getattr(instance, field.height_field) if field.height_field else None,
+            "placeholder": (getattr(instance, placeholder_field) or None) if placeholder_field else None,
         }
\ No newline at end of file
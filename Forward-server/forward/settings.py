@@ -60,6 +60,27 @@ INSTALLED_APPS = [
 ]
 
 # REST Framework settings
+# Per-endpoint rate limits. `<scope>` applies per user (per submitted username for login),
+# `<scope>_ip` per client address, which a whole facility may share. Override with e.g.
+# THROTTLE_RATES="login=5/min,lessons_ip=" (an empty rate removes the limit). Counters live in
+# the default cache, so they are only shared across workers with REDIS_URL set.
+THROTTLE_RATES = {
+    "login": "10/min",
+    "login_ip": "300/min",
+    "responses": "120/min",
+    "responses_ip": "3000/min",
+    "bugreport": "10/hour",
+    "bugreport_ip": "100/hour",
+    "lessons": "60/min",
+    "lessons_ip": "1200/min",
+    "search": "30/min",
+    "search_ip": "600/min",
+}
+for rate in os.getenv("THROTTLE_RATES", "").split(","):
+    if "=" in rate:
+        scope, value = rate.split("=", 1)
+        THROTTLE_RATES[scope.strip()] = value.strip() or None
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
@@ -69,10 +90,30 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'EXCEPTION_HANDLER': 'api.utils.mistakes_were_made',
+    'DEFAULT_THROTTLE_RATES': THROTTLE_RATES,
+    # Caddy, so client addresses are read from X-Forwarded-For
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
 }
 
+# Low priority requests are answered with 503 while requests wait longer than
+# ADMISSION_QUEUE_THRESHOLD seconds for a worker (0 turns this off), see
+# api.middleware.AdmissionControlMiddleware
+ADMISSION_QUEUE_THRESHOLD = float(os.getenv('ADMISSION_QUEUE_THRESHOLD', 1.0))
+ADMISSION_COOLDOWN = int(os.getenv('ADMISSION_COOLDOWN', 15))
+ADMISSION_LOW_PRIORITY_PATHS = [
+    r'^/api/bugreport',
+    r'^/api/lesson/[^/]+/bundle',
+    r'^/admin/.*export',
+]
+# Names of admin actions treated as low priority
+ADMISSION_LOW_PRIORITY_ACTIONS = [
+    r'^export',
+]
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    # Before sessions and authentication, so shed requests cost no queries
+    'api.middleware.AdmissionControlMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -123,6 +164,26 @@ CSRF_COOKIE_SAMESITE = 'None'
 
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
+# A shared cache (Redis) lets sessions and users be read without hitting the database on
+# every request. Without it each worker has its own memory cache, which can't be invalidated
+# across workers, so sessions and users are then always read from the database.
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+    SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+AUTHENTICATION_BACKENDS = [
+    "core.backends.CachedModelBackend",
+    # Sessions created before the cached backend still name this one
+    "django.contrib.auth.backends.ModelBackend",
+]
+USER_CACHE_TIMEOUT = int(os.getenv("USER_CACHE_TIMEOUT", 300)) if REDIS_URL else 0
+
 ROOT_URLCONF = 'forward.urls'
 
 TEMPLATES = [
@@ -158,6 +219,10 @@ DATABASES = {
     }
 }
 
+# Postgres text search configuration (stemming and stop words) of the activity search index.
+# Run `manage.py rebuild_search_index` after changing it.
+SEARCH_CONFIG = os.environ.get("SEARCH_CONFIG", "english")
+
 # Tells Django to use our custom User model instead of the default
 AUTH_USER_MODEL = 'core.User'
 
@@ -203,48 +268,69 @@ STATIC_URL = '/static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Sets up the django-storages s3 configuration with minio container
+# MEDIA_PUBLIC_URLS serves keys under public/ (and imagefield's __processed__/) with
+# stable unsigned URLs so browsers/CDNs can cache them; everything else stays signed.
+# The bucket must allow anonymous reads on those prefixes, see `manage.py audit_media_acl`.
+MEDIA_PUBLIC_URLS = os.getenv("MEDIA_PUBLIC_URLS", "False").lower() in ("true", "1", "yes")
+MEDIA_PUBLIC_DOMAIN = os.getenv("MEDIA_PUBLIC_DOMAIN") or None # e.g. a CDN in front of the bucket
+
+# "s3" (S3 / MinIO) or "local" (MEDIA_ROOT on disk, served by Caddy under MEDIA_URL)
+MEDIA_BACKEND = os.getenv("MEDIA_BACKEND", "s3").lower()
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", str(BASE_DIR / "media"))
+# Must be absolute (https://api.example.org/media/) when the client is served from another origin
+MEDIA_URL = os.getenv("MEDIA_URL", "/media/")
 
 if DEBUG: # uses Minio for development
     print("Development mode active")
-    STORAGES = {
-        "default": {
-            "BACKEND": "storages.backends.s3.S3Storage",
-            "OPTIONS":{
-                "bucket_name": "media-bucket",
-                "access_key": "minioadmin",
-                "secret_key": "minioadmin",
-                "endpoint_url": "http://localhost:9000",
-                # "custom_domain": "http://localhost:9000", # test
-                # "url_protocol": "http:",
-                # "default_acl": "public-read",
-                "querystring_auth": True,
-                # "use_ssl": False # set to false for local development
-            }
-        },
-        # Required to satisfy django storages but we do not use static files i believe
-        "staticfiles": {
-            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    S3_STORAGE = {
+        "BACKEND": "core.storage.ForwardS3Storage",
+        "OPTIONS":{
+            "bucket_name": "media-bucket",
+            "access_key": "minioadmin",
+            "secret_key": "minioadmin",
+            "endpoint_url": "http://localhost:9000",
+            # "custom_domain": "http://localhost:9000", # test
+            # "url_protocol": "http:",
+            # "default_acl": "public-read",
+            "querystring_auth": True,
+            # "use_ssl": False # set to false for local development
+            "public_urls": MEDIA_PUBLIC_URLS,
+            "public_domain": MEDIA_PUBLIC_DOMAIN,
         }
     }
 else: # Production with s3 bucket configuration
     print("Production mode active")
-    STORAGES= {
-        "default": {
-            "BACKEND": "storages.backends.s3.S3Storage",
-            "OPTIONS":{
-                "bucket_name": os.getenv("PROD_AWS_MEDIA_BUCKET_NAME"),
-                "access_key": os.getenv("PROD_AWS_ACCESS_KEY_ID"),
-                "secret_key": os.getenv("PROD_AWS_SECRET_ACCESS_KEY"), 
-                "region_name": os.getenv("PROD_AWS_REGION"),
-                "use_ssl": True
-            }
-        },
-        # Required to satisfy django storages but we do not use static files i believe
-        "staticfiles": {
-            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    S3_STORAGE = {
+        "BACKEND": "core.storage.ForwardS3Storage",
+        "OPTIONS":{
+            "bucket_name": os.getenv("PROD_AWS_MEDIA_BUCKET_NAME"),
+            "access_key": os.getenv("PROD_AWS_ACCESS_KEY_ID"),
+            "secret_key": os.getenv("PROD_AWS_SECRET_ACCESS_KEY"), 
+            "region_name": os.getenv("PROD_AWS_REGION"),
+            "use_ssl": True,
+            "public_urls": MEDIA_PUBLIC_URLS,
+            "public_domain": MEDIA_PUBLIC_DOMAIN,
         }
     }
 
+LOCAL_STORAGE = {
+    "BACKEND": "core.storage.ForwardFileSystemStorage",
+    "OPTIONS": {
+        "location": MEDIA_ROOT,
+        "base_url": MEDIA_URL,
+    }
+}
+
+STORAGES = {
+    "default": LOCAL_STORAGE if MEDIA_BACKEND == "local" else S3_STORAGE,
+    # Kept addressable when the default is local, for `copy_media --source s3`
+    "s3": S3_STORAGE,
+    # Required to satisfy django storages but we do not use static files i believe
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    }
+}
+
 
 # CMS_COLOR_SCHEME = "light"
 MARTOR_ENABLE_LABEL = True
@@ -14,8 +14,10 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+from django.views.static import serve
 from core.admin import custom_admin_site
 from api.views import file_handler_view
 
@@ -25,3 +27,9 @@ urlpatterns = [
     path('martor/', include('martor.urls')),
     path('json-file-handler/', file_handler_view, name='json_file_handler'),
 ]
+
+# In production Caddy serves local media (see the Caddyfile), this is for runserver only
+if settings.DEBUG and settings.MEDIA_BACKEND == "local" and settings.MEDIA_URL.startswith("/"):
+    urlpatterns += [
+        re_path(rf'^{settings.MEDIA_URL.strip("/")}/[0-9a-f]{{10}}/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+    ]